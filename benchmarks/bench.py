@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""Benchmarks of each stage of compiling and interpreting BrainF programs.
+
+Each workload in the corpus is lexed, parsed, optimised pass by pass, lowered
+and run by each interpreter, timing every stage separately. The fastest time
+of several repeats is recorded, to reduce noise from the rest of the system.
+
+Results are written as JSON, mapping each workload to the seconds taken by
+each of its stages, and can be compared against a stored baseline, failing if
+any stage has slowed down by more than a threshold.
+
+Usage:
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --baseline benchmarks/baseline.json
+    python benchmarks/bench.py --update-baseline
+"""
+
+import argparse
+import contextlib
+import json
+import random
+import sys
+import time
+from collections.abc import Callable, Iterator, Sequence
+from dataclasses import dataclass, field
+from io import BytesIO, StringIO
+from pathlib import Path
+from typing import Final
+
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.passes import ModulePass
+from xdsl.utils.lexer import Input
+
+from xdslbf.compiler import get_context
+from xdslbf.frontend import BrainFLexer, BrainFParser
+from xdslbf.interpreters import (
+    BfState,
+    BrainFInterpreter,
+    BudgetExceeded,
+    EofPolicy,
+)
+from xdslbf.interpreters.base import BaseBrainFInterpreter
+from xdslbf.interpreters.bytecode import BytecodeBrainFInterpreter
+from xdslbf.interpreters.native import NativeBrainFInterpreter
+from xdslbf.interpreters.transpiled import TranspiledBrainFInterpreter
+from xdslbf.transforms import (
+    DeferMovesPass,
+    DirectLowerBfToBuiltinPass,
+    FoldRunsPass,
+    LowerBfToBuiltinPass,
+    RecogniseLoopIdiomsPass,
+)
+
+ROOT: Final = Path(__file__).parent.parent
+"""The root directory of the project."""
+
+BASELINE: Final = Path(__file__).parent / "baseline.json"
+"""The default path of the stored baseline results."""
+
+PASSES: Final[tuple[type[ModulePass], ...]] = (
+    FoldRunsPass,
+    RecogniseLoopIdiomsPass,
+    DeferMovesPass,
+)
+"""The optimisation passes, in the order they are applied."""
+
+INTERPRETERS: Final[dict[str, type[BaseBrainFInterpreter]]] = {
+    "native": NativeBrainFInterpreter,
+    "xdsl": BrainFInterpreter,
+    "bytecode": BytecodeBrainFInterpreter,
+    "transpiled": TranspiledBrainFInterpreter,
+}
+"""The interpreters, keyed by the name of their stage."""
+
+NOISE_FLOOR: Final = 0.01
+"""Slowdowns of fewer seconds than this are never reported as regressions."""
+
+
+@dataclass(frozen=True)
+class Workload:
+    """A BrainF program to benchmark, with its input."""
+
+    name: str
+    """The name of the workload."""
+    source: str
+    """The source code of the program."""
+    input: bytes = b""
+    """The input to the program, with zero stored at the end of the input."""
+    interpreters: tuple[str, ...] = tuple(INTERPRETERS)
+    """The interpreters to run the program with, as the slowest can be skipped
+    for heavy workloads."""
+    fuel: dict[str, int] = field(default_factory=dict[str, int])
+    """The number of loop iterations each named interpreter may run, capping
+    heavy workloads for the slow interpreters. Other interpreters run the
+    program to the end."""
+    repeats: int = 3
+    """The number of times to repeat each stage, keeping the fastest."""
+
+
+HELLO_WORLD: Final = (
+    ">++++++++[<+++++++++>-]<.>++++[<+++++++>-]<+.+++++++..+++.>>++++++"
+    "[<+++++++>-]<++.------------.>++++++[<+++++++++>-]"
+    "<+.<.+++.------.--------.>>>++++[<++++++++>-]<+."
+)
+
+
+def generate_nested_loops(depth: int, count: int) -> str:
+    """Generate a compute-bound program of nested counted loops.
+
+    Like the inner loops of a Mandelbrot renderer, the innermost loop body
+    runs `count ** depth` times, so the program's run time is dominated by
+    tight arithmetic loops rather than by its size.
+    """
+    # The innermost loop body itself contains a loop, so is not recognised as
+    # a multiply-add idiom and optimised away
+    return ("+" * count + "[>") * depth + "+[-]" + "<-]" * depth
+
+
+def generate_deep_nesting(depth: int) -> str:
+    """Generate a program of loops nested to a depth, which each run once."""
+    return "+" + "[" * depth + "-" + "]" * depth
+
+
+def _at(offset: int, code: str) -> str:
+    """Get the commands running code at a cell offset, then moving back."""
+    if offset >= 0:
+        return ">" * offset + code + "<" * offset
+    return "<" * -offset + code + ">" * -offset
+
+
+def generate_prime_sieve(limit: int) -> str:
+    """Generate a sieve of Eratosthenes, outputting each prime up to a limit.
+
+    Each number has a block of cells on the tape. For each prime, a countdown
+    of its value is carried along the blocks to its right, marking every block
+    it reaches zero at as composite, then the data pointer walks back to the
+    prime's block. Each prime is output as a byte, so the limit must fit in a
+    cell.
+    """
+    block = 8
+    # The cells of each block: whether it is a number rather than the end of
+    # the tape, zero only at the prime being sieved, whether the number may be
+    # prime, the number, the countdown and its period, and two scratch cells
+    marker, home, flag, number, count, period, temp, scratch = range(block)
+    setup = (_at(marker, "+") + _at(home, "+") + _at(flag, "+") + ">" * block) * (
+        limit - 1
+    )
+    setup += "<" * (block * (limit - 1)) + _at(number, "++")
+
+    copy = _at(
+        number,
+        f"[-{_at(count - number, '+')}{_at(period - number, '+')}"
+        f"{_at(temp - number, '+')}]",
+    ) + _at(temp, f"[-{_at(number - temp, '+')}]")
+    # Move the countdown from the previous block and decrement it, marking the
+    # number composite and restarting the countdown when it reaches zero
+    carry = _at(count - block, f"[-{_at(block, '+')}]") + _at(
+        period - block, f"[-{_at(block, '+')}]"
+    )
+    restart = (
+        _at(flag - temp, "[-]")
+        + _at(
+            period - temp,
+            f"[-{_at(count - period, '+')}{_at(scratch - period, '+')}]",
+        )
+        + _at(scratch - temp, f"[-{_at(period - scratch, '+')}]")
+    )
+    on_zero = (
+        _at(temp, "+")
+        + _at(count, f"[{_at(temp - count, '-')}[-{_at(scratch - count, '+')}]]")
+        + _at(scratch, f"[-{_at(count - scratch, '+')}]")
+        + _at(temp, f"[-{restart}]")
+    )
+    walk = ">" * block + "[" + carry + _at(count, "-") + on_zero + ">" * block + "]"
+    clear = _at(count - block, "[-]") + _at(period - block, "[-]")
+    walk_back = "<" * block + _at(home, "[" + "<" * block + "]") + _at(home, "+")
+    sieve = _at(
+        flag,
+        "["
+        + "<" * flag
+        + copy
+        + _at(number, ".")
+        + _at(home, "-")
+        + walk
+        + clear
+        + walk_back
+        + ">" * flag
+        + "[-]]",
+    )
+    step = _at(number, f"[-{_at(block, '+')}]") + _at(number + block, "+") + ">" * block
+    return setup + "[" + sieve + step + "]"
+
+
+MAX_POINTER: Final = 1000
+"""The furthest cell from the start of the tape generated programs move to."""
+
+
+def generate_long_program(length: int, seed: int = 0) -> str:
+    """Generate a long loop-light program of random straight-line commands.
+
+    The data pointer is kept on the tape, and occasional clear loops and
+    output commands are mixed in.
+    """
+    rng = random.Random(seed)  # noqa: S311
+    commands: list[str] = []
+    pointer = 0
+    while len(commands) < length:
+        choice = rng.random()
+        if choice < 0.5:  # noqa: PLR2004
+            commands.append(rng.choice("+-"))
+        elif (choice < 0.72 or pointer == 0) and pointer < MAX_POINTER:  # noqa: PLR2004
+            commands.append(">")
+            pointer += 1
+        elif choice < 0.95:  # noqa: PLR2004
+            commands.append("<")
+            pointer -= 1
+        elif choice < 0.98:  # noqa: PLR2004
+            commands.append("[-]")
+        else:
+            commands.append(".")
+    return "".join(commands)
+
+
+def generate_text(length: int, seed: int = 0) -> bytes:
+    """Generate random printable text of a length, to use as input."""
+    rng = random.Random(seed)  # noqa: S311
+    alphabet = b"abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ\n"
+    return bytes(rng.choice(alphabet) for _ in range(length))
+
+
+def get_corpus() -> list[Workload]:
+    """Get the corpus of workloads to benchmark."""
+    return [
+        Workload("hello-world", HELLO_WORLD),
+        # The full program runs over 20 million loop iterations
+        Workload(
+            "hanoi",
+            (ROOT / "tests" / "examples" / "hanoi.bf").read_text(),
+            fuel={"native": 500_000, "xdsl": 50_000, "bytecode": 2_000_000},
+            repeats=1,
+        ),
+        Workload("prime-sieve", generate_prime_sieve(250)),
+        Workload("nested-loops", generate_nested_loops(3, 30)),
+        # xDSL recurses into nested regions when rewriting and cloning, so
+        # much deeper programs overflow the Python stack
+        Workload("deep-nesting", generate_deep_nesting(150)),
+        Workload("long-program", generate_long_program(20_000)),
+        Workload("cat-filter", ",[.,]", generate_text(1 << 16)),
+        Workload("shift-filter", ",[+.,]", generate_text(1 << 16, seed=1)),
+    ]
+
+
+@contextlib.contextmanager
+def _timed(results: dict[str, float], stage: str) -> Iterator[None]:
+    """Record the time taken by a stage, keeping the fastest repeat."""
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    results[stage] = min(elapsed, results.get(stage, elapsed))
+
+
+def _run_stages(workload: Workload, results: dict[str, float]) -> None:
+    """Run each stage of a workload once, recording the time taken by each."""
+    ctx = get_context()
+    with _timed(results, "lex"):
+        BrainFLexer(Input(workload.source, workload.name)).lex_commands()
+    with _timed(results, "parse"):
+        module = BrainFParser(Path(workload.name), workload.source).parse()
+    # Parse other copies to lower, as cloning recurses into nested loops
+    lowered = BrainFParser(Path(workload.name), workload.source).parse()
+    lowered_direct = BrainFParser(Path(workload.name), workload.source).parse()
+    with _timed(results, "parse-packed"):
+        BrainFParser(Path(workload.name), workload.source, packed=True).parse()
+    for pass_type in PASSES:
+        with _timed(results, pass_type.name):
+            pass_type().apply(ctx, module)
+    with _timed(results, LowerBfToBuiltinPass.name):
+        LowerBfToBuiltinPass().apply(ctx, lowered)
+    with _timed(results, DirectLowerBfToBuiltinPass.name):
+        DirectLowerBfToBuiltinPass().apply(ctx, lowered_direct)
+    for name in workload.interpreters:
+        _run_interpreter(workload, INTERPRETERS[name], module, results, name)
+
+
+def _run_interpreter(
+    workload: Workload,
+    interpreter_type: type[BaseBrainFInterpreter],
+    module: ModuleOp,
+    results: dict[str, float],
+    stage: str,
+) -> None:
+    """Run an interpreter on a workload, recording the time taken."""
+    state = BfState(
+        input_stream=BytesIO(workload.input),
+        output_stream=StringIO(),
+        eof_policy=EofPolicy.ZERO,
+        fuel=workload.fuel.get(stage),
+    )
+    interpreter = interpreter_type(state)
+    # The interpreters print a trailing line, which is not part of the output
+    with (
+        contextlib.redirect_stdout(StringIO()),
+        _timed(results, stage),
+        contextlib.suppress(BudgetExceeded),
+    ):
+        interpreter.interpret(module)
+
+
+def run_benchmarks(
+    corpus: Sequence[Workload],
+    repeats: int | None = None,
+    log: Callable[[str], object] = print,
+) -> dict[str, dict[str, float]]:
+    """Run the benchmarks, returning the seconds taken by each stage."""
+    results: dict[str, dict[str, float]] = {}
+    for workload in corpus:
+        results[workload.name] = {}
+        for _ in range(workload.repeats if repeats is None else repeats):
+            _run_stages(workload, results[workload.name])
+        log(f"{workload.name}: {_format_stages(results[workload.name])}")
+    return results
+
+
+def _format_stages(stages: dict[str, float]) -> str:
+    """Format the times taken by stages for logging."""
+    return ", ".join(f"{stage} {seconds:.4f}s" for stage, seconds in stages.items())
+
+
+def find_regressions(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float,
+) -> list[str]:
+    """Find the stages which are slower than the baseline by over a threshold.
+
+    Args:
+        results: The seconds taken by each stage of each workload.
+        baseline: The seconds taken by each stage in the baseline.
+        threshold: The fraction by which a stage may be slower than the
+            baseline, such as 0.25 for 25%.
+
+    Returns:
+        A description of each regression.
+    """
+    regressions: list[str] = []
+    for workload, stages in results.items():
+        for stage, seconds in stages.items():
+            if (expected := baseline.get(workload, {}).get(stage)) is None:
+                continue
+            if seconds > expected * (1 + threshold) + NOISE_FLOOR:
+                regressions.append(
+                    f"{workload} {stage}: {seconds:.4f}s against {expected:.4f}s "
+                    f"(+{(seconds / expected - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark each stage of compiling and interpreting BrainF."
+    )
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="the allowed fractional slowdown against the baseline",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store the results as the new baseline",
+    )
+    parser.add_argument(
+        "--repeats", type=int, help="override the repeats of each workload"
+    )
+    parser.add_argument(
+        "--workload", action="append", help="only run the named workloads"
+    )
+    args = parser.parse_args(argv)
+
+    corpus = get_corpus()
+    if args.workload:
+        corpus = [workload for workload in corpus if workload.name in args.workload]
+    results = run_benchmarks(corpus, args.repeats)
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        return 0
+    if not args.baseline.exists():
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    if regressions := find_regressions(results, baseline, args.threshold):
+        print("Regressions against the baseline:", *regressions, sep="\n  ")
+        return 1
+    print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""Batch runner for many short BrainF jobs across a pool of worker processes.
+
+Starting a Python process for each job pays for importing xDSL and building a
+context every time. Instead, jobs are spread across a pool of warm worker
+processes, which each compile every distinct program once and cache it by the
+hash of its source, so repeated programs are only compiled once per worker.
+Each worker keeps only its most recently used programs, so long-running pools
+fed many distinct programs do not grow without bound.
+
+Results are yielded in the order the jobs complete, with the time taken by
+each, and any error raised by a job is captured in its result rather than
+stopping the batch.
+
+Jobs can also be run from the command line, reading them as JSON lines:
+
+    python -m xdslbf.batch jobs.jsonl > results.jsonl
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from io import BytesIO
+from typing import Any, Final, TextIO
+
+from xdsl.context import Context
+
+from xdslbf.compiler import compile_brainf, get_context
+from xdslbf.interpreters import BfState, EofPolicy
+from xdslbf.interpreters.bytecode import (
+    BytecodeBrainFInterpreter,
+    BytecodeProgram,
+    compile_program,
+)
+
+MAX_PENDING_PER_WORKER: Final = 4
+"""The number of jobs queued for each worker, bounding the jobs in memory."""
+
+MAX_CACHED_PROGRAMS: Final = 1 << 10
+"""The number of compiled programs each worker keeps, evicting the least
+recently used first."""
+
+
+@dataclass(frozen=True)
+class Job:
+    """A BrainF program to run with an input."""
+
+    id: str
+    """The identifier of the job, which its result is labelled with."""
+    program: str
+    """The source code of the program."""
+    input: bytes = b""
+    """The input to the program, with zero stored at the end of the input."""
+    fuel: int | None = None
+    """The number of loop iterations the program may run, or `None`."""
+
+
+@dataclass(frozen=True)
+class JobResult:
+    """The result of running a job."""
+
+    id: str
+    """The identifier of the job."""
+    output: bytes = b""
+    """The output of the program, up to any error."""
+    error: str | None = None
+    """The error raised by the job, if any, as `"Type: message"`."""
+    compile_seconds: float = 0.0
+    """The time taken to compile the program, or zero if it was cached."""
+    run_seconds: float = 0.0
+    """The time taken to run the program."""
+    cached: bool = False
+    """Whether the compiled program was cached by the worker."""
+
+    def to_json(self) -> dict[str, Any]:
+        """Get the result as a JSON-serialisable dictionary."""
+        return {**asdict(self), "output": self.output.decode("latin-1")}
+
+
+_context: Context | None = None
+_programs: OrderedDict[str, BytecodeProgram] = OrderedDict()
+"""The programs compiled by this worker, keyed by the hash of their source,
+from the least to the most recently used."""
+
+
+def _init_worker() -> None:
+    """Warm up a worker process, by building its context once."""
+    global _context  # noqa: PLW0603
+    _context = get_context()
+
+
+def _describe_error(exc: Exception) -> str:
+    """Describe an error raised by a job."""
+    return f"{type(exc).__name__}: {exc}"
+
+
+def run_job(job: Job) -> JobResult:
+    """Run a job, capturing any error in its result."""
+    if _context is None:
+        _init_worker()
+    assert _context is not None
+
+    key = hashlib.sha256(job.program.encode()).hexdigest()
+    cached = key in _programs
+    compile_seconds = 0.0
+    if cached:
+        _programs.move_to_end(key)
+    else:
+        start = time.perf_counter()
+        try:
+            module = compile_brainf(job.program, _context)
+            _programs[key] = compile_program(module)
+        except Exception as exc:  # noqa: BLE001
+            return JobResult(
+                job.id,
+                error=_describe_error(exc),
+                compile_seconds=time.perf_counter() - start,
+            )
+        compile_seconds = time.perf_counter() - start
+        if len(_programs) > MAX_CACHED_PROGRAMS:
+            _programs.popitem(last=False)
+
+    output = BytesIO()
+    state = BfState(
+        input_stream=BytesIO(job.input),
+        output_stream=output,
+        eof_policy=EofPolicy.ZERO,
+        fuel=job.fuel,
+    )
+    error = None
+    start = time.perf_counter()
+    try:
+        BytecodeBrainFInterpreter(state).run(_programs[key])
+    except Exception as exc:  # noqa: BLE001
+        error = _describe_error(exc)
+    run_seconds = time.perf_counter() - start
+    state.sink.flush()
+    return JobResult(
+        job.id, output.getvalue(), error, compile_seconds, run_seconds, cached
+    )
+
+
+def run_batch(
+    jobs: Iterable[Job], max_workers: int | None = None
+) -> Iterator[JobResult]:
+    """Run jobs across a pool of worker processes.
+
+    Jobs are read from the iterable lazily, so only a bounded number are
+    queued at once, and results are yielded in the order the jobs complete.
+
+    Args:
+        jobs: The jobs to run.
+        max_workers: The number of worker processes, by default the number
+            of processors.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers, initializer=_init_worker) as executor:
+        max_pending = workers * MAX_PENDING_PER_WORKER
+        pending: set[Future[JobResult]] = set()
+        for job in jobs:
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+            pending.add(executor.submit(run_job, job))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from (future.result() for future in done)
+
+
+def read_jobs(stream: TextIO) -> Iterator[Job]:
+    """Read jobs from a stream of JSON lines.
+
+    Each line is an object with an `"id"`, the `"program"` source code, and
+    optionally the `"input"` as a string and the `"fuel"` to run with.
+    """
+    for line in stream:
+        if not line.strip():
+            continue
+        data = json.loads(line)
+        yield Job(
+            str(data["id"]),
+            data["program"],
+            data.get("input", "").encode("latin-1"),
+            data.get("fuel"),
+        )
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Run a batch of jobs from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Run a batch of BrainF jobs across worker processes."
+    )
+    parser.add_argument(
+        "jobs",
+        type=argparse.FileType("r"),
+        nargs="?",
+        default=sys.stdin,
+        help="JSON lines of jobs, by default read from standard input",
+    )
+    parser.add_argument("--workers", type=int, help="the number of workers")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for result in run_batch(read_jobs(args.jobs), args.workers):
+        failed |= result.error is not None
+        print(json.dumps(result.to_json()), flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
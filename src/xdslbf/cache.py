@@ -0,0 +1,174 @@
+"""Content-addressed on-disk cache of compiled BrainF programs.
+
+Entries are keyed on a hash of the program's source, the configuration of the
+pipeline which compiled it, and the versions of this package and xDSL, so any
+change to them misses the cache rather than returning stale results. Each
+entry is written atomically, by writing a temporary file then renaming it over
+the entry, so concurrent processes never read partial entries.
+
+The total size of the entries is bounded, with the least recently used entries
+evicted first, tracked by the modification times of their files. Only the
+cache's own entries are evicted or cleared, so other files in the directory
+are left in place.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass, field
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Final
+
+ENTRY_KINDS: Final = frozenset(("mlir", "bytecode", "so"))
+"""The kinds of result stored in the cache, used as the suffixes of entries."""
+
+_KEY: Final = re.compile(r"[0-9a-f]{64}")
+
+
+def _get_version(package: str) -> str:
+    """Get the installed version of a package, or an empty string if missing."""
+    try:
+        return version(package)
+    except PackageNotFoundError:
+        return ""
+
+
+def get_default_cache_directory() -> Path:
+    """Get the default cache directory, following the XDG base directory spec."""
+    if cache_home := os.environ.get("XDG_CACHE_HOME"):
+        return Path(cache_home) / "xdslbf"
+    return Path.home() / ".cache" / "xdslbf"
+
+
+def cache_key(source: str, pipeline: Sequence[str]) -> str:
+    """Get the cache key of a program compiled by a pipeline.
+
+    Args:
+        source: The source code of the program.
+        pipeline: The configuration of the pipeline, such as its pass names.
+    """
+    digest = hashlib.sha256()
+    for part in (
+        _get_version("xdslbf"),
+        _get_version("xdsl"),
+        *pipeline,
+    ):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    digest.update(source.encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class CompileCache:
+    """A size-bounded LRU cache of compiled programs in a directory."""
+
+    directory: Path = field(default_factory=get_default_cache_directory)
+    """The directory the entries are stored in."""
+    max_size: int = 1 << 26
+    """The maximum total size in bytes of the entries."""
+
+    def _path(self, key: str, kind: str) -> Path:
+        """Get the path of the entry for a key and kind of result.
+
+        Raises:
+            ValueError: If the key is not from `cache_key`, or the kind is not
+                one of `ENTRY_KINDS`.
+        """
+        if not _KEY.fullmatch(key):
+            raise ValueError(f"Invalid cache key {key!r}")
+        if kind not in ENTRY_KINDS:
+            raise ValueError(f"Invalid kind of cache entry {kind!r}")
+        return self.directory / f"{key}.{kind}"
+
+    def _entries(self) -> Iterator[os.DirEntry[str]]:
+        """Iterate over the entries in the directory, skipping other files."""
+        try:
+            files = os.scandir(self.directory)
+        except FileNotFoundError:
+            return
+        with files:
+            for file in files:
+                key, _, kind = file.name.partition(".")
+                if (
+                    kind in ENTRY_KINDS
+                    and _KEY.fullmatch(key)
+                    and file.is_file(follow_symlinks=False)
+                ):
+                    yield file
+
+    def get(self, key: str, kind: str) -> bytes | None:
+        """Get the entry for a key and kind of result, or `None` if missing."""
+        path = self._path(key, kind)
+        try:
+            data = path.read_bytes()
+            # Mark the entry as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key: str, kind: str, data: bytes) -> None:
+        """Atomically store the entry for a key and kind of result."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        file, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(file, "wb") as temporary_file:
+                temporary_file.write(data)
+            Path(temporary).replace(self._path(key, kind))
+        except BaseException:
+            Path(temporary).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def get_path(self, key: str, kind: str) -> Path | None:
+        """Get the file of the entry for a key and kind, or `None` if missing.
+
+        This is for entries which are used from their file, such as shared
+        libraries, rather than read into memory.
+        """
+        path = self._path(key, kind)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put_path(self, key: str, kind: str, source: Path) -> Path:
+        """Atomically move a file into the entry for a key and kind of result.
+
+        The file should be on the same file system as the cache directory,
+        such as in a temporary directory created in it.
+
+        Returns:
+            The file of the entry.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key, kind)
+        source.replace(path)
+        self.evict()
+        return path
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until within the size bound."""
+        entries: list[tuple[float, int, Path]] = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        """Remove all the entries."""
+        for entry in self._entries():
+            Path(entry.path).unlink(missing_ok=True)
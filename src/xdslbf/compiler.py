@@ -4,14 +4,24 @@
 from pathlib import Path
 
 from xdsl.context import Context
-from xdsl.dialects import arith, cf, func, memref, scf
+from xdsl.dialects import arith, cf, func, linalg, memref, scf
 from xdsl.dialects.builtin import Builtin, ModuleOp
+from xdsl.parser import Parser
 from xdsl.printer import Printer
 
-from xdslbf.dialects import bf
-from xdslbf.frontend import BrainFParser
+from xdslbf.cache import CompileCache, cache_key
+from xdslbf.dialects import bf, bfe
+from xdslbf.frontend import BrainFParser, parse_file
 from xdslbf.interpreters import BrainFInterpreter
-from xdslbf.transforms import LowerBfToBuiltinPass
+from xdslbf.interpreters.bytecode import BytecodeProgram, compile_program
+from xdslbf.transforms import (
+    DeferMovesPass,
+    FoldRunsPass,
+    LowerBfToBuiltinPass,
+    PackCommandsPass,
+    RecogniseLoopIdiomsPass,
+    UnpackCommandsPass,
+)
 
 
 def get_context() -> Context:
@@ -21,15 +31,110 @@ def get_context() -> Context:
     ctx.load_dialect(scf.Scf)
     ctx.load_dialect(cf.Cf)
     ctx.load_dialect(memref.MemRef)
+    ctx.load_dialect(linalg.Linalg)
     ctx.load_dialect(func.Func)
     ctx.load_dialect(Builtin)
     ctx.load_dialect(bf.BrainF)
+    ctx.load_dialect(bfe.BrainFExtended)
     return ctx
 
 
-def parse_brainf(program: str) -> ModuleOp:
-    """Parse a BrainF program."""
-    return BrainFParser(Path("in_memory"), program).parse()
+def parse_brainf(program: str, *, packed: bool = False) -> ModuleOp:
+    """Parse a BrainF program, optionally packing straight-line commands."""
+    return BrainFParser(Path("in_memory"), program, packed=packed).parse()
+
+
+def parse_brainf_file(path: Path | str, *, packed: bool = False) -> ModuleOp:
+    """Parse a BrainF program from a file, streaming it rather than reading it."""
+    return parse_file(path, packed=packed)
+
+
+def optimise_brainf(
+    module: ModuleOp, ctx: Context, *, packed: bool = False
+) -> ModuleOp:
+    """Apply optimisation passes to a parsed BrainF program.
+
+    Packed commands are expanded before optimising, as the optimisation passes
+    only rewrite unpacked operations, and the remaining runs of straight-line
+    instructions are packed again afterwards.
+    """
+    if packed:
+        UnpackCommandsPass().apply(ctx, module)
+    FoldRunsPass().apply(ctx, module)
+    RecogniseLoopIdiomsPass().apply(ctx, module)
+    DeferMovesPass().apply(ctx, module)
+    if packed:
+        PackCommandsPass().apply(ctx, module)
+    return module
+
+
+def get_pipeline(*, optimise: bool = True, packed: bool = False) -> list[str]:
+    """Get the names of the stages which compile a BrainF program."""
+    pipeline = ["parse-packed" if packed else "parse"]
+    if optimise:
+        pipeline.extend(
+            [
+                *([UnpackCommandsPass.name] if packed else []),
+                FoldRunsPass.name,
+                RecogniseLoopIdiomsPass.name,
+                DeferMovesPass.name,
+                *([PackCommandsPass.name] if packed else []),
+            ]
+        )
+    return pipeline
+
+
+def compile_brainf(
+    program: str,
+    ctx: Context,
+    *,
+    optimise: bool = True,
+    packed: bool = False,
+    cache: CompileCache | None = None,
+) -> ModuleOp:
+    """Parse and optionally optimise a BrainF program, using a cache if given.
+
+    Modules are cached as printed MLIR, which is parsed on a cache hit rather
+    than re-running the frontend and optimisation passes.
+    """
+    if cache is None:
+        module = parse_brainf(program, packed=packed)
+        return optimise_brainf(module, ctx, packed=packed) if optimise else module
+
+    key = cache_key(program, get_pipeline(optimise=optimise, packed=packed))
+    if (data := cache.get(key, "mlir")) is not None:
+        return Parser(ctx, data.decode()).parse_module()
+    module = compile_brainf(program, ctx, optimise=optimise, packed=packed)
+    cache.put(key, "mlir", str(module).encode())
+    return module
+
+
+def compile_bytecode(
+    program: str,
+    ctx: Context,
+    *,
+    optimise: bool = True,
+    cache: CompileCache | None = None,
+) -> BytecodeProgram:
+    """Compile a BrainF program to bytecode, using a cache if given.
+
+    Bytecode is cached in its serialised form, so a cache hit skips the
+    frontend, the optimisation passes and the bytecode compiler entirely. An
+    entry which cannot be deserialised, such as a truncated file, is treated
+    as a miss, and overwritten.
+    """
+    if cache is None:
+        return compile_program(compile_brainf(program, ctx, optimise=optimise))
+
+    key = cache_key(program, [*get_pipeline(optimise=optimise), "bytecode"])
+    if (data := cache.get(key, "bytecode")) is not None:
+        try:
+            return BytecodeProgram.from_bytes(data)
+        except ValueError:
+            pass
+    bytecode = compile_bytecode(program, ctx, optimise=optimise)
+    cache.put(key, "bytecode", bytecode.to_bytes())
+    return bytecode
 
 
 def lower_bf_builtin(program: str, ctx: Context) -> ModuleOp:
@@ -16,20 +16,34 @@ From [Wikipedia](https://en.wikipedia.org/wiki/Brainfuck#Language_design):
 - . = Output the byte at the data pointer.
 - , = Accept one byte of input, storing its value in the byte at the data
   pointer.
+
+Runs of the commands other than loops can also be packed into a single
+`bf.commands` operation, so straight-line code does not need an operation per
+character.
 """
 
 import abc
+import re
 from collections.abc import Sequence
-from typing import Any
+from functools import lru_cache
+from typing import Any, Final
 
+from xdsl.dialects.builtin import StringAttr
 from xdsl.ir import Block, Dialect, Operation, Region
 from xdsl.irdl import (
     IRDLOperation,
     irdl_op_definition,
+    prop_def,
     region_def,
     traits_def,
 )
 from xdsl.traits import IsTerminator, MemoryReadEffect, MemoryWriteEffect
+from xdsl.utils.exceptions import VerifyException
+
+STRAIGHT_LINE_COMMANDS: Final = "+-<>.,"
+"""The commands which can be packed into a `bf.commands` operation."""
+
+_STRAIGHT_LINE_RUN: Final = re.compile(r"([-+<>.,])\1*")
 
 
 class BrainFOperation(IRDLOperation, abc.ABC):
@@ -151,6 +165,49 @@ class InOp(BrainFOperation):
     traits = traits_def(MemoryWriteEffect())
 
 
+@lru_cache(maxsize=1 << 12)
+def _get_runs(commands: str) -> tuple[tuple[str, int], ...]:
+    """Run-length encode a string of commands."""
+    return tuple(
+        (match.group(1), match.end() - match.start())
+        for match in _STRAIGHT_LINE_RUN.finditer(commands)
+    )
+
+
+@irdl_op_definition
+class CommandsOp(BrainFOperation):
+    """Packed straight-line commands.
+
+    Run a sequence of the `+`, `-`, `<`, `>`, `.` and `,` commands in order,
+    stored as a string rather than as an operation per command.
+    """
+
+    name = "bf.commands"
+
+    commands = prop_def(StringAttr)
+    traits = traits_def(MemoryReadEffect(), MemoryWriteEffect())
+
+    def __init__(self, commands: str | StringAttr):
+        """Instantiate the operation with the commands to run."""
+        if isinstance(commands, str):
+            commands = StringAttr(commands)
+        super().__init__(properties={"commands": commands})
+
+    def verify_(self) -> None:
+        """Verify the operation only packs straight-line commands."""
+        commands = self.commands.data
+        if not commands:
+            raise VerifyException("Expected at least one command")
+        if invalid := set(commands).difference(STRAIGHT_LINE_COMMANDS):
+            raise VerifyException(
+                f"Expected only straight-line commands, got {sorted(invalid)}"
+            )
+
+    def get_runs(self) -> tuple[tuple[str, int], ...]:
+        """Get the (command, count) pairs of the runs of repeated commands."""
+        return _get_runs(self.commands.data)
+
+
 BrainF = Dialect(
     "bf",
     [
@@ -162,6 +219,7 @@ BrainF = Dialect(
         RetOp,
         OutOp,
         InOp,
+        CommandsOp,
     ],
     [],
 )
@@ -0,0 +1,188 @@
+"""Extended dialect for optimising BrainF programs.
+
+The operations in the `bf` dialect map one-to-one onto the characters of the
+source program. This dialect adds coarser-grained operations which summarise
+common sequences of BrainF instructions, so that optimisation passes can
+rewrite programs into a form which is cheaper to interpret and compile.
+"""
+
+from collections.abc import Sequence
+from typing import cast
+
+from xdsl.dialects.builtin import I64, DenseArrayBase, IntegerAttr, i64
+from xdsl.ir import Dialect
+from xdsl.irdl import irdl_op_definition, opt_prop_def, prop_def, traits_def
+from xdsl.traits import MemoryReadEffect, MemoryWriteEffect
+from xdsl.utils.exceptions import VerifyException
+
+from xdslbf.dialects.bf import BrainFOperation
+
+
+def _cell_properties(
+    value: int | IntegerAttr[I64], offset: int
+) -> dict[str, IntegerAttr[I64]]:
+    """Get the properties of an operation on a cell offset from the pointer."""
+    if isinstance(value, int):
+        value = IntegerAttr(value, i64)
+    properties = {"value": value}
+    if offset:
+        properties["offset"] = IntegerAttr(offset, i64)
+    return properties
+
+
+@irdl_op_definition
+class AddOp(BrainFOperation):
+    """Counted add operation.
+
+    Add a constant value to the byte at the data pointer, equivalent to a run
+    of `+` (for positive values) or `-` (for negative values) instructions.
+
+    The operation can instead target the byte at a constant offset from the
+    data pointer, so pointer movement around it can be deferred.
+    """
+
+    name = "bfe.add"
+
+    value = prop_def(IntegerAttr[I64])
+    offset = opt_prop_def(IntegerAttr[I64])
+    traits = traits_def(MemoryWriteEffect())
+
+    def __init__(self, value: int | IntegerAttr[I64], offset: int = 0):
+        """Instantiate the operation with the value to add."""
+        super().__init__(properties=_cell_properties(value, offset))
+
+    def get_offset(self) -> int:
+        """Get the offset of the target cell from the data pointer."""
+        return 0 if self.offset is None else self.offset.value.data
+
+
+@irdl_op_definition
+class MoveOp(BrainFOperation):
+    """Counted move operation.
+
+    Move the data pointer by a constant distance, equivalent to a run of `>`
+    (for positive distances) or `<` (for negative distances) instructions.
+    """
+
+    name = "bfe.move"
+
+    distance = prop_def(IntegerAttr[I64])
+    traits = traits_def(MemoryWriteEffect())
+
+    def __init__(self, distance: int | IntegerAttr[I64]):
+        """Instantiate the operation with the distance to move."""
+        if isinstance(distance, int):
+            distance = IntegerAttr(distance, i64)
+        super().__init__(properties={"distance": distance})
+
+
+@irdl_op_definition
+class SetOp(BrainFOperation):
+    """Set operation.
+
+    Set the byte at the data pointer to a constant value, equivalent to a
+    clear loop such as `[-]` optionally followed by a run of `+` or `-`.
+
+    The operation can instead target the byte at a constant offset from the
+    data pointer, so pointer movement around it can be deferred.
+    """
+
+    name = "bfe.set"
+
+    value = prop_def(IntegerAttr[I64])
+    offset = opt_prop_def(IntegerAttr[I64])
+    traits = traits_def(MemoryWriteEffect())
+
+    def __init__(self, value: int | IntegerAttr[I64] = 0, offset: int = 0):
+        """Instantiate the operation with the value to set."""
+        super().__init__(properties=_cell_properties(value, offset))
+
+    def get_offset(self) -> int:
+        """Get the offset of the target cell from the data pointer."""
+        return 0 if self.offset is None else self.offset.value.data
+
+
+@irdl_op_definition
+class MulAddOp(BrainFOperation):
+    """Multiply-add operation.
+
+    Add the byte at the data pointer multiplied by a constant factor to the
+    bytes at constant offsets from the data pointer, then set the byte at the
+    data pointer to zero. This is equivalent to a balanced loop such as
+    `[->+>++<<]`, which decrements the current cell by one on each iteration.
+    """
+
+    name = "bfe.mul_add"
+
+    offsets = prop_def(DenseArrayBase[I64])
+    factors = prop_def(DenseArrayBase[I64])
+    traits = traits_def(MemoryReadEffect(), MemoryWriteEffect())
+
+    def __init__(self, offsets: Sequence[int], factors: Sequence[int]):
+        """Instantiate the operation with the offsets and factors to add."""
+        super().__init__(
+            properties={
+                "offsets": DenseArrayBase.create_dense_int(i64, offsets),
+                "factors": DenseArrayBase.create_dense_int(i64, factors),
+            }
+        )
+
+    def verify_(self) -> None:
+        """Verify there is a factor for each offset."""
+        if len(self.offsets) != len(self.factors):
+            raise VerifyException(
+                f"Expected the same number of offsets ({len(self.offsets)}) "
+                f"and factors ({len(self.factors)})"
+            )
+        if 0 in self.get_offsets():
+            raise VerifyException("Expected offsets other than the data pointer")
+
+    def get_offsets(self) -> tuple[int, ...]:
+        """Get the offsets from the data pointer of the operation."""
+        return cast(tuple[int, ...], self.offsets.get_values())
+
+    def get_factors(self) -> tuple[int, ...]:
+        """Get the factors of the operation."""
+        return cast(tuple[int, ...], self.factors.get_values())
+
+    def get_terms(self) -> list[tuple[int, int]]:
+        """Get the (offset, factor) pairs of the operation."""
+        return list(zip(self.get_offsets(), self.get_factors(), strict=True))
+
+
+@irdl_op_definition
+class ScanOp(BrainFOperation):
+    """Scan operation.
+
+    Move the data pointer by a constant stride until it points at a zero
+    byte, equivalent to a scan loop such as `[>]`, `[<]` or `[>>>]`.
+    """
+
+    name = "bfe.scan"
+
+    stride = prop_def(IntegerAttr[I64])
+    traits = traits_def(MemoryReadEffect(), MemoryWriteEffect())
+
+    def __init__(self, stride: int | IntegerAttr[I64]):
+        """Instantiate the operation with the stride to scan by."""
+        if isinstance(stride, int):
+            stride = IntegerAttr(stride, i64)
+        super().__init__(properties={"stride": stride})
+
+    def verify_(self) -> None:
+        """Verify the scan moves the data pointer."""
+        if not self.stride.value.data:
+            raise VerifyException("Expected a non-zero stride")
+
+
+BrainFExtended = Dialect(
+    "bfe",
+    [
+        AddOp,
+        MoveOp,
+        SetOp,
+        MulAddOp,
+        ScanOp,
+    ],
+    [],
+)
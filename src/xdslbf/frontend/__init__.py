@@ -1,11 +1,13 @@
 """Frontend (lexer and parser) for the BrainF language."""
 
 from .lexer import BrainFLexer, BrainFToken, BrainFTokenKind
-from .parser import BrainFParser
+from .parser import BrainFParser, MismatchedBracketError, parse_file
 
 __all__ = [
     "BrainFTokenKind",
     "BrainFToken",
     "BrainFLexer",
     "BrainFParser",
+    "MismatchedBracketError",
+    "parse_file",
 ]
@@ -1,10 +1,13 @@
 """Lexer for the BrainF language."""
 
+import re
+from bisect import bisect_right
+from collections.abc import Iterator
+from dataclasses import dataclass
 from enum import Enum, auto
-from typing import TypeAlias
+from typing import Final, TypeAlias
 
-from xdsl.utils.exceptions import ParseError
-from xdsl.utils.lexer import Lexer, Span, Token
+from xdsl.utils.lexer import Lexer, Token
 
 
 class BrainFTokenKind(Enum):
@@ -35,6 +38,49 @@ TOKEN_LOOKUP: dict[str | None, BrainFTokenKind] = {
 
 BrainFToken: TypeAlias = Token[BrainFTokenKind]
 
+COMMAND_RUN: Final = re.compile(r"[-+<>\[\].,]+")
+"""A pattern matching runs of command characters in BrainF source code."""
+
+MAX_COMMAND_RUN: Final = 1 << 16
+"""The maximum length of each run of commands lexed from a byte stream."""
+
+COMMAND_RUN_BYTES: Final = re.compile(rb"[-+<>\[\].,]{1,%d}" % MAX_COMMAND_RUN)
+"""A pattern matching bounded runs of command bytes in BrainF source code."""
+
+
+@dataclass
+class BrainFCommands:
+    """The commands of a BrainF program, with comments removed.
+
+    Rather than storing the source position of every command, the position of
+    each run of consecutive commands is stored, which is enough to map any
+    command back to its position for error reporting.
+    """
+
+    commands: str
+    """The command characters of the program, in order."""
+    run_starts: list[int]
+    """The index in `commands` of the start of each run of commands."""
+    run_positions: list[int]
+    """The position in the source of the start of each run of commands."""
+
+    def position(self, index: int) -> int:
+        """Get the position in the source of the command at an index."""
+        run = bisect_right(self.run_starts, index) - 1
+        return self.run_positions[run] + index - self.run_starts[run]
+
+    def runs(self) -> Iterator[tuple[str, int]]:
+        """Iterate over the runs of commands and their positions in the source."""
+        for run, (start, position) in enumerate(
+            zip(self.run_starts, self.run_positions, strict=True)
+        ):
+            end = (
+                self.run_starts[run + 1]
+                if run + 1 < len(self.run_starts)
+                else len(self.commands)
+            )
+            yield self.commands[start:end], position
+
 
 class BrainFLexer(Lexer[BrainFTokenKind]):
     """Lexer for the BrainF language."""
@@ -46,11 +92,28 @@ class BrainFLexer(Lexer[BrainFTokenKind]):
         return res
 
     def lex(self) -> BrainFToken:
-        """Lex the program."""
-        if (current_char := self._get_char()) in TOKEN_LOOKUP:
-            return self._form_token(TOKEN_LOOKUP[current_char], self.pos)
-
-        raise ParseError(
-            Span(self.pos, self.pos + 1, self.input),
-            f"Unexpected character: {current_char}",
-        )
+        """Lex the next token of the program, skipping comments."""
+        current_char = self._get_char()
+        while current_char not in TOKEN_LOOKUP:
+            # Any character other than a command is a comment
+            current_char = self._get_char()
+        return self._form_token(TOKEN_LOOKUP[current_char], self.pos)
+
+    def lex_commands(self) -> BrainFCommands:
+        """Lex the whole program in one pass, skipping comments.
+
+        The program is lexed from its start, regardless of any tokens already
+        lexed, and the lexer is left at its end. Runs of commands are found in
+        bulk with a regular expression, so no objects are allocated per command.
+        """
+        run_starts: list[int] = []
+        run_positions: list[int] = []
+        runs: list[str] = []
+        length = 0
+        for match in COMMAND_RUN.finditer(self.input.content):
+            run_starts.append(length)
+            run_positions.append(match.start())
+            runs.append(run := match.group())
+            length += len(run)
+        self.pos = self.input.len
+        return BrainFCommands("".join(runs), run_starts, run_positions)
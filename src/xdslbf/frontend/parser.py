@@ -1,15 +1,20 @@
 """Parser for the BrainF language."""
 
+import mmap
+import os
+import re
 from pathlib import Path
+from typing import Final
 
 from xdsl.dialects.builtin import ModuleOp
-from xdsl.ir import Block, Region
+from xdsl.ir import Block, Operation, Region
 from xdsl.parser import GenericParser, ParserState
 from xdsl.utils.exceptions import ParseError
-from xdsl.utils.lexer import Input
+from xdsl.utils.lexer import Input, Span
 
 from xdslbf.dialects.bf import (
     BrainFOperation,
+    CommandsOp,
     DecOp,
     IncOp,
     InOp,
@@ -20,6 +25,10 @@ from xdslbf.dialects.bf import (
     RshftOp,
 )
 from xdslbf.frontend import BrainFLexer, BrainFTokenKind
+from xdslbf.frontend.lexer import COMMAND_RUN_BYTES, TOKEN_LOOKUP
+
+STRAIGHT_LINE_OR_BRACKET: Final = re.compile(r"[^\[\]]+|[\[\]]")
+"""A pattern matching runs of straight-line commands, or single loop brackets."""
 
 OPERATION_LOOKUP: dict[BrainFTokenKind, type[BrainFOperation]] = {
     BrainFTokenKind.PLUS: IncOp,
@@ -32,37 +41,157 @@ OPERATION_LOOKUP: dict[BrainFTokenKind, type[BrainFOperation]] = {
     BrainFTokenKind.COMMA: InOp,
 }
 
+COMMAND_LOOKUP: dict[str, type[BrainFOperation]] = {
+    char: OPERATION_LOOKUP[kind]
+    for char, kind in TOKEN_LOOKUP.items()
+    if char is not None and kind in OPERATION_LOOKUP
+}
+
+
+class MismatchedBracketError(ValueError):
+    """Exception to indicate a loop bracket in the source is mis-matched."""
+
+    position: int
+    """The position of the mis-matched bracket in the source."""
+    bracket: str
+    """The mis-matched bracket."""
+
+    def __init__(self, position: int, bracket: str) -> None:
+        """Instantiate the exception with the mis-matched bracket."""
+        super().__init__(f"Mis-matched '{bracket}' at position {position}")
+        self.position = position
+        self.bracket = bracket
+
+
+class ModuleBuilder:
+    """Incrementally build a module from runs of BrainF commands.
+
+    The operations of each block are built bottom-up, so blocks are detached
+    whilst their operations are added, and adding them is cheap.
+
+    If `packed` is set, each run of straight-line commands between loop
+    brackets is built as a single `bf.commands` operation, rather than an
+    operation per command.
+    """
+
+    packed: bool
+    """Whether to pack straight-line commands into `bf.commands` operations."""
+    loop_spans: dict[Operation, tuple[int, int]]
+    """The positions in the source of the brackets of each loop."""
+
+    def __init__(self, *, packed: bool = False) -> None:
+        """Instantiate the builder with an empty module."""
+        self.packed = packed
+        self.loop_spans = {}
+        self._scope: list[list[Operation]] = [[]]
+        self._loop_starts: list[int] = []
+        self._pending: list[str] = []
+
+    def _open_loop(self, position: int) -> None:
+        """Start a loop, at a position in the source."""
+        self._flush_pending()
+        self._scope.append([])
+        self._loop_starts.append(position)
+
+    def _close_loop(self, position: int) -> None:
+        """End the innermost loop, at a position in the source."""
+        if len(self._scope) <= 1:
+            raise MismatchedBracketError(position, "]")
+        self._flush_pending()
+        body = self._scope.pop()
+        body.append(RetOp.create())
+        loop = LoopOp(regions=[Region(Block(body))])
+        self._scope[-1].append(loop)
+        self.loop_spans[loop] = (self._loop_starts.pop(), position)
+
+    def _flush_pending(self) -> None:
+        """Pack the pending straight-line commands into an operation."""
+        if self._pending:
+            self._scope[-1].append(CommandsOp("".join(self._pending)))
+            self._pending.clear()
+
+    def add_commands(self, commands: str, position: int) -> None:
+        """Add a run of commands, starting at a position in the source.
+
+        Raises:
+            MismatchedBracketError: If a loop end has no matching loop start.
+        """
+        if self.packed:
+            for match in STRAIGHT_LINE_OR_BRACKET.finditer(commands):
+                piece = match.group()
+                if piece == "[":
+                    self._open_loop(position + match.start())
+                elif piece == "]":
+                    self._close_loop(position + match.start())
+                else:
+                    self._pending.append(piece)
+            return
+
+        for offset, command in enumerate(commands):
+            if command == "[":
+                self._open_loop(position + offset)
+            elif command == "]":
+                self._close_loop(position + offset)
+            else:
+                # The operations have no operands, results or properties, so
+                # are created directly rather than through their initialiser
+                self._scope[-1].append(COMMAND_LOOKUP[command].create())
+
+    def finish(self) -> ModuleOp:
+        """Get the built module.
+
+        Raises:
+            MismatchedBracketError: If a loop start has no matching loop end.
+        """
+        if self._loop_starts:
+            raise MismatchedBracketError(self._loop_starts[-1], "[")
+        self._flush_pending()
+        return ModuleOp(self._scope[0])
+
 
 class BrainFParser(GenericParser[BrainFTokenKind]):
     """Parser for the BrainF language."""
 
-    def __init__(self, file: Path, program: str):
+    packed: bool
+    """Whether to pack straight-line commands into `bf.commands` operations."""
+    loop_spans: dict[Operation, tuple[int, int]]
+    """The positions in the source of the brackets of each parsed loop."""
+
+    def __init__(self, file: Path, program: str, *, packed: bool = False):
         """Instantiate the parser with the lexer."""
         super().__init__(ParserState(BrainFLexer(Input(program, str(file)))))
+        self.packed = packed
+        self.loop_spans = {}
 
     def parse(self) -> ModuleOp:
         """Parse a BrainF program."""
-        module_op = ModuleOp([])
-        scope: list[Block] = [module_op.body.block]
-
-        while True:
-            token = self._consume_token()
-            if token.kind == BrainFTokenKind.EOF:
-                break
-
-            if token.kind == BrainFTokenKind.SBRACKET_OPEN:
-                scope[-1].add_op(LoopOp(regions=[Region([block := Block([])])]))
-                scope.append(block)
-            elif token.kind == BrainFTokenKind.SBRACKET_CLOSE:
-                if len(scope) < 1:
-                    raise ParseError(token.span, "Mis-matched ']'!")
-                scope.pop().add_op(RetOp())
-            elif token.kind in OPERATION_LOOKUP:
-                scope[-1].add_op(OPERATION_LOOKUP[token.kind]())
-            else:
-                raise ParseError(token.span, "Unsupported token!")
+        lexer = self.lexer
+        assert isinstance(lexer, BrainFLexer)
+        builder = ModuleBuilder(packed=self.packed)
+        self.loop_spans = builder.loop_spans
+        try:
+            for commands, position in lexer.lex_commands().runs():
+                builder.add_commands(commands, position)
+            return builder.finish()
+        except MismatchedBracketError as exc:
+            span = Span(exc.position, exc.position + 1, lexer.input)
+            raise ParseError(span, f"Mis-matched '{exc.bracket}'!") from exc
+
+
+def parse_file(path: Path | str, *, packed: bool = False) -> ModuleOp:
+    """Parse a BrainF program from a file, without reading it all into memory.
 
-        if len(scope) > 1:
-            raise ParseError(token.span, "Mis-matched '['!")
+    The file is memory-mapped, and scanned for bounded runs of commands, so
+    the module is built incrementally without a copy of the whole source.
 
-        return module_op
+    Raises:
+        MismatchedBracketError: If a loop bracket is mis-matched, with the byte
+            offset of the bracket in the file as its position.
+    """
+    builder = ModuleBuilder(packed=packed)
+    with open(path, "rb") as file:  # noqa: PTH123
+        if os.fstat(file.fileno()).st_size:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as source:
+                for match in COMMAND_RUN_BYTES.finditer(source):
+                    builder.add_commands(match.group().decode(), match.start())
+    return builder.finish()
@@ -1,11 +1,32 @@
 """Interpreters for the BrainF language."""
 
-from .base import BfState, PointerOutOfBoundsError
+from .base import (
+    BfState,
+    BudgetExceeded,
+    InputNeeded,
+    PointerOutOfBoundsError,
+    ProgramSuspended,
+)
+from .profile import LoopProfile, Profile
+from .streams import EofPolicy, FlushPolicy, InputSource, OutputSink
+from .tape import PagedTape, Tape, make_tape
 from .xdsl import BfFunctions, BrainFInterpreter
 
 __all__ = [
     "BfFunctions",
     "BfState",
     "BrainFInterpreter",
+    "BudgetExceeded",
+    "EofPolicy",
+    "FlushPolicy",
+    "InputNeeded",
+    "InputSource",
+    "LoopProfile",
+    "OutputSink",
+    "PagedTape",
     "PointerOutOfBoundsError",
+    "Profile",
+    "ProgramSuspended",
+    "Tape",
+    "make_tape",
 ]
@@ -0,0 +1,175 @@
+"""Asyncio-friendly interpreter for the BrainF language.
+
+Programs are compiled to bytecode and run by the bytecode virtual machine in
+slices of a bounded number of loop iterations, yielding to the event loop
+between slices, so long-running programs do not starve other tasks. Input is
+read from an `asyncio.StreamReader` only when the program needs more of it,
+and output is written to an `asyncio.StreamWriter` between slices, waiting for
+the writer to drain, so a slow consumer applies backpressure to the program.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from io import BytesIO
+
+from xdsl.dialects.builtin import ModuleOp
+
+from xdslbf.interpreters.base import (
+    BfState,
+    BudgetExceeded,
+    InputNeeded,
+    ProgramSuspended,
+)
+from xdslbf.interpreters.bytecode import (
+    BytecodeBrainFInterpreter,
+    BytecodeProgram,
+    compile_program,
+)
+from xdslbf.interpreters.streams import FlushPolicy, InputSource, OutputSink
+
+
+@dataclass
+class StreamInputSource(InputSource):
+    """An input source which is fed its input, rather than reading a stream.
+
+    Rather than blocking to read more input, the program is suspended with
+    `InputNeeded` until more input is fed to the source, or it is closed.
+    """
+
+    pending: bytearray = field(default_factory=bytearray)
+    """The input fed to the source but not yet read by the program."""
+    closed: bool = False
+    """Whether the end of the input has been fed to the source."""
+
+    def feed(self, data: bytes) -> None:
+        """Provide more input to the program."""
+        self.pending.extend(data)
+
+    def close(self) -> None:
+        """Mark the end of the input, once the pending input is read."""
+        self.closed = True
+
+    def _read_chunk(self) -> bytes:
+        """Take the pending input.
+
+        Raises:
+            InputNeeded: If there is no pending input before the end.
+        """
+        if self.pending:
+            data = bytes(self.pending)
+            self.pending.clear()
+            return data
+        if self.closed:
+            return b""
+        raise InputNeeded("Program is waiting for input")
+
+
+@dataclass
+class AsyncBrainFInterpreter:
+    """Interpreter for the BrainF language which cooperates with asyncio.
+
+    The input and output streams of the state are replaced by the stream reader
+    and writer given to each run. The fuel and deadline of the state are still
+    respected, and yielding to the event loop does not use up fuel.
+    """
+
+    state: BfState = field(default_factory=BfState)
+    slice_size: int = 1 << 14
+    """The number of loop iterations run between yields to the event loop."""
+    chunk_size: int = 1 << 16
+    """The maximum size in bytes of each read from the stream reader."""
+
+    @property
+    def output(self) -> str:
+        """Get the string value of the output retained by the state."""
+        return self.state.sink.text
+
+    async def interpret(
+        self,
+        program: ModuleOp,
+        reader: asyncio.StreamReader | None = None,
+        writer: asyncio.StreamWriter | None = None,
+    ) -> None:
+        """Compile a BrainF program to bytecode and interpret it.
+
+        Args:
+            program: The program to interpret.
+            reader: The stream to read input from, or `None` for no input.
+            writer: The stream to write output to, or `None` to retain the
+                output in the state's sink, where it can be read back.
+
+        Raises:
+            BudgetExceeded: If the program exceeds the budget of its state.
+        """
+        await self.run(compile_program(program), reader, writer)
+
+    async def run(
+        self,
+        program: BytecodeProgram,
+        reader: asyncio.StreamReader | None = None,
+        writer: asyncio.StreamWriter | None = None,
+    ) -> None:
+        """Run a BrainF program compiled to bytecode, yielding between slices.
+
+        Raises:
+            BudgetExceeded: If the program exceeds the budget of its state.
+        """
+        state = self.state
+        buffer = BytesIO()
+        state.output_stream = buffer
+        state.sink = OutputSink(buffer, FlushPolicy.END, retain=writer is None)
+        state.source = source = StreamInputSource(
+            eof_policy=state.eof_policy, chunk_size=self.chunk_size
+        )
+        if reader is None:
+            source.close()
+
+        # Each slice is run with the fuel for one slice, taken from the budget
+        budget = state.fuel
+        resume = partial(BytecodeBrainFInterpreter(state).run, program)
+        while True:
+            given = self.slice_size if budget is None else min(self.slice_size, budget)
+            state.fuel = given
+            suspended: ProgramSuspended | None = None
+            try:
+                resume()
+            except ProgramSuspended as exc:
+                suspended = exc
+            finally:
+                if budget is not None:
+                    budget -= given - (state.fuel or 0)
+                state.fuel = budget
+
+            await self._write(buffer, writer)
+            if suspended is None:
+                return
+            if isinstance(suspended, InputNeeded):
+                assert reader is not None
+                if data := await reader.read(self.chunk_size):
+                    source.feed(data)
+                else:
+                    source.close()
+            elif budget == 0 or (
+                state.deadline is not None and time.monotonic() >= state.deadline
+            ):
+                # The run cannot be resumed synchronously, as its output sink
+                # is only written to the stream writer by this loop
+                assert isinstance(suspended, BudgetExceeded)
+                suspended.resume = None
+                raise suspended
+            else:
+                await asyncio.sleep(0)
+            assert suspended.resume is not None
+            resume = suspended.resume
+
+    @staticmethod
+    async def _write(buffer: BytesIO, writer: asyncio.StreamWriter | None) -> None:
+        """Write the output flushed to a buffer, waiting for the writer to drain."""
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        if writer is not None and data:
+            writer.write(data)
+            await writer.drain()
@@ -1,36 +1,329 @@
 """Implementations of mutable state for the BrainF interpreters."""
 
 import abc
+import sys
+import time
+from collections.abc import Callable, Sequence
 from dataclasses import dataclass, field
-from typing import TextIO
+from io import BytesIO, StringIO
+from typing import BinaryIO, Final, TextIO
 
 from xdsl.dialects.builtin import ModuleOp
+from xdsl.ir import Operation
+
+from xdslbf.interpreters.streams import (
+    EofPolicy,
+    FlushPolicy,
+    InputSource,
+    OutputSink,
+)
+from xdslbf.interpreters.tape import Tape, get_cell_mask, grow_tape, make_tape
 
 
 class PointerOutOfBoundsError(RuntimeError):
     """Exception to indicate the pointer is outside the memory tape."""
 
 
+class ProgramSuspended(RuntimeError):  # noqa: N818
+    """Exception to indicate a program stopped before it finished.
+
+    The program stops before an instruction it cannot run yet, so the pointer
+    and tape of its state are left intact. Interpreters which can resume a
+    program set `resume`, which continues the program from where it stopped,
+    and `position`, the instruction it stopped before, which can be saved to a
+    checkpoint. A program stopped partway through a packed `bf.commands`
+    operation also sets `offset`, the number of its commands already run.
+    """
+
+    resume: Callable[[], None] | None
+    """Continue running the program, if the interpreter can resume it."""
+    position: Operation | int | None = None
+    """The operation or bytecode index the program stopped before, if known."""
+    offset: int = 0
+    """The number of commands of the packed operation at `position` already
+    run, which are skipped on resuming."""
+    pointer: int | None = None
+    """The data pointer when the program stopped inside a packed operation."""
+
+    def __init__(self, message: str, resume: Callable[[], None] | None = None) -> None:
+        """Instantiate the exception, with a way to resume if possible."""
+        super().__init__(message)
+        self.resume = resume
+
+
+class BudgetExceeded(ProgramSuspended):
+    """Exception to indicate a program ran out of fuel or passed its deadline.
+
+    The program stops before the loop iteration which exceeded the budget, and
+    can be resumed once the budget has been extended.
+    """
+
+
+class InputNeeded(ProgramSuspended):
+    """Exception to indicate a program is waiting for input to be provided.
+
+    The program stops before the input instruction, and can be resumed once
+    more input has been provided to its input source.
+    """
+
+
+FUEL_SLICE: Final = 1 << 12
+"""The number of loop iterations charged between checks of the budget."""
+
+
+def reserve_cell(memory: Tape, index: int, *, growable: bool = False) -> int:
+    """Check a cell is on the memory tape, growing the tape to fit it if allowed.
+
+    Returns:
+        The number of cells in the tape, after any growth.
+
+    Raises:
+        PointerOutOfBoundsError: If the cell is before the start of the tape, or
+            past the end of a tape which cannot grow.
+    """
+    if index < 0:
+        raise PointerOutOfBoundsError(f"Pointer value {index} < 0")
+    if index >= len(memory):
+        if not growable:
+            raise PointerOutOfBoundsError(f"Pointer value {index} >= {len(memory)}")
+        grow_tape(memory, index + 1)
+    return len(memory)
+
+
+def find_zero_cell(memory: Tape, start: int, stride: int) -> int:
+    """Find the first zero cell from a start index, moving by a stride.
+
+    Unit-stride scans of byte tapes use the bulk `find` methods of the tape.
+    Otherwise, the tape is searched in slices of exponentially increasing
+    size, so short scans stay cheap whilst long scans are done in bulk rather
+    than per cell.
+
+    Returns:
+        The index of the first zero cell, or if the scan leaves the tape, the
+        first index it reaches outside the tape, which callers should check
+        with `reserve_cell` like any other pointer movement.
+    """
+    if isinstance(memory, bytearray) and stride in (1, -1):
+        if stride == 1:
+            index = memory.find(0, start)
+            return len(memory) if index < 0 else index
+        return memory.rfind(0, 0, start + 1)
+
+    window = 16
+    while 0 <= start < len(memory):
+        stop = start + stride * window
+        cells = memory[start : stop if stop >= 0 else None : stride]
+        if 0 in cells:
+            return start + stride * cells.index(0)
+        start += stride * len(cells)
+        window *= 2
+    return start
+
+
+def run_commands(  # noqa: C901, PLR0912, PLR0913
+    runs: Sequence[tuple[str, int]],
+    memory: Tape,
+    pointer: int,
+    mask: int,
+    reserve: Callable[[int], int],
+    read: Callable[[int], int],
+    write: Callable[[int], None],
+    offset: int = 0,
+) -> int:
+    """Run the runs of straight-line commands of a `bf.commands` operation.
+
+    Each run of a repeated command is run in bulk, so a run of `+` adds its
+    length to the cell at once, and a run of `>` moves the pointer at once.
+    The first `offset` commands are skipped, to resume a suspended operation.
+
+    Returns:
+        The data pointer after running the commands.
+
+    Raises:
+        ProgramSuspended: If reading input suspends the program, with its
+            `offset` and `pointer` set to where it stopped, as the commands
+            before the read have already changed the tape.
+    """
+    size = len(memory)
+    end = 0
+    for command, run_count in runs:
+        end += run_count
+        if (count := min(run_count, end - offset)) <= 0:
+            continue
+        if command == "+":
+            memory[pointer] = (memory[pointer] + count) & mask
+        elif command == "-":
+            memory[pointer] = (memory[pointer] - count) & mask
+        elif command == ">":
+            pointer += count
+            if pointer >= size:
+                size = reserve(pointer)
+        elif command == "<":
+            pointer -= count
+            if pointer < 0:
+                reserve(pointer)
+        elif command == ".":
+            for _ in range(count):
+                write(memory[pointer])
+        else:
+            try:
+                for _ in range(count):
+                    memory[pointer] = read(memory[pointer]) & mask
+                    count -= 1
+            except ProgramSuspended as exc:
+                exc.offset = end - count
+                exc.pointer = pointer
+                raise
+    return pointer
+
+
 @dataclass
 class BfState:
     """A representation of BrainF mutable state."""
 
     pointer: int = 0
-    memory: list[int] = field(default_factory=lambda: [0] * 30_000)
-    input_stream: TextIO | None = None
-    output_stream: TextIO | None = None
+    memory: Tape = field(default_factory=make_tape)
+    input_stream: TextIO | BinaryIO | None = None
+    output_stream: TextIO | BinaryIO | None = None
+    growable: bool = False
+    """Whether the tape grows when the program accesses cells past its end."""
+    flush_policy: FlushPolicy = FlushPolicy.SIZE
+    """When output is flushed to the output stream."""
+    eof_policy: EofPolicy = EofPolicy.UNCHANGED
+    """What is stored in a cell read at the end of the input."""
+    fuel: int | None = None
+    """The number of loop iterations the program may run, or `None` for no
+    limit. Each iteration of a loop's body is charged one unit of fuel."""
+    deadline: float | None = None
+    """The `time.monotonic()` time the program must finish by, or `None`."""
+    retain_output: bool | None = None
+    """Whether the sink keeps output once flushed, so it can be read back, or
+    `None` to keep it only for in-memory `StringIO` and `BytesIO` streams."""
+    sink: OutputSink = field(init=False)
+    """The buffered sink collecting output for the output stream."""
+    source: InputSource = field(init=False)
+    """The buffered source reading input from the input stream."""
+    _fuel_slice: int = field(default=0, init=False, repr=False)
+    """The fuel taken by `charge` but not yet used."""
+
+    def __post_init__(self) -> None:
+        """Create the sink and source for the output and input streams.
+
+        By default, output to in-memory streams can be read back from the
+        sink, whereas output to standard output, files and other streams is
+        not retained once flushed, so long runs do not hold all their output
+        in memory. Output is flushed before more input is read, so prompts
+        are seen.
+        """
+        retain = self.retain_output
+        if retain is None:
+            retain = isinstance(self.output_stream, StringIO | BytesIO)
+        self.sink = OutputSink(self.output_stream, self.flush_policy, retain=retain)
+        self.source = InputSource(self.input_stream, self.eof_policy, tied=self.sink)
+
+    @property
+    def cell_mask(self) -> int:
+        """Get the mask which wraps values around to the cell width."""
+        return get_cell_mask(self.memory)
+
+    def reserve(self, index: int) -> int:
+        """Check a cell is on the memory tape, growing the tape if allowed.
+
+        Returns:
+            The number of cells in the tape, after any growth.
+
+        Raises:
+            PointerOutOfBoundsError: If the cell is outside the tape.
+        """
+        return reserve_cell(self.memory, index, growable=self.growable)
+
+    def run_commands(self, runs: Sequence[tuple[str, int]], offset: int = 0) -> None:
+        """Run the runs of straight-line commands of a `bf.commands` operation.
+
+        If reading input suspends the program, the data pointer is left where
+        the commands run so far moved it, matching the tape.
+
+        Raises:
+            ProgramSuspended: If reading input suspends the program.
+        """
+        try:
+            self.pointer = run_commands(
+                runs,
+                self.memory,
+                self.pointer,
+                self.cell_mask,
+                self.reserve,
+                self.source.read_cell,
+                self.sink.write_byte,
+                offset,
+            )
+        except ProgramSuspended as exc:
+            if exc.pointer is not None:
+                self.pointer = exc.pointer
+            raise
+
+    @property
+    def has_budget(self) -> bool:
+        """Whether the program's run is limited by fuel or a deadline."""
+        return self.fuel is not None or self.deadline is not None
+
+    def take_fuel(self) -> int:
+        """Take a slice of fuel, which loop iterations are charged to.
+
+        Interpreters take fuel in slices, and count it down locally, so the
+        budget is only checked once per slice rather than on every iteration.
+        Unused fuel should be given back with `return_fuel`.
+
+        Raises:
+            BudgetExceeded: If there is no fuel left, or the deadline passed.
+        """
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise BudgetExceeded("Program passed its deadline")
+        if self.fuel is None:
+            return sys.maxsize if self.deadline is None else FUEL_SLICE
+        if self.fuel <= 0:
+            raise BudgetExceeded("Program ran out of fuel")
+        taken = min(self.fuel, FUEL_SLICE)
+        self.fuel -= taken
+        return taken
+
+    def return_fuel(self, unused: int) -> None:
+        """Give back fuel which was taken but not used."""
+        if self.fuel is not None and unused > 0:
+            self.fuel += unused
+
+    def charge(self) -> None:
+        """Charge one loop iteration to the budget.
+
+        Raises:
+            BudgetExceeded: If the budget is exceeded.
+        """
+        self._fuel_slice -= 1
+        if self._fuel_slice < 0:
+            self._fuel_slice = 0
+            self._fuel_slice = self.take_fuel() - 1
+
+    def release_fuel(self) -> None:
+        """Give back the fuel taken by `charge` but not used."""
+        self.return_fuel(self._fuel_slice)
+        self._fuel_slice = 0
 
 
 class BaseBrainFInterpreter(abc.ABC):
     """Interpreter for the BrainF language."""
 
+    state: BfState
+
+    def __init__(self, state: BfState | None = None) -> None:
+        """Instantiate the interpreter."""
+        self.state = BfState() if state is None else state
+
     @abc.abstractmethod
     def interpret(self, program: ModuleOp) -> None:
         """Interpret a BrainF program."""
         ...
 
     @property
-    @abc.abstractmethod
     def output(self) -> str:
-        """Get the string value of the output stream."""
-        ...
+        """Get the string value of the output of the program."""
+        return self.state.sink.text
@@ -0,0 +1,296 @@
+"""Bytecode virtual machine interpreter for the BrainF language.
+
+Rather than walking the IR, the program is compiled once into flat arrays of
+opcodes and operands, with the targets of loop jumps precomputed. The virtual
+machine then runs the program in a single loop over local variables.
+"""
+
+import struct
+from array import array
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Final
+
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.ir import Operation
+
+from xdslbf.dialects import bf, bfe
+from xdslbf.interpreters.base import (
+    BaseBrainFInterpreter,
+    BfState,
+    ProgramSuspended,
+    find_zero_cell,
+)
+
+# Opcodes of the bytecode virtual machine, as plain integers rather than an
+# enum so they are cheap to compare against in the interpreter loop
+ADD: Final = 0
+"""Add `arg` to the current cell."""
+MOVE: Final = 1
+"""Move the data pointer by `arg`."""
+JUMP_IF_ZERO: Final = 2
+"""Jump to instruction `arg` if the current cell is zero."""
+JUMP_IF_NONZERO: Final = 3
+"""Jump to instruction `arg` if the current cell is non-zero."""
+SET: Final = 4
+"""Set the current cell to `arg`."""
+ADD_AT: Final = 5
+"""Add `arg` to the cell at `offset` from the data pointer."""
+SET_AT: Final = 6
+"""Set the cell at `offset` from the data pointer to `arg`."""
+MUL_ADD: Final = 7
+"""Add the current cell multiplied by `arg` to the cell at `offset`, if non-zero."""
+SCAN: Final = 8
+"""Move the data pointer by `arg` until the current cell is zero."""
+OUT: Final = 9
+"""Output the current cell."""
+IN: Final = 10
+"""Input a character into the current cell."""
+
+_LENGTH: Final = struct.Struct("<Q")
+"""The layout of the number of instructions at the start of serialised bytecode."""
+
+
+@dataclass
+class BytecodeProgram:
+    """A BrainF program compiled to bytecode.
+
+    Each instruction is stored across three parallel arrays, holding its
+    opcode, its primary argument, and the offset of the cell it targets.
+    """
+
+    opcodes: array[int] = field(default_factory=lambda: array("B"))
+    args: array[int] = field(default_factory=lambda: array("q"))
+    offsets: array[int] = field(default_factory=lambda: array("q"))
+
+    def __len__(self) -> int:
+        """Get the number of instructions in the program."""
+        return len(self.opcodes)
+
+    def to_bytes(self) -> bytes:
+        """Serialise the program, in the native byte order of its arrays."""
+        return b"".join(
+            [
+                _LENGTH.pack(len(self)),
+                self.opcodes.tobytes(),
+                self.args.tobytes(),
+                self.offsets.tobytes(),
+            ]
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BytecodeProgram":
+        """Deserialise a program serialised by `to_bytes`.
+
+        Raises:
+            ValueError: If the data is not a serialised program.
+        """
+        if len(data) < _LENGTH.size:
+            raise ValueError("Serialised bytecode is too short")
+        (length,) = _LENGTH.unpack_from(data)
+        program = cls()
+        if len(data) != _LENGTH.size + length * (
+            program.opcodes.itemsize + program.args.itemsize + program.offsets.itemsize
+        ):
+            raise ValueError("Serialised bytecode has the wrong length")
+        view = memoryview(data)[_LENGTH.size :]
+        for values in (program.opcodes, program.args, program.offsets):
+            values.frombytes(view[: length * values.itemsize])
+            view = view[length * values.itemsize :]
+        return program
+
+    def emit(self, opcode: int, arg: int = 0, offset: int = 0) -> int:
+        """Append an instruction to the program, returning its index."""
+        self.opcodes.append(opcode)
+        self.args.append(arg)
+        self.offsets.append(offset)
+        return len(self.opcodes) - 1
+
+    def emit_counted(self, opcode: int, arg: int) -> None:
+        """Append an add or move instruction, folding it into a previous one.
+
+        Loop jumps only target instructions directly after other jumps, so an
+        instruction following an add or move can never be a jump target and
+        can safely be folded into it.
+        """
+        if self.opcodes and self.opcodes[-1] == opcode:
+            self.args[-1] += arg
+            if not self.args[-1]:
+                self.opcodes.pop()
+                self.args.pop()
+                self.offsets.pop()
+        else:
+            self.emit(opcode, arg)
+
+
+def _compile_op(  # noqa: C901, PLR0912
+    op: Operation, program: BytecodeProgram, loop_starts: list[int]
+) -> None:
+    """Compile an operation, appending its instructions to the program."""
+    if isinstance(op, bf.IncOp):
+        program.emit_counted(ADD, 1)
+    elif isinstance(op, bf.DecOp):
+        program.emit_counted(ADD, -1)
+    elif isinstance(op, bf.RshftOp):
+        program.emit_counted(MOVE, 1)
+    elif isinstance(op, bf.LshftOp):
+        program.emit_counted(MOVE, -1)
+    elif isinstance(op, bfe.AddOp):
+        if offset := op.get_offset():
+            program.emit(ADD_AT, op.value.value.data, offset)
+        else:
+            program.emit_counted(ADD, op.value.value.data)
+    elif isinstance(op, bfe.SetOp):
+        if offset := op.get_offset():
+            program.emit(SET_AT, op.value.value.data, offset)
+        else:
+            program.emit(SET, op.value.value.data)
+    elif isinstance(op, bfe.MoveOp):
+        program.emit_counted(MOVE, op.distance.value.data)
+    elif isinstance(op, bfe.MulAddOp):
+        for offset, factor in op.get_terms():
+            program.emit(MUL_ADD, factor, offset)
+        program.emit(SET, 0)
+    elif isinstance(op, bfe.ScanOp):
+        program.emit(SCAN, op.stride.value.data)
+    elif isinstance(op, bf.OutOp):
+        program.emit(OUT)
+    elif isinstance(op, bf.InOp):
+        program.emit(IN)
+    elif isinstance(op, bf.CommandsOp):
+        for command, count in op.get_runs():
+            if command in "+-":
+                program.emit_counted(ADD, count if command == "+" else -count)
+            elif command in "<>":
+                program.emit_counted(MOVE, count if command == ">" else -count)
+            else:
+                for _ in range(count):
+                    program.emit(OUT if command == "." else IN)
+    elif isinstance(op, bf.LoopOp):
+        loop_starts.append(program.emit(JUMP_IF_ZERO))
+    elif isinstance(op, bf.RetOp):
+        loop_start = loop_starts.pop()
+        program.emit(JUMP_IF_NONZERO, loop_start + 1)
+        program.args[loop_start] = len(program)
+    else:
+        raise RuntimeError(f"Unsupported instruction {op}")  # noqa: TRY004
+
+
+def compile_program(program: ModuleOp) -> BytecodeProgram:
+    """Compile a BrainF program to bytecode."""
+    bytecode = BytecodeProgram()
+    loop_starts: list[int] = []
+
+    # Walk the program iteratively, so deeply nested loops cannot overflow
+    # the Python stack
+    worklist: list[Operation | None] = [program.body.block.first_op]
+    while worklist:
+        if (op := worklist.pop()) is None:
+            continue
+        _compile_op(op, bytecode, loop_starts)
+        worklist.append(op.next_op)
+        if isinstance(op, bf.LoopOp):
+            worklist.append(op.body.block.first_op)
+
+    return bytecode
+
+
+@dataclass
+class BytecodeBrainFInterpreter(BaseBrainFInterpreter):
+    """Bytecode virtual machine interpreter for the BrainF language."""
+
+    state: BfState = field(default_factory=BfState)
+
+    def interpret(self, program: ModuleOp) -> None:
+        """Compile a BrainF program to bytecode and interpret it."""
+        self.run(compile_program(program))
+
+        if self.state.output_stream is None:
+            print()
+
+    def run(  # noqa: C901, PLR0912, PLR0915
+        self, program: BytecodeProgram, start: int = 0
+    ) -> None:
+        """Run a BrainF program compiled to bytecode, from an instruction.
+
+        Raises:
+            BudgetExceeded: If the program exceeds the budget of its state,
+                which can be resumed after extending the budget.
+            InputNeeded: If the program's input source has no input ready,
+                which can be resumed after feeding it more input.
+        """
+        # Unpack the arrays into lists, so instructions are not re-boxed on reads
+        opcodes = program.opcodes.tolist()
+        args = program.args.tolist()
+        offsets = program.offsets.tolist()
+        memory = self.state.memory
+        mask = self.state.cell_mask
+        pointer = self.state.pointer
+        read = self.state.source.read_cell
+        write = self.state.sink.write_byte
+        reserve = self.state.reserve
+        take_fuel = self.state.take_fuel
+        fuel = 0
+        size = len(memory)
+        pc = start
+        end = len(opcodes)
+
+        try:
+            while pc < end:
+                opcode = opcodes[pc]
+                if opcode == ADD:
+                    memory[pointer] = (memory[pointer] + args[pc]) & mask
+                elif opcode == MOVE:
+                    pointer += args[pc]
+                    if not 0 <= pointer < size:
+                        size = reserve(pointer)
+                elif opcode == JUMP_IF_ZERO:
+                    if not memory[pointer]:
+                        pc = args[pc]
+                        continue
+                    # Charge each iteration of a loop's body to the budget
+                    fuel -= 1
+                    if fuel < 0:
+                        fuel = 0
+                        fuel = take_fuel() - 1
+                elif opcode == JUMP_IF_NONZERO:
+                    if memory[pointer]:
+                        fuel -= 1
+                        if fuel < 0:
+                            fuel = 0
+                            fuel = take_fuel() - 1
+                        pc = args[pc]
+                        continue
+                elif opcode == SET:
+                    memory[pointer] = args[pc] & mask
+                elif opcode <= SET_AT:
+                    if not 0 <= (index := pointer + offsets[pc]) < size:
+                        size = reserve(index)
+                    if opcode == ADD_AT:
+                        memory[index] = (memory[index] + args[pc]) & mask
+                    else:
+                        memory[index] = args[pc] & mask
+                elif opcode == MUL_ADD:
+                    # The multiply loop would not run, so leave its cells be
+                    if value := memory[pointer]:
+                        if not 0 <= (index := pointer + offsets[pc]) < size:
+                            size = reserve(index)
+                        memory[index] = (memory[index] + value * args[pc]) & mask
+                elif opcode == SCAN:
+                    if memory[pointer]:
+                        pointer = find_zero_cell(memory, pointer, args[pc])
+                        if not 0 <= pointer < size:
+                            size = reserve(pointer)
+                elif opcode == OUT:
+                    write(memory[pointer])
+                else:
+                    memory[pointer] = read(memory[pointer]) & mask
+                pc += 1
+        except ProgramSuspended as exc:
+            exc.resume = partial(self.run, program, pc)
+            exc.position = pc
+            raise
+        finally:
+            self.state.pointer = pointer
+            self.state.return_fuel(fuel)
+            self.state.sink.flush()
@@ -0,0 +1,284 @@
+"""Checkpoints of the state of BrainF programs, saved to compact binary files.
+
+A checkpoint records the memory tape, the data pointer, the remaining fuel,
+how much input the program has read and output it has written, and the
+position it stopped at, including how many commands of a packed operation it
+had run, so a long-running program can be resumed on the same
+parsed program after the process running it restarts. Positions are saved as
+the path of indices to an operation through the nested loops of the program,
+or the index of an instruction in its bytecode.
+
+The tape is written straight into a memory-mapped file, rather than copied
+into an intermediate buffer, and each checkpoint is written atomically, by
+writing a temporary file then renaming it over the checkpoint, so a crash while
+saving leaves the previous checkpoint intact.
+
+A program is checkpointed when it is suspended, such as by running out of fuel
+or passing its deadline:
+
+```python
+try:
+    interpreter.interpret(program)
+except BudgetExceeded as exc:
+    save_checkpoint(path, interpreter.state, program, exc.position, exc.offset)
+```
+
+It can then be resumed in another process with a state using the same input
+stream, which is skipped past the input the program has already read:
+
+```python
+position, offset = load_checkpoint(path, state, program)
+NativeBrainFInterpreter(state).run_from(position, offset)
+```
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array  # noqa: TCH003
+from itertools import islice
+from pathlib import Path
+from typing import Final
+
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.ir import Operation
+
+from xdslbf.interpreters.base import BfState
+from xdslbf.interpreters.bytecode import BytecodeProgram
+from xdslbf.interpreters.tape import (
+    PagedTape,
+    Tape,
+    get_cell_width,
+    make_tape,
+)
+
+MAGIC: Final = b"XBFCKPT2"
+"""The magic number at the start of checkpoint files, including its version."""
+
+_HEADER: Final = struct.Struct("<8s32sQqQQQBBBBBQQQ")
+"""The layout of the fixed-size header at the start of checkpoint files.
+
+The fields are the magic number, the program fingerprint, the data pointer,
+the remaining fuel or -1 for none, the input and output offsets, the number of
+cells in the tape, the cell width, whether the tape is paged, the page size as
+a power of two, whether the tape is big-endian, whether the position is a
+bytecode index rather than an operation path, the length of the position, the
+number of pages, and the number of commands run of a packed operation at the
+position.
+"""
+
+_INDEX: Final = struct.Struct("<Q")
+"""The layout of each index in the position and page tables."""
+
+
+def fingerprint(program: ModuleOp | BytecodeProgram) -> bytes:
+    """Get a hash identifying a program, to check checkpoints resume on it."""
+    if isinstance(program, BytecodeProgram):
+        return hashlib.sha256(program.to_bytes()).digest()
+    return hashlib.sha256(str(program).encode()).digest()
+
+
+def get_op_path(op: Operation) -> tuple[int, ...]:
+    """Get the indices of an operation and each enclosing loop in their blocks."""
+    path: list[int] = []
+    while (block := op.parent) is not None and (parent := block.parent_op()):
+        path.append(block.get_operation_index(op))
+        op = parent
+    return tuple(reversed(path))
+
+
+def get_op_at_path(program: ModuleOp, path: tuple[int, ...]) -> Operation:
+    """Get the operation at a path of indices from `get_op_path`.
+
+    Raises:
+        ValueError: If the path is not the path of an operation in the program.
+    """
+    op: Operation = program
+    for index in path:
+        if not op.regions or (block := op.regions[0].first_block) is None:
+            raise ValueError(f"No operation at path {path}")
+        if (child := next(islice(block.ops, index, None), None)) is None:
+            raise ValueError(f"No operation at path {path}")
+        op = child
+    return op
+
+
+def _read_tape(
+    data: memoryview, size: int, cell_width: int, *, swap: bool
+) -> "bytearray | array[int]":
+    """Read a tape of cells saved in a checkpoint, swapping their byte order."""
+    tape = make_tape(size, cell_width)
+    with memoryview(tape).cast("B") as view:
+        view[:] = data[: view.nbytes]
+    if swap and not isinstance(tape, bytearray):
+        tape.byteswap()
+    return tape
+
+
+def save_checkpoint(
+    path: Path,
+    state: BfState,
+    program: ModuleOp | BytecodeProgram,
+    position: Operation | int | None,
+    offset: int = 0,
+) -> None:
+    """Atomically save a checkpoint of a program suspended at a position.
+
+    The output of the program is flushed first, so the output stream holds all
+    the output written before the checkpoint.
+
+    Args:
+        path: The file to save the checkpoint to.
+        state: The state of the suspended program.
+        program: The program, or its bytecode if run by the bytecode virtual
+            machine.
+        position: The operation or bytecode index the program stopped before,
+            as given by the `position` of the suspension.
+        offset: The number of commands of a packed operation at the position
+            already run, as given by the `offset` of the suspension.
+
+    Raises:
+        TypeError: If the position is missing or does not match the program.
+    """
+    if isinstance(position, Operation) and isinstance(program, ModuleOp):
+        indices = get_op_path(position)
+    elif isinstance(position, int) and isinstance(program, BytecodeProgram):
+        indices = (position,)
+    else:
+        raise TypeError(f"Cannot save position {position!r} of the program")
+    state.sink.flush()
+
+    memory = state.memory
+    if isinstance(memory, PagedTape):
+        page_indices = sorted(memory.pages)
+        pages = [memoryview(memory.pages[index]).cast("B") for index in page_indices]
+        page_bits = memory.page_bits
+    else:
+        page_indices = []
+        pages = [memoryview(memory).cast("B")]
+        page_bits = 0
+    header = _HEADER.pack(
+        MAGIC,
+        fingerprint(program),
+        state.pointer,
+        -1 if state.fuel is None else state.fuel,
+        state.source.tell(),
+        state.sink.tell(),
+        len(memory),
+        get_cell_width(memory),
+        isinstance(memory, PagedTape),
+        page_bits,
+        sys.byteorder == "big",
+        isinstance(position, int),
+        len(indices),
+        len(page_indices),
+        offset,
+    )
+    tables = b"".join(_INDEX.pack(index) for index in (*indices, *page_indices))
+    size = len(header) + len(tables) + sum(page.nbytes for page in pages)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    file, temporary = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(file, "r+b") as temporary_file:
+            temporary_file.truncate(size)
+            with mmap.mmap(temporary_file.fileno(), size) as mapped:
+                mapped[: len(header)] = header
+                start = len(header)
+                mapped[start : start + len(tables)] = tables
+                start += len(tables)
+                for page in pages:
+                    mapped[start : start + page.nbytes] = page
+                    start += page.nbytes
+                mapped.flush()
+            os.fsync(temporary_file.fileno())
+        Path(temporary).replace(path)
+    except BaseException:
+        Path(temporary).unlink(missing_ok=True)
+        raise
+
+
+def load_checkpoint(
+    path: Path, state: BfState, program: ModuleOp | BytecodeProgram
+) -> tuple[Operation | int, int]:
+    """Restore the state of a program from a checkpoint.
+
+    The state's memory tape, data pointer and fuel are replaced, its input
+    source skips the input read before the checkpoint, and its output sink
+    continues counting output from the offset written before the checkpoint.
+    Output written after the checkpoint was saved is written again when the
+    program is resumed, so callers appending to an output file should truncate
+    it to the sink's `offset` first.
+
+    Args:
+        path: The file the checkpoint was saved to.
+        state: The state to restore, which should be freshly created.
+        program: The same program the checkpoint was saved for.
+
+    Returns:
+        The operation or bytecode index to resume the program from, and the
+        number of commands to skip if it is a packed `bf.commands` operation.
+
+    Raises:
+        ValueError: If the file is not a checkpoint of the program.
+    """
+    with (
+        path.open("rb") as file,
+        mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+        memoryview(mapped) as data,
+    ):
+        if len(data) < _HEADER.size or bytes(data[: len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a checkpoint file")
+        (
+            _,
+            program_fingerprint,
+            pointer,
+            fuel,
+            input_offset,
+            output_offset,
+            size,
+            cell_width,
+            paged,
+            page_bits,
+            big_endian,
+            is_bytecode_index,
+            position_length,
+            page_count,
+            command_offset,
+        ) = _HEADER.unpack_from(data)
+        if program_fingerprint != fingerprint(program):
+            raise ValueError(f"{path} is a checkpoint of a different program")
+        offset = _HEADER.size
+        indices = tuple(
+            _INDEX.unpack_from(data, offset + i * _INDEX.size)[0]
+            for i in range(position_length + page_count)
+        )
+        offset += len(indices) * _INDEX.size
+
+        swap = big_endian != (sys.byteorder == "big")
+        memory: Tape
+        if paged:
+            memory = PagedTape(size, cell_width, page_bits)
+            for page_index in indices[position_length:]:
+                memory.pages[page_index] = _read_tape(
+                    data[offset:], 1 << page_bits, cell_width, swap=swap
+                )
+                offset += (1 << page_bits) * cell_width // 8
+        else:
+            memory = _read_tape(data[offset:], size, cell_width, swap=swap)
+
+    state.memory = memory
+    state.pointer = pointer
+    state.fuel = None if fuel < 0 else fuel
+    state.source.skip(input_offset)
+    state.sink.offset = output_offset - len(state.sink.data)
+
+    # The fingerprint matched, so the kind of position matches the program
+    positions = indices[:position_length]
+    if is_bytecode_index:
+        return positions[0], command_offset
+    assert isinstance(program, ModuleOp)
+    return get_op_at_path(program, positions), command_offset
@@ -0,0 +1,455 @@
+"""Interpreter which compiles BrainF programs to C with the system C compiler.
+
+The program is walked once to generate portable C, with loops as flat jumps
+between labels so deeply nested programs do not strain the C compiler. The C
+source is built into a shared library with the local `cc` (or `$CC`), which
+is optionally cached by the hash of its source, and run through `ctypes`.
+
+The memory tape is passed to the library in place, and input and output are
+passed through fixed-size buffers, which the library asks Python to refill or
+flush through callbacks only once per chunk rather than once per character.
+"""
+
+import ctypes
+import os
+import shlex
+import subprocess
+import tempfile
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Final, cast
+
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.ir import Operation
+
+from xdslbf.cache import CompileCache, cache_key
+from xdslbf.dialects import bf, bfe
+from xdslbf.interpreters.base import BaseBrainFInterpreter, BfState
+from xdslbf.interpreters.streams import EofPolicy
+
+ENTRY_POINT: Final = "bf_run"
+"""The name of the generated C function which runs the program."""
+
+CFLAGS: Final = ("-O2", "-std=c99", "-shared", "-fPIC")
+"""The flags the C compiler is run with to build a shared library."""
+
+BUFFER_SIZE: Final = 1 << 16
+"""The size in bytes of the input and output buffers passed to the library."""
+
+# Status codes returned by the entry point
+_DONE: Final = 0
+_OUT_OF_BOUNDS: Final = 1
+_FAILED: Final = 2
+
+_EOF_POLICIES: Final = {
+    EofPolicy.UNCHANGED: 0,
+    EofPolicy.ZERO: 1,
+    EofPolicy.MINUS_ONE: 2,
+}
+
+_PRELUDE: Final = """\
+#include <stdint.h>
+#include <string.h>
+
+typedef struct {
+    uint8_t *memory;
+    int64_t size;
+    int64_t pointer;
+    uint8_t *input;
+    int64_t input_size;
+    int64_t input_position;
+    uint8_t *output;
+    int64_t output_capacity;
+    int64_t output_size;
+    int64_t fuel;
+    int64_t eof_policy;
+    int64_t at_eof;
+    int64_t fault;
+    int64_t (*refill)(void);
+    int64_t (*flush)(void);
+    int64_t (*take_fuel)(void);
+} bf_state;
+
+/* Output a character, flushing the output buffer when it is full */
+static int bf_out(bf_state *s, uint8_t value) {
+    s->output[s->output_size++] = value;
+    return s->output_size == s->output_capacity && s->flush() < 0;
+}
+
+/* Input a character into a cell, refilling the input buffer when empty */
+static int bf_in(bf_state *s, uint8_t *cell) {
+    if (s->input_position == s->input_size && !s->at_eof) {
+        int64_t read = s->refill();
+        if (read < 0) return 1;
+        s->at_eof = read == 0;
+    }
+    if (!s->at_eof) *cell = s->input[s->input_position++];
+    else if (s->eof_policy == 1) *cell = 0;
+    else if (s->eof_policy == 2) *cell = 255;
+    return 0;
+}
+
+#define OOB(index) do { s->pointer = p; s->fault = (index); return 1; } while (0)
+#define FAIL() do { s->pointer = p; return 2; } while (0)
+#define OUT() do { if (bf_out(s, m[p])) FAIL(); } while (0)
+#define IN() do { if (bf_in(s, &m[p])) FAIL(); } while (0)
+#define CHARGE() do { if (--s->fuel < 0) { s->pointer = p; \\
+    if (s->take_fuel() < 0) return 2; } } while (0)
+"""
+
+
+def _cell(offset: int) -> str:
+    """Get the source of the index of a cell offset from the data pointer."""
+    if offset > 0:
+        return f"p + {offset}"
+    if offset < 0:
+        return f"p - {-offset}"
+    return "p"
+
+
+def _check_cell(offset: int) -> list[str]:
+    """Get the source checking a cell offset from the data pointer is valid.
+
+    The data pointer itself is always checked when it moves, so only the side
+    of the tape the offset points towards needs to be checked.
+    """
+    if offset > 0:
+        return [f"if ({_cell(offset)} >= size) OOB({_cell(offset)});"]
+    if offset < 0:
+        return [f"if (p < {-offset}) OOB({_cell(offset)});"]
+    return []
+
+
+def _move(distance: int) -> list[str]:
+    """Get the source moving the data pointer and checking it is valid."""
+    if distance > 0:
+        return [f"p += {distance};", "if (p >= size) OOB(p);"]
+    return [f"p -= {-distance};", "if (p < 0) OOB(p);"]
+
+
+def _add(offset: int, value: int) -> str:
+    """Get the source adding a value to a cell, wrapping around modulo 256."""
+    return f"m[{_cell(offset)}] += {value & 0xFF};"
+
+
+def _generate_op(op: Operation) -> list[str]:  # noqa: C901, PLR0911, PLR0912
+    """Generate the source of a non-loop operation."""
+    if isinstance(op, bf.IncOp):
+        return [_add(0, 1)]
+    if isinstance(op, bf.DecOp):
+        return [_add(0, -1)]
+    if isinstance(op, bf.RshftOp):
+        return _move(1)
+    if isinstance(op, bf.LshftOp):
+        return _move(-1)
+    if isinstance(op, bfe.AddOp):
+        offset = op.get_offset()
+        return [*_check_cell(offset), _add(offset, op.value.value.data)]
+    if isinstance(op, bfe.SetOp):
+        offset = op.get_offset()
+        return [
+            *_check_cell(offset),
+            f"m[{_cell(offset)}] = {op.value.value.data & 0xFF};",
+        ]
+    if isinstance(op, bfe.MoveOp):
+        return _move(op.distance.value.data)
+    if isinstance(op, bfe.MulAddOp):
+        lines = ["if (m[p]) {", "    uint8_t value = m[p];"]
+        for offset, factor in op.get_terms():
+            lines.extend(f"    {line}" for line in _check_cell(offset))
+            lines.append(f"    m[{_cell(offset)}] += value * {factor & 0xFF};")
+        lines.extend(["    m[p] = 0;", "}"])
+        return lines
+    if isinstance(op, bfe.ScanOp):
+        stride = op.stride.value.data
+        if stride == 1:
+            return [
+                "if (m[p]) {",
+                "    uint8_t *zero = memchr(m + p, 0, size - p);",
+                "    p = zero ? zero - m : size;",
+                "    if (p == size) OOB(p);",
+                "}",
+            ]
+        return ["while (m[p]) {", *(f"    {line}" for line in _move(stride)), "}"]
+    if isinstance(op, bf.OutOp):
+        return ["OUT();"]
+    if isinstance(op, bf.InOp):
+        return ["IN();"]
+    if isinstance(op, bf.CommandsOp):
+        return _generate_commands(op)
+    raise RuntimeError(f"Unsupported instruction {op}")
+
+
+def _generate_commands(op: bf.CommandsOp) -> list[str]:
+    """Generate the source of packed straight-line commands."""
+    lines: list[str] = []
+    for command, count in op.get_runs():
+        if command in "+-":
+            lines.append(_add(0, count if command == "+" else -count))
+        elif command in "<>":
+            lines.extend(_move(count if command == ">" else -count))
+        elif command == ".":
+            lines.extend(["OUT();"] * count)
+        else:
+            lines.extend(["IN();"] * count)
+    return lines
+
+
+def generate_c(program: ModuleOp, *, budgeted: bool = False) -> str:
+    """Generate C source code for a BrainF program.
+
+    The source defines a function `int bf_run(bf_state *s)`, which runs the
+    program on the tape of 8-bit cells in the state from its data pointer, then
+    returns zero. If the program accesses a cell outside the tape, it stores
+    the data pointer, and the index of the cell as `fault`, then returns one.
+    If a callback to refill the input, flush the output or take more fuel
+    fails, it returns two.
+
+    If `budgeted` is set, each iteration of a loop's body is charged to the
+    fuel in the state, calling `take_fuel` to refill it when it runs out.
+    """
+    charge = ["CHARGE();"] if budgeted else []
+    lines = [
+        _PRELUDE,
+        f"int {ENTRY_POINT}(bf_state *s) {{",
+        "    uint8_t *m = s->memory;",
+        "    int64_t size = s->size;",
+        "    int64_t p = s->pointer;",
+    ]
+
+    # Walk the program iteratively, so deeply nested loops cannot overflow
+    # the Python stack, with each loop jumping between a pair of labels
+    loops: list[tuple[Operation | None, int]] = []
+    labels = 0
+    op = program.body.block.first_op
+    while True:
+        if op is None:
+            if not loops:
+                break
+            op, label = loops.pop()
+            lines.extend(
+                [
+                    f"    if (m[p]) goto loop_{label};",
+                    f"end_{label}:;",
+                ]
+            )
+            continue
+        if isinstance(op, bf.LoopOp):
+            labels += 1
+            lines.extend(
+                [
+                    f"    if (!m[p]) goto end_{labels};",
+                    f"loop_{labels}:;",
+                    *(f"    {line}" for line in charge),
+                ]
+            )
+            loops.append((op.next_op, labels))
+            op = op.body.block.first_op
+            continue
+        if not isinstance(op, bf.RetOp):
+            lines.extend(f"    {line}" for line in _generate_op(op))
+        op = op.next_op
+
+    lines.extend(["    s->pointer = p;", "    return 0;", "}", ""])
+    return "\n".join(lines)
+
+
+def get_compiler() -> list[str]:
+    """Get the command of the C compiler, from `$CC` or else `cc`."""
+    return shlex.split(os.environ.get("CC", "cc"))
+
+
+def build_library(source: str, output: Path) -> None:
+    """Build C source into a shared library with the C compiler.
+
+    Raises:
+        RuntimeError: If the C compiler fails.
+    """
+    try:
+        subprocess.run(  # noqa: S603
+            [*get_compiler(), *CFLAGS, "-x", "c", "-", "-o", str(output)],
+            input=source.encode(),
+            capture_output=True,
+            check=True,
+        )
+    except subprocess.CalledProcessError as exc:
+        raise RuntimeError(
+            f"C compiler failed: {exc.stderr.decode(errors='replace')}"
+        ) from exc
+
+
+def load_library(source: str, cache: CompileCache | None = None) -> ctypes.CDLL:
+    """Build and load the shared library of C source.
+
+    Libraries are cached by the hash of their source, the C compiler and its
+    flags, so each program is only built once. Without a cache, the library is
+    built into a temporary directory, which is removed once it is loaded.
+    """
+    if cache is None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "program.so"
+            build_library(source, path)
+            return ctypes.CDLL(str(path))
+
+    key = cache_key(source, ["c", *get_compiler(), *CFLAGS])
+    if (path := cache.get_path(key, "so")) is None:
+        cache.directory.mkdir(parents=True, exist_ok=True)
+        file, temporary = tempfile.mkstemp(dir=cache.directory, suffix=".tmp")
+        os.close(file)
+        try:
+            build_library(source, Path(temporary))
+            path = cache.put_path(key, "so", Path(temporary))
+        finally:
+            Path(temporary).unlink(missing_ok=True)
+    return ctypes.CDLL(str(path))
+
+
+_Callback = ctypes.CFUNCTYPE(ctypes.c_int64)
+
+
+class _BfState(ctypes.Structure):
+    """The `bf_state` structure passed to the generated C function."""
+
+    _fields_ = (
+        ("memory", ctypes.POINTER(ctypes.c_uint8)),
+        ("size", ctypes.c_int64),
+        ("pointer", ctypes.c_int64),
+        ("input", ctypes.POINTER(ctypes.c_uint8)),
+        ("input_size", ctypes.c_int64),
+        ("input_position", ctypes.c_int64),
+        ("output", ctypes.POINTER(ctypes.c_uint8)),
+        ("output_capacity", ctypes.c_int64),
+        ("output_size", ctypes.c_int64),
+        ("fuel", ctypes.c_int64),
+        ("eof_policy", ctypes.c_int64),
+        ("at_eof", ctypes.c_int64),
+        ("fault", ctypes.c_int64),
+        ("refill", _Callback),
+        ("flush", _Callback),
+        ("take_fuel", _Callback),
+    )
+
+
+@dataclass
+class CompiledProgram:
+    """A BrainF program compiled to a shared library through C."""
+
+    source: str
+    """The generated C source code."""
+    library: ctypes.CDLL
+    """The loaded shared library."""
+
+    @property
+    def entry_point(self) -> Callable[[object], int]:
+        """Get the function of the library which runs the program."""
+        return cast(Callable[[object], int], getattr(self.library, ENTRY_POINT))
+
+
+def compile_program(
+    program: ModuleOp, *, budgeted: bool = False, cache: CompileCache | None = None
+) -> CompiledProgram:
+    """Compile a BrainF program to a shared library through C."""
+    source = generate_c(program, budgeted=budgeted)
+    return CompiledProgram(source, load_library(source, cache))
+
+
+@dataclass
+class CompiledBrainFInterpreter(BaseBrainFInterpreter):
+    """Interpreter which compiles BrainF programs to C with the C compiler.
+
+    Only fixed-size tapes of 8-bit cells are supported, which are passed to the
+    compiled program in place.
+    """
+
+    state: BfState = field(default_factory=BfState)
+    cache: CompileCache | None = None
+    """The cache of built libraries, or `None` to build each program afresh."""
+
+    def interpret(self, program: ModuleOp) -> None:
+        """Compile a BrainF program to C, then build and run it.
+
+        Loop iterations are only charged to the budget of the state if it has
+        one, so unbudgeted programs run without any checks.
+        """
+        self.run(
+            compile_program(program, budgeted=self.state.has_budget, cache=self.cache)
+        )
+
+    def run(self, program: CompiledProgram) -> None:  # noqa: C901
+        """Run a BrainF program compiled to a shared library.
+
+        Raises:
+            ValueError: If the tape is not a fixed-size tape of 8-bit cells.
+            PointerOutOfBoundsError: If the data pointer leaves the tape.
+            BudgetExceeded: If the program exceeds the budget of its state. The
+                compiled program cannot be re-entered part way through, so the
+                program cannot be resumed.
+        """
+        state = self.state
+        if not isinstance(state.memory, bytearray) or state.growable:
+            raise ValueError("Compiled programs need a fixed-size tape of 8-bit cells")
+
+        input_buffer = (ctypes.c_uint8 * BUFFER_SIZE)()
+        output_buffer = (ctypes.c_uint8 * BUFFER_SIZE)()
+        memory = (ctypes.c_uint8 * len(state.memory)).from_buffer(state.memory)
+        context = _BfState(
+            memory=memory,
+            size=len(state.memory),
+            pointer=state.pointer,
+            input=input_buffer,
+            output=output_buffer,
+            output_capacity=BUFFER_SIZE,
+            eof_policy=_EOF_POLICIES[state.eof_policy],
+        )
+        # Exceptions cannot propagate through C, so callbacks store them to be
+        # raised once the program returns
+        errors: list[BaseException] = []
+
+        def guard(function: Callable[[], int]) -> Callable[[], int]:
+            def callback() -> int:
+                try:
+                    return function()
+                except BaseException as exc:  # noqa: BLE001
+                    errors.append(exc)
+                    return -1
+
+            return callback
+
+        def flush() -> int:
+            state.sink.write(ctypes.string_at(output_buffer, context.output_size))
+            context.output_size = 0
+            return 0
+
+        def refill() -> int:
+            # Flush pending output first, so prompts are seen
+            flush()
+            data = state.source.read(BUFFER_SIZE)
+            ctypes.memmove(input_buffer, data, len(data))
+            context.input_size = len(data)
+            context.input_position = 0
+            return len(data)
+
+        def take_fuel() -> int:
+            context.fuel = state.take_fuel() - 1
+            return 0
+
+        # Keep the callbacks referenced until the program returns
+        callbacks = [
+            _Callback(guard(callback)) for callback in (refill, flush, take_fuel)
+        ]
+        context.refill, context.flush, context.take_fuel = callbacks
+        try:
+            status = program.entry_point(ctypes.byref(context))
+        finally:
+            flush()
+            state.return_fuel(context.fuel)
+            state.sink.flush()
+
+        state.pointer = context.pointer
+        if status == _FAILED:
+            raise errors[0]
+        if status == _OUT_OF_BOUNDS:
+            state.reserve(context.fault)
+        if state.output_stream is None:
+            print()
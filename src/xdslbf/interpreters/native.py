@@ -1,55 +1,91 @@
 """Interpreter in pure Python for the BrainF language."""
 
 from collections.abc import Callable
-from io import StringIO
-from typing import TextIO
+from functools import partial
 
 from xdsl.dialects.builtin import ModuleOp
 from xdsl.ir import Operation
 
-from xdslbf.dialects import bf
+from xdslbf.dialects import bf, bfe
 from xdslbf.interpreters.base import (
     BaseBrainFInterpreter,
     BfState,
     PointerOutOfBoundsError,
+    ProgramSuspended,
+    find_zero_cell,
+    reserve_cell,
+    run_commands,
 )
+from xdslbf.interpreters.profile import Profile
+from xdslbf.interpreters.streams import InputSource, OutputSink
+from xdslbf.interpreters.tape import Tape
 
 
 class NativeBrainFInterpreter(BaseBrainFInterpreter):
     """Interpreter for the BrainF language."""
 
     pointer: int
-    memory: list[int]
-    input_stream: TextIO | None = None
-    output_stream: TextIO | None = None
+    memory: Tape
+    cell_mask: int
+    growable: bool = False
+    source: InputSource
+    sink: OutputSink
+    profile: Profile | None
+    """The profile to record execution counts into, if profiling."""
+    fuel: int = 0
+    """The fuel taken from the state's budget but not yet used."""
+    _state: BfState
 
-    def __init__(self, state: BfState | None = None) -> None:
+    def __init__(
+        self, state: BfState | None = None, profile: Profile | None = None
+    ) -> None:
         """Instantiate the interpreter."""
         if state is None:
             state = BfState()
-        self.state = state
+        self.state = state  # pyright: ignore[reportIncompatibleVariableOverride]
+        self.profile = profile
 
     @property
     def state(self) -> BfState:
         """Get state on the interpreter."""
-        return BfState(self.pointer, self.memory, self.input_stream, self.output_stream)
+        self._state.pointer = self.pointer
+        return self._state
 
     @state.setter
     def state(self, state: BfState) -> None:
-        """Set state on the interpreter."""
+        """Set state on the interpreter.
+
+        The fields of the state used by each instruction are cached on the
+        interpreter, so they are not looked up through the state each time.
+        """
+        self._state = state
         self.pointer = state.pointer
         self.memory = state.memory
-        self.input_stream = state.input_stream
-        self.output_stream = state.output_stream
+        self.cell_mask = state.cell_mask
+        self.source = state.source
+        self.sink = state.sink
+        self.growable = state.growable
+
+    def _reserve(self, index: int) -> None:
+        """Check a cell is on the memory tape, growing the tape if allowed."""
+        if not 0 <= index < len(self.memory):
+            reserve_cell(self.memory, index, growable=self.growable)
+
+    def _charge(self) -> None:
+        """Charge a loop iteration to the fuel taken from the budget."""
+        self.fuel -= 1
+        if self.fuel < 0:
+            self.fuel = 0
+            self.fuel = self._state.take_fuel() - 1
 
     def _inc(self, current_instr: Operation) -> Operation | None:
         """Interpret the `bf.inc` instruction."""
-        self.memory[self.pointer] += 1
+        self.memory[self.pointer] = (self.memory[self.pointer] + 1) & self.cell_mask
         return current_instr.next_op
 
     def _dec(self, current_instr: Operation) -> Operation | None:
         """Interpret the `bf.dec` instruction."""
-        self.memory[self.pointer] -= 1
+        self.memory[self.pointer] = (self.memory[self.pointer] - 1) & self.cell_mask
         return current_instr.next_op
 
     def _lshft(self, current_instr: Operation) -> Operation | None:
@@ -62,31 +98,91 @@ class NativeBrainFInterpreter(BaseBrainFInterpreter):
     def _rshft(self, current_instr: Operation) -> Operation | None:
         """Interpret the `bf.rshft` instruction."""
         self.pointer += 1
-        if self.pointer > len(self.memory):
-            raise PointerOutOfBoundsError(
-                f"Pointer value {self.pointer} < {len(self.memory)}"
+        self._reserve(self.pointer)
+        return current_instr.next_op
+
+    def _add(self, current_instr: Operation) -> Operation | None:
+        """Interpret the `bfe.add` instruction."""
+        assert isinstance(current_instr, bfe.AddOp)
+        self._reserve(index := self.pointer + current_instr.get_offset())
+        self.memory[index] = (
+            self.memory[index] + current_instr.value.value.data
+        ) & self.cell_mask
+        return current_instr.next_op
+
+    def _move(self, current_instr: Operation) -> Operation | None:
+        """Interpret the `bfe.move` instruction."""
+        assert isinstance(current_instr, bfe.MoveOp)
+        self.pointer += current_instr.distance.value.data
+        self._reserve(self.pointer)
+        return current_instr.next_op
+
+    def _set(self, current_instr: Operation) -> Operation | None:
+        """Interpret the `bfe.set` instruction."""
+        assert isinstance(current_instr, bfe.SetOp)
+        self._reserve(index := self.pointer + current_instr.get_offset())
+        self.memory[index] = current_instr.value.value.data & self.cell_mask
+        return current_instr.next_op
+
+    def _mul_add(self, current_instr: Operation) -> Operation | None:
+        """Interpret the `bfe.mul_add` instruction."""
+        assert isinstance(current_instr, bfe.MulAddOp)
+        if value := self.memory[self.pointer]:
+            for offset, factor in current_instr.get_terms():
+                self._reserve(self.pointer + offset)
+                self.memory[self.pointer + offset] = (
+                    self.memory[self.pointer + offset] + value * factor
+                ) & self.cell_mask
+            self.memory[self.pointer] = 0
+        return current_instr.next_op
+
+    def _scan(self, current_instr: Operation) -> Operation | None:
+        """Interpret the `bfe.scan` instruction."""
+        assert isinstance(current_instr, bfe.ScanOp)
+        if self.memory[self.pointer]:
+            self.pointer = find_zero_cell(
+                self.memory, self.pointer, current_instr.stride.value.data
             )
+            self._reserve(self.pointer)
         return current_instr.next_op
 
     def _out(self, current_instr: Operation) -> Operation | None:
         """Interpret the `bf.out` instruction."""
-        if self.output_stream is None:
-            print(chr(self.memory[self.pointer]), end="")
-        else:
-            self.output_stream.write(chr(self.state.memory[self.state.pointer]))
+        self.sink.write_byte(self.memory[self.pointer])
         return current_instr.next_op
 
     def _in(self, current_instr: Operation) -> Operation | None:
         """Interpret the `bf.in` instruction."""
-        if self.input_stream is None:
-            self.memory[self.pointer] = ord(input("> ")[0])
-        else:
-            self.memory[self.pointer] = ord(self.input_stream.read(1))
+        self.memory[self.pointer] = (
+            self.source.read_cell(self.memory[self.pointer]) & self.cell_mask
+        )
+        return current_instr.next_op
+
+    def _commands(self, current_instr: Operation, offset: int = 0) -> Operation | None:
+        """Interpret the `bf.commands` instruction, skipping `offset` commands."""
+        assert isinstance(current_instr, bf.CommandsOp)
+        try:
+            self.pointer = run_commands(
+                current_instr.get_runs(),
+                self.memory,
+                self.pointer,
+                self.cell_mask,
+                self._state.reserve,
+                self.source.read_cell,
+                self.sink.write_byte,
+                offset,
+            )
+        except ProgramSuspended as exc:
+            # Keep the pointer the commands run so far moved to
+            if exc.pointer is not None:
+                self.pointer = exc.pointer
+            raise
         return current_instr.next_op
 
     def _loop(self, current_instr: Operation) -> Operation | None:
         """Interpret the `bf.loop` instruction."""
         if self.memory[self.pointer]:
+            self._charge()
             # If non-zero, go to the first loop instruction in the region
             loop_regions = current_instr.regions
             assert len(loop_regions) > 0
@@ -100,6 +196,7 @@ class NativeBrainFInterpreter(BaseBrainFInterpreter):
     def _ret(self, current_instr: Operation) -> Operation | None:
         """Interpret the `bf.ret` instruction."""
         if self.memory[self.pointer]:
+            self._charge()
             # If non-zero, go to the first loop instruction in the region
             assert current_instr.parent is not None
             return current_instr.parent.first_op
@@ -123,29 +220,110 @@ class NativeBrainFInterpreter(BaseBrainFInterpreter):
             bf.InOp: self._in,
             bf.LoopOp: self._loop,
             bf.RetOp: self._ret,
+            bf.CommandsOp: self._commands,
+            bfe.AddOp: self._add,
+            bfe.MoveOp: self._move,
+            bfe.SetOp: self._set,
+            bfe.MulAddOp: self._mul_add,
+            bfe.ScanOp: self._scan,
         }
 
+    def _get_profiled_implementations(
+        self, profile: Profile
+    ) -> dict[type[Operation], Callable[[Operation], Operation | None]]:
+        """Get the operation implementations, instrumented to record a profile."""
+        op_counts = profile.op_counts
+
+        def count(
+            impl: Callable[[Operation], Operation | None],
+        ) -> Callable[[Operation], Operation | None]:
+            def counted(op: Operation) -> Operation | None:
+                op_counts[op.name] += 1
+                return impl(op)
+
+            return counted
+
+        # The loop is run before recording it, so nothing is recorded if the
+        # budget is exceeded, and the loop is run again on resuming
+        def loop(op: Operation) -> Operation | None:
+            next_op = self._loop(op)
+            op_counts[op.name] += 1
+            profile.enter_loop(op)
+            if next_op is op.next_op:
+                profile.exit_loop(op)
+            return next_op
+
+        def ret(op: Operation) -> Operation | None:
+            next_op = self._ret(op)
+            op_counts[op.name] += 1
+            loop_op = op.parent_op()
+            assert op.parent is not None
+            assert loop_op is not None
+            profile.iterate_loop(loop_op)
+            if next_op is not op.parent.first_op:
+                profile.exit_loop(loop_op)
+            return next_op
+
+        implementations = {
+            op_type: count(impl)
+            for op_type, impl in self._get_operation_implementations().items()
+        }
+        implementations[bf.LoopOp] = loop
+        implementations[bf.RetOp] = ret
+        return implementations
+
     def interpret(self, program: ModuleOp) -> None:
-        """Interpret a BrainF program."""
-        operation_implementations = self._get_operation_implementations()
+        """Interpret a BrainF program.
+
+        If the interpreter has a profile, an instrumented implementation of
+        each operation is used, which records the profile as it runs.
 
+        Raises:
+            BudgetExceeded: If the program exceeds the budget of its state,
+                which can be resumed after extending the budget.
+            InputNeeded: If the program's input source has no input ready,
+                which can be resumed after feeding it more input.
+        """
         if (block := program.body.first_block) is None:
             return
-        current_instr: Operation | None = block.first_op
+        self.run_from(block.first_op)
 
-        while current_instr:
-            impl = operation_implementations.get(type(current_instr), None)
-            if impl is None:
-                raise RuntimeError(f"Unsupported instruction {current_instr}")
-            current_instr = impl(current_instr)
-
-        if (out := self.output_stream) is not None:
+        if (out := self.state.output_stream) is not None:
             print(out)
         else:
             print()
 
-    @property
-    def output(self) -> str:
-        """Get the string value of the output stream."""
-        assert isinstance(self.state.output_stream, StringIO)
-        return self.state.output_stream.getvalue()
+    def run_from(self, current_instr: Operation | None, offset: int = 0) -> None:
+        """Run a BrainF program from an instruction until it finishes.
+
+        Args:
+            current_instr: The instruction to run from.
+            offset: The number of commands to skip if the instruction is a
+                packed `bf.commands` operation the program stopped inside.
+
+        Raises:
+            ProgramSuspended: If the program is suspended, as for `interpret`.
+        """
+        if self.profile is None:
+            operation_implementations = self._get_operation_implementations()
+        else:
+            operation_implementations = self._get_profiled_implementations(self.profile)
+
+        try:
+            if offset:
+                # Finish the packed operation the program stopped inside
+                assert current_instr is not None
+                current_instr = self._commands(current_instr, offset)
+            while current_instr:
+                impl = operation_implementations.get(type(current_instr), None)
+                if impl is None:
+                    raise RuntimeError(f"Unsupported instruction {current_instr}")
+                current_instr = impl(current_instr)
+        except ProgramSuspended as exc:
+            exc.resume = partial(self.run_from, current_instr, exc.offset)
+            exc.position = current_instr
+            raise
+        finally:
+            self._state.return_fuel(self.fuel)
+            self.fuel = 0
+            self.state.sink.flush()
@@ -0,0 +1,139 @@
+"""Execution profiles of BrainF programs run by the interpreters.
+
+A profile counts how many times each kind of operation is run, and for each
+loop, how many times it is entered, how many iterations it runs in total, and
+the most iterations it runs on a single entry. Loops are mapped back to their
+source spans, so the profile can be viewed as annotated source code.
+
+Profiling is opt-in: the interpreters only run instrumented code when given a
+profile, so running without one costs nothing.
+"""
+
+import json
+from bisect import bisect_right
+from collections import Counter
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Any
+
+from xdsl.interpreter import Interpreter, PythonValues
+from xdsl.ir import Operation
+
+from xdslbf.dialects import bf
+
+
+@dataclass
+class LoopProfile:
+    """The execution counts of a loop."""
+
+    entries: int = 0
+    """The number of times the loop was reached."""
+    iterations: int = 0
+    """The total number of iterations of the loop's body."""
+    max_trip_count: int = 0
+    """The most iterations of the loop's body on a single entry."""
+
+
+@dataclass
+class Profile:
+    """An execution profile of a BrainF program."""
+
+    spans: Mapping[Operation, tuple[int, int]] = field(
+        default_factory=dict[Operation, tuple[int, int]]
+    )
+    """The positions of the brackets of each loop in the source, if known."""
+    op_counts: Counter[str] = field(default_factory=Counter[str])
+    """The number of times each kind of operation was run, keyed by name."""
+    loops: dict[Operation, LoopProfile] = field(
+        default_factory=dict[Operation, LoopProfile]
+    )
+    """The execution counts of each loop which was reached."""
+    _trip_counts: dict[Operation, int] = field(
+        default_factory=dict[Operation, int], init=False, repr=False
+    )
+    """The iterations of each loop on its current entry."""
+
+    def enter_loop(self, loop: Operation) -> None:
+        """Record a loop being reached."""
+        if (loop_profile := self.loops.get(loop)) is None:
+            loop_profile = self.loops[loop] = LoopProfile()
+        loop_profile.entries += 1
+        self._trip_counts[loop] = 0
+
+    def iterate_loop(self, loop: Operation) -> None:
+        """Record an iteration of a loop's body finishing."""
+        self.loops[loop].iterations += 1
+        self._trip_counts[loop] += 1
+
+    def exit_loop(self, loop: Operation) -> None:
+        """Record a loop being exited."""
+        loop_profile = self.loops[loop]
+        trip_count = self._trip_counts.pop(loop)
+        loop_profile.max_trip_count = max(loop_profile.max_trip_count, trip_count)
+
+    def hot_loops(self) -> list[tuple[Operation, LoopProfile]]:
+        """Get the loops which were reached, from the most iterations to least."""
+        return sorted(
+            self.loops.items(), key=lambda item: item[1].iterations, reverse=True
+        )
+
+    def to_json(self) -> dict[str, Any]:
+        """Get the profile as a JSON-serialisable dictionary."""
+        return {
+            "op_counts": dict(self.op_counts.most_common()),
+            "loops": [
+                {
+                    "span": self.spans.get(loop),
+                    "entries": loop_profile.entries,
+                    "iterations": loop_profile.iterations,
+                    "max_trip_count": loop_profile.max_trip_count,
+                }
+                for loop, loop_profile in self.hot_loops()
+            ],
+        }
+
+    def dumps(self) -> str:
+        """Get the profile as a JSON string."""
+        return json.dumps(self.to_json(), indent=2)
+
+    def annotate(self, source: str) -> str:
+        """Annotate source code with the iterations of the loops on each line.
+
+        Each line is prefixed by the total iterations of the loops which start
+        on it, so the hottest lines of the program stand out.
+        """
+        line_starts = [0]
+        line_starts.extend(
+            index + 1 for index, char in enumerate(source) if char == "\n"
+        )
+        iterations = Counter[int]()
+        for loop, loop_profile in self.loops.items():
+            if (span := self.spans.get(loop)) is not None:
+                line = bisect_right(line_starts, span[0]) - 1
+                iterations[line] += loop_profile.iterations
+        width = max((len(str(count)) for count in iterations.values()), default=1)
+        return "\n".join(
+            f"{iterations[number] or '':>{width}} | {line}"
+            for number, line in enumerate(source.split("\n"))
+        )
+
+
+@dataclass
+class ProfileListener(Interpreter.Listener):
+    """A listener which profiles programs run by the xDSL interpreter."""
+
+    profile: Profile
+    """The profile to record into."""
+
+    def will_interpret_op(self, op: Operation, args: PythonValues) -> None:  # noqa: ARG002
+        """Record an operation about to be run."""
+        self.profile.op_counts[op.name] += 1
+        if isinstance(op, bf.LoopOp):
+            self.profile.enter_loop(op)
+        elif isinstance(op, bf.RetOp) and (loop := op.parent_op()) is not None:
+            self.profile.iterate_loop(loop)
+
+    def did_interpret_op(self, op: Operation, results: PythonValues) -> None:  # noqa: ARG002
+        """Record an operation having been run."""
+        if isinstance(op, bf.LoopOp):
+            self.profile.exit_loop(op)
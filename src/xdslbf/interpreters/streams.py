@@ -0,0 +1,213 @@
+"""Buffered input and output streams for the BrainF interpreters.
+
+Characters output by a program are collected as bytes in a `bytearray`, and
+flushed to the target stream in chunks according to a flush policy, rather
+than written to it one character at a time. Similarly, input is read from the
+source stream in chunks, and served to the program from a buffer.
+"""
+
+import sys
+from dataclasses import dataclass, field
+from enum import Enum
+from io import TextIOBase
+from typing import BinaryIO, TextIO, cast
+
+
+class FlushPolicy(Enum):
+    """When an output sink flushes its buffered output to its target."""
+
+    SIZE = "size"
+    """Flush when the buffered output reaches the chunk size."""
+    NEWLINE = "newline"
+    """Flush after each newline, and when the output reaches the chunk size."""
+    END = "end"
+    """Only flush when explicitly requested, such as at the end of a run."""
+
+
+@dataclass
+class OutputSink:
+    """A buffered sink for the output of a BrainF program.
+
+    Each character is output as a single byte, taking the value of its cell
+    modulo 256 like C's `putchar`. Text targets are written the characters
+    with the same code points as the bytes.
+    """
+
+    target: TextIO | BinaryIO | None = None
+    """The stream to flush output to, or `None` for standard output."""
+    flush_policy: FlushPolicy = FlushPolicy.SIZE
+    """When the buffered output is flushed to the target."""
+    chunk_size: int = 1 << 16
+    """The size in bytes at which the buffered output is flushed."""
+    retain: bool = True
+    """Whether to keep flushed output, so the whole output can be read back."""
+    data: bytearray = field(default_factory=bytearray)
+    """The output collected by the sink."""
+    flushed: int = 0
+    """The number of bytes at the start of `data` already flushed."""
+    offset: int = 0
+    """The number of bytes output before the start of `data`."""
+
+    def write_byte(self, value: int) -> None:
+        """Output a single character."""
+        value &= 0xFF
+        self.data.append(value)
+        if self.flush_policy is FlushPolicy.END:
+            return
+        if len(self.data) - self.flushed >= self.chunk_size or (
+            value == ord("\n") and self.flush_policy is FlushPolicy.NEWLINE
+        ):
+            self.flush()
+
+    def write(self, data: bytes) -> None:
+        """Output a sequence of characters."""
+        self.data.extend(data)
+        if self.flush_policy is FlushPolicy.END:
+            return
+        if len(self.data) - self.flushed >= self.chunk_size or (
+            b"\n" in data and self.flush_policy is FlushPolicy.NEWLINE
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered output to the target stream."""
+        if self.flushed == len(self.data):
+            return
+        target = sys.stdout if self.target is None else self.target
+        with memoryview(self.data)[self.flushed :] as pending:
+            if isinstance(target, TextIOBase):
+                target.write(str(pending, "latin-1"))
+            else:
+                cast(BinaryIO, target).write(pending)
+        target.flush()
+        if self.retain:
+            self.flushed = len(self.data)
+        else:
+            self.offset += len(self.data)
+            self.data.clear()
+            self.flushed = 0
+
+    def tell(self) -> int:
+        """Get the number of bytes output by the program."""
+        return self.offset + len(self.data)
+
+    def getvalue(self) -> bytes:
+        """Get the output collected by the sink."""
+        return bytes(self.data)
+
+    @property
+    def text(self) -> str:
+        """Get the output collected by the sink as a string."""
+        return self.data.decode("latin-1")
+
+
+class EofPolicy(Enum):
+    """What an input instruction stores in its cell at the end of the input."""
+
+    UNCHANGED = "unchanged"
+    """Leave the value of the cell unchanged."""
+    ZERO = "zero"
+    """Store zero in the cell."""
+    MINUS_ONE = "minus-one"
+    """Store minus one in the cell, wrapping around to its maximum value."""
+
+
+@dataclass
+class InputSource:
+    """A read-ahead buffered source for the input of a BrainF program.
+
+    Input is read from the source stream in chunks, and served one byte at a
+    time from an internal buffer. Text streams are read as the bytes with the
+    same code points as their characters.
+    """
+
+    source: TextIO | BinaryIO | None = None
+    """The stream to read input from, or `None` for standard input."""
+    eof_policy: EofPolicy = EofPolicy.UNCHANGED
+    """What is stored in a cell read at the end of the input."""
+    chunk_size: int = 1 << 16
+    """The maximum size in bytes of each chunk read from the source."""
+    tied: OutputSink | None = None
+    """An output sink to flush before reading more input, so prompts are seen."""
+    buffer: bytes = b""
+    """The chunk of input currently being served."""
+    position: int = 0
+    """The position of the next byte to serve in the buffer."""
+    offset: int = 0
+    """The number of bytes of input before the start of the buffer."""
+    at_eof: bool = False
+    """Whether the end of the input has been reached."""
+
+    def _read_chunk(self) -> bytes:
+        """Read the next chunk of input from the source stream."""
+        if self.tied is not None:
+            self.tied.flush()
+        source = sys.stdin.buffer if self.source is None else self.source
+        if isinstance(source, TextIOBase):
+            return source.read(self.chunk_size).encode("latin-1", "replace")
+        # Only wait for the bytes which are available, so interactive input is
+        # served as soon as it is entered
+        binary_source = cast(BinaryIO, source)
+        read = getattr(binary_source, "read1", binary_source.read)
+        return read(self.chunk_size)
+
+    def read_byte(self) -> int | None:
+        """Read a byte of input, or `None` at the end of the input."""
+        if self.position >= len(self.buffer):
+            if self.at_eof:
+                return None
+            chunk = self._read_chunk()
+            self.offset += len(self.buffer)
+            self.buffer = chunk
+            self.position = 0
+            if not self.buffer:
+                self.at_eof = True
+                return None
+        value = self.buffer[self.position]
+        self.position += 1
+        return value
+
+    def read(self, size: int) -> bytes:
+        """Read up to a number of bytes of input, or `b""` at the end.
+
+        Like `read1`, at most one chunk is read from the source, so only the
+        input which is available is waited for.
+        """
+        if self.position >= len(self.buffer):
+            if self.read_byte() is None:
+                return b""
+            self.position -= 1
+        end = min(len(self.buffer), self.position + size)
+        data = self.buffer[self.position : end]
+        self.position = end
+        return data
+
+    def tell(self) -> int:
+        """Get the number of bytes of input read by the program."""
+        return self.offset + self.position
+
+    def skip(self, count: int) -> None:
+        """Discard bytes of input, such as input read before a checkpoint."""
+        while count > 0:
+            if self.position >= len(self.buffer):
+                if self.read_byte() is None:
+                    return
+                count -= 1
+                continue
+            skipped = min(count, len(self.buffer) - self.position)
+            self.position += skipped
+            count -= skipped
+
+    def read_cell(self, current: int) -> int:
+        """Read the new value of a cell, applying the EOF policy at the end.
+
+        Args:
+            current: The current value of the cell.
+        """
+        if (value := self.read_byte()) is not None:
+            return value
+        if self.eof_policy is EofPolicy.ZERO:
+            return 0
+        if self.eof_policy is EofPolicy.MINUS_ONE:
+            return -1
+        return current
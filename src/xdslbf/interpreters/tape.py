@@ -0,0 +1,138 @@
+"""Compact memory tapes of fixed-width cells for the BrainF interpreters.
+
+Tapes are stored as a `bytearray` for 8-bit cells, or an `array` of unsigned
+integers for wider cells, rather than a list of boxed Python integers. Cell
+values wrap around modulo the cell width, matching the behaviour of compiled
+programs.
+
+For programs which only touch a few regions of a very large tape, a
+`PagedTape` allocates fixed-size pages of cells only when they are written.
+"""
+
+from array import array
+from typing import Final, TypeAlias, overload
+
+CELL_TYPECODES: Final = {16: "H", 32: "I"}
+"""The array typecodes of the supported cell widths wider than a byte."""
+
+
+def make_tape(size: int = 30_000, cell_width: int = 8) -> "bytearray | array[int]":
+    """Make a zero-initialised memory tape.
+
+    Args:
+        size: The number of cells in the tape.
+        cell_width: The width of each cell in bits, which is 8, 16 or 32.
+
+    Raises:
+        ValueError: If the cell width is not supported.
+    """
+    if cell_width == 8:  # noqa: PLR2004
+        return bytearray(size)
+    if (typecode := CELL_TYPECODES.get(cell_width)) is None:
+        raise ValueError(
+            f"Unsupported cell width {cell_width}, expected one of 8, 16 or 32"
+        )
+    tape = array(typecode, bytes(size * cell_width // 8))
+    assert tape.itemsize * 8 == cell_width
+    return tape
+
+
+class PagedTape:
+    """A sparse memory tape which allocates pages of cells when written.
+
+    Reading a cell on a page which has not been allocated returns zero without
+    allocating it, so the memory used follows the regions of the tape the
+    program actually writes to, rather than the size of the tape.
+    """
+
+    size: int
+    """The number of cells in the tape."""
+    cell_width: int
+    """The width of each cell in bits."""
+    page_bits: int
+    """The base-2 logarithm of the number of cells in each page."""
+    pages: dict[int, "bytearray | array[int]"]
+    """The allocated pages, keyed by their index on the tape."""
+
+    def __init__(
+        self, size: int = 1 << 32, cell_width: int = 8, page_bits: int = 12
+    ) -> None:
+        """Instantiate an empty paged tape.
+
+        Args:
+            size: The number of cells in the tape.
+            cell_width: The width of each cell in bits, which is 8, 16 or 32.
+            page_bits: The base-2 logarithm of the number of cells in each page.
+        """
+        make_tape(0, cell_width)  # Check the cell width is supported
+        self.size = size
+        self.cell_width = cell_width
+        self.page_bits = page_bits
+        self.pages = {}
+
+    def __len__(self) -> int:
+        """Get the number of cells in the tape."""
+        return self.size
+
+    def _check_index(self, index: int) -> None:
+        """Check an index is on the tape."""
+        if not 0 <= index < self.size:
+            raise IndexError(f"Tape index {index} out of range")
+
+    @overload
+    def __getitem__(self, index: int) -> int: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[int]: ...
+
+    def __getitem__(self, index: int | slice) -> int | list[int]:
+        """Get the value of a cell, or a list of the values of a slice of cells."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.size))]
+        self._check_index(index)
+        page = self.pages.get(index >> self.page_bits)
+        if page is None:
+            return 0
+        return page[index & ((1 << self.page_bits) - 1)]
+
+    def __setitem__(self, index: int, value: int) -> None:
+        """Set the value of a cell, allocating its page if needed."""
+        self._check_index(index)
+        page_index = index >> self.page_bits
+        if (page := self.pages.get(page_index)) is None:
+            page = make_tape(1 << self.page_bits, self.cell_width)
+            self.pages[page_index] = page
+        page[index & ((1 << self.page_bits) - 1)] = value
+
+
+Tape: TypeAlias = "bytearray | array[int] | PagedTape"
+"""A memory tape of fixed-width unsigned integer cells."""
+
+
+def get_cell_width(tape: Tape) -> int:
+    """Get the width of the cells of a tape in bits."""
+    if isinstance(tape, PagedTape):
+        return tape.cell_width
+    return memoryview(tape).itemsize * 8
+
+
+def get_cell_mask(tape: Tape) -> int:
+    """Get the mask which wraps values around to the cell width of a tape."""
+    return (1 << get_cell_width(tape)) - 1
+
+
+def grow_tape(tape: Tape, size: int) -> None:
+    """Grow a tape in place to at least a size, with zero-initialised cells.
+
+    The tape at least doubles in size, so growing it one cell at a time takes
+    amortised constant time.
+    """
+    if size <= len(tape):
+        return
+    new_size = max(size, 2 * len(tape))
+    if isinstance(tape, PagedTape):
+        tape.size = new_size
+    elif isinstance(tape, bytearray):
+        tape.extend(bytes(new_size - len(tape)))
+    else:
+        tape.frombytes(bytes((new_size - len(tape)) * tape.itemsize))
@@ -0,0 +1,287 @@
+"""Interpreter which transpiles BrainF programs to Python source code.
+
+The program is walked once to generate straight-line Python source, which is
+compiled to a code object and executed, so no IR is walked at run time.
+"""
+
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from types import CodeType
+from typing import Any, Final
+
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.ir import Operation
+
+from xdslbf.dialects import bf, bfe
+from xdslbf.interpreters.base import (
+    BaseBrainFInterpreter,
+    BfState,
+    find_zero_cell,
+)
+
+MAX_NESTING: Final = 15
+"""The maximum depth of loops nested in one generated function.
+
+CPython limits the number of statically nested blocks in a function to 20, so
+loops nested more deeply than this are outlined into helper functions.
+"""
+
+ENTRY_POINT: Final = "run"
+"""The name of the generated function which runs the program."""
+
+_SIGNATURE: Final = "(memory, pointer, mask, reserve, read, write, charge)"
+
+
+def _cell(offset: int) -> str:
+    """Get the source of the index of a cell offset from the data pointer."""
+    if offset > 0:
+        return f"pointer + {offset}"
+    if offset < 0:
+        return f"pointer - {-offset}"
+    return "pointer"
+
+
+def _check_cell(offset: int) -> list[str]:
+    """Get the source checking a cell offset from the data pointer is valid.
+
+    The data pointer itself is always checked when it moves, so only the side
+    of the tape the offset points towards needs to be checked.
+    """
+    if offset > 0:
+        return [f"if {_cell(offset)} >= size: size = reserve({_cell(offset)})"]
+    if offset < 0:
+        return [f"if pointer < {-offset}: reserve({_cell(offset)})"]
+    return []
+
+
+def _check_pointer(distance: int) -> list[str]:
+    """Get the source checking the data pointer is valid after moving it."""
+    if distance > 0:
+        return ["if pointer >= size: size = reserve(pointer)"]
+    return ["if pointer < 0: reserve(pointer)"]
+
+
+def _generate_op(op: Operation) -> list[str]:  # noqa: C901, PLR0911, PLR0912
+    """Generate the source of a non-loop operation."""
+    if isinstance(op, bf.IncOp):
+        return ["memory[pointer] = (memory[pointer] + 1) & mask"]
+    if isinstance(op, bf.DecOp):
+        return ["memory[pointer] = (memory[pointer] - 1) & mask"]
+    if isinstance(op, bf.RshftOp):
+        return ["pointer += 1", *_check_pointer(1)]
+    if isinstance(op, bf.LshftOp):
+        return ["pointer -= 1", *_check_pointer(-1)]
+    if isinstance(op, bfe.AddOp):
+        cell = f"memory[{_cell(op.get_offset())}]"
+        return [
+            *_check_cell(op.get_offset()),
+            f"{cell} = ({cell} + {op.value.value.data}) & mask",
+        ]
+    if isinstance(op, bfe.SetOp):
+        offset = op.get_offset()
+        return [
+            *_check_cell(offset),
+            f"memory[{_cell(offset)}] = {op.value.value.data} & mask",
+        ]
+    if isinstance(op, bfe.MoveOp):
+        distance = op.distance.value.data
+        return [f"pointer += {distance}", *_check_pointer(distance)]
+    if isinstance(op, bfe.MulAddOp):
+        lines = ["if value := memory[pointer]:"]
+        for offset, factor in op.get_terms():
+            lines.extend(f"    {line}" for line in _check_cell(offset))
+            cell = f"memory[{_cell(offset)}]"
+            lines.append(f"    {cell} = ({cell} + value * {factor}) & mask")
+        lines.append("    memory[pointer] = 0")
+        return lines
+    if isinstance(op, bfe.ScanOp):
+        stride = op.stride.value.data
+        return [
+            "if memory[pointer]:",
+            f"    pointer = find_zero_cell(memory, pointer, {stride})",
+            "    if not 0 <= pointer < size: size = reserve(pointer)",
+        ]
+    if isinstance(op, bf.OutOp):
+        return ["write(memory[pointer])"]
+    if isinstance(op, bf.InOp):
+        return ["memory[pointer] = read(memory[pointer]) & mask"]
+    if isinstance(op, bf.CommandsOp):
+        return _generate_commands(op)
+    raise RuntimeError(f"Unsupported instruction {op}")
+
+
+def _generate_commands(op: bf.CommandsOp) -> list[str]:
+    """Generate the source of packed straight-line commands."""
+    lines: list[str] = []
+    for command, count in op.get_runs():
+        if command in "+-":
+            lines.append(
+                f"memory[pointer] = (memory[pointer] {command} {count}) & mask"
+            )
+        elif command in "<>":
+            distance = count if command == ">" else -count
+            lines.extend([f"pointer += {distance}", *_check_pointer(distance)])
+        elif command == ".":
+            lines.extend(["write(memory[pointer])"] * count)
+        else:
+            lines.extend(["memory[pointer] = read(memory[pointer]) & mask"] * count)
+    return lines
+
+
+@dataclass
+class _Frame:
+    """A block of operations being generated into a function."""
+
+    lines: list[str]
+    """The lines of the function the block is generated into."""
+    indent: int
+    """The indentation level of the block's body."""
+    op: Operation | None
+    """The next operation in the block to generate."""
+    depth: int = 0
+    """The depth of loops nested in the function at this block."""
+    is_function: bool = False
+    """Whether this is the outermost block of its function."""
+
+
+def generate_source(program: ModuleOp, *, budgeted: bool = False) -> str:
+    """Generate Python source code for a BrainF program.
+
+    The source defines a function `run(memory, pointer, mask, reserve, read,
+    write, charge)`, which runs the program on the memory tape from the data
+    pointer, wrapping cell values with the mask and checking cells outside the
+    tape with `reserve(index)`. It uses `read(value)` to input a character into
+    a cell with a value, and `write(value)` to output a character, then
+    returns the data pointer.
+
+    If `budgeted` is set, each iteration of a loop's body starts by calling
+    `charge(pointer)`, to charge it to the budget of the program's run.
+    Otherwise, `charge` is never called.
+    """
+    charge = ["charge(pointer)"] if budgeted else []
+    functions: list[list[str]] = []
+    outlined = 0
+    frames = [
+        _Frame(
+            [f"def {ENTRY_POINT}{_SIGNATURE}:", "    size = len(memory)"],
+            1,
+            program.body.block.first_op,
+            is_function=True,
+        )
+    ]
+
+    # Walk the program iteratively, so deeply nested loops cannot overflow
+    # the Python stack
+    while frames:
+        frame = frames[-1]
+        indent = "    " * frame.indent
+        if (op := frame.op) is None:
+            # The block has ended, so close its loop body or function
+            if frame.lines[-1].endswith(":"):
+                frame.lines.append(f"{indent}pass")
+            if frame.is_function:
+                frame.lines.append("    return pointer")
+                functions.append(frame.lines)
+            frames.pop()
+            continue
+
+        frame.op = op.next_op
+        if isinstance(op, bf.RetOp):
+            continue
+        if not isinstance(op, bf.LoopOp):
+            frame.lines.extend(f"{indent}{line}" for line in _generate_op(op))
+            continue
+
+        body = op.body.block.first_op
+        if frame.depth < MAX_NESTING:
+            frame.lines.append(f"{indent}while memory[pointer]:")
+            frame.lines.extend(f"{indent}    {line}" for line in charge)
+            frames.append(_Frame(frame.lines, frame.indent + 1, body, frame.depth + 1))
+        else:
+            # Outline the loop into a helper function, so the nesting depth
+            # of blocks in each generated function stays bounded
+            outlined += 1
+            name = f"_loop_{outlined}"
+            frame.lines.append(f"{indent}pointer = {name}{_SIGNATURE}")
+            lines = [
+                f"def {name}{_SIGNATURE}:",
+                "    size = len(memory)",
+                "    while memory[pointer]:",
+                *(f"        {line}" for line in charge),
+            ]
+            frames.append(_Frame(lines, 2, body, 1, is_function=True))
+
+    return "\n\n".join("\n".join(lines) for lines in functions) + "\n"
+
+
+@dataclass
+class TranspiledProgram:
+    """A BrainF program transpiled to Python source code."""
+
+    source: str
+    """The generated Python source code."""
+    code: CodeType
+    """The compiled code object of the source, kept for reuse."""
+
+    def load(self) -> Callable[..., int]:
+        """Execute the code object to get the function running the program."""
+        namespace: dict[str, Any] = {
+            "find_zero_cell": find_zero_cell,
+        }
+        exec(self.code, namespace)  # noqa: S102
+        return namespace[ENTRY_POINT]
+
+
+def transpile_program(
+    program: ModuleOp, *, budgeted: bool = False
+) -> TranspiledProgram:
+    """Transpile a BrainF program to compiled Python source code."""
+    source = generate_source(program, budgeted=budgeted)
+    return TranspiledProgram(source, compile(source, "<brainf>", "exec"))
+
+
+@dataclass
+class TranspiledBrainFInterpreter(BaseBrainFInterpreter):
+    """Interpreter which transpiles BrainF programs to Python source code."""
+
+    state: BfState = field(default_factory=BfState)
+
+    def interpret(self, program: ModuleOp) -> None:
+        """Transpile a BrainF program to Python and run it.
+
+        Loop iterations are only charged to the budget of the state if it has
+        one, so unbudgeted programs run without any checks.
+        """
+        self.run(transpile_program(program, budgeted=self.state.has_budget))
+
+    def run(self, program: TranspiledProgram) -> None:
+        """Run a BrainF program transpiled to Python.
+
+        Raises:
+            BudgetExceeded: If the program exceeds the budget of its state. The
+                generated code cannot be re-entered part way through, so the
+                program cannot be resumed.
+        """
+        state = self.state
+
+        def charge(pointer: int) -> None:
+            # Keep the pointer in the state intact if the budget is exceeded
+            state.pointer = pointer
+            state.charge()
+
+        try:
+            state.pointer = program.load()(
+                state.memory,
+                state.pointer,
+                state.cell_mask,
+                state.reserve,
+                state.source.read_cell,
+                state.sink.write_byte,
+                charge,
+            )
+        finally:
+            state.release_fuel()
+            state.sink.flush()
+
+        if self.state.output_stream is None:
+            print()
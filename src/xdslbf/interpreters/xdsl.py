@@ -1,7 +1,7 @@
 """Interpreter using xDSL infrastructure for the BrainF language."""
 
 from dataclasses import dataclass, field
-from io import StringIO
+from functools import partial
 
 from xdsl.dialects.builtin import ModuleOp
 from xdsl.interpreter import (
@@ -13,13 +13,17 @@ from xdsl.interpreter import (
     impl_terminator,
     register_impls,
 )
+from xdsl.ir import Operation
 
-from xdslbf.dialects import bf
+from xdslbf.dialects import bf, bfe
 from xdslbf.interpreters.base import (
     BaseBrainFInterpreter,
     BfState,
+    BudgetExceeded,
     PointerOutOfBoundsError,
+    find_zero_cell,
 )
+from xdslbf.interpreters.profile import Profile, ProfileListener
 
 
 @register_impls
@@ -42,7 +46,9 @@ class BfFunctions(InterpreterFunctions):
     ) -> PythonValues:
         """Interpret the increment operation in BrainF."""
         state = BfFunctions.get_state(interpreter)
-        state.memory[state.pointer] += 1
+        state.memory[state.pointer] = (
+            state.memory[state.pointer] + 1
+        ) & state.cell_mask
         return args
 
     @impl(bf.DecOp)
@@ -51,7 +57,9 @@ class BfFunctions(InterpreterFunctions):
     ) -> PythonValues:
         """Interpret the decrement operation in BrainF."""
         state = BfFunctions.get_state(interpreter)
-        state.memory[state.pointer] -= 1
+        state.memory[state.pointer] = (
+            state.memory[state.pointer] - 1
+        ) & state.cell_mask
         return args
 
     @impl(bf.LshftOp)
@@ -72,10 +80,82 @@ class BfFunctions(InterpreterFunctions):
         """Interpret the right shift operation in BrainF."""
         state = BfFunctions.get_state(interpreter)
         state.pointer += 1
-        if state.pointer > len(state.memory):
-            raise PointerOutOfBoundsError(
-                f"Pointer value {state.pointer} < {len(state.memory)}"
+        if state.pointer >= len(state.memory):
+            state.reserve(state.pointer)
+        return args
+
+    @impl(bfe.AddOp)
+    def run_add(
+        self, interpreter: Interpreter, op: bfe.AddOp, args: PythonValues
+    ) -> PythonValues:
+        """Interpret the counted add operation in BrainF."""
+        state = BfFunctions.get_state(interpreter)
+        if not 0 <= (index := state.pointer + op.get_offset()) < len(state.memory):
+            state.reserve(index)
+        state.memory[index] = (
+            state.memory[index] + op.value.value.data
+        ) & state.cell_mask
+        return args
+
+    @impl(bfe.MoveOp)
+    def run_move(
+        self, interpreter: Interpreter, op: bfe.MoveOp, args: PythonValues
+    ) -> PythonValues:
+        """Interpret the counted move operation in BrainF."""
+        state = BfFunctions.get_state(interpreter)
+        state.pointer += op.distance.value.data
+        if not 0 <= state.pointer < len(state.memory):
+            state.reserve(state.pointer)
+        return args
+
+    @impl(bfe.SetOp)
+    def run_set(
+        self, interpreter: Interpreter, op: bfe.SetOp, args: PythonValues
+    ) -> PythonValues:
+        """Interpret the set operation in BrainF."""
+        state = BfFunctions.get_state(interpreter)
+        if not 0 <= (index := state.pointer + op.get_offset()) < len(state.memory):
+            state.reserve(index)
+        state.memory[index] = op.value.value.data & state.cell_mask
+        return args
+
+    @impl(bfe.MulAddOp)
+    def run_mul_add(
+        self, interpreter: Interpreter, op: bfe.MulAddOp, args: PythonValues
+    ) -> PythonValues:
+        """Interpret the multiply-add operation in BrainF."""
+        state = BfFunctions.get_state(interpreter)
+        if value := state.memory[state.pointer]:
+            mask = state.cell_mask
+            for offset, factor in op.get_terms():
+                if not 0 <= state.pointer + offset < len(state.memory):
+                    state.reserve(state.pointer + offset)
+                state.memory[state.pointer + offset] = (
+                    state.memory[state.pointer + offset] + value * factor
+                ) & mask
+            state.memory[state.pointer] = 0
+        return args
+
+    @impl(bfe.ScanOp)
+    def run_scan(
+        self, interpreter: Interpreter, op: bfe.ScanOp, args: PythonValues
+    ) -> PythonValues:
+        """Interpret the scan operation in BrainF."""
+        state = BfFunctions.get_state(interpreter)
+        if state.memory[state.pointer]:
+            state.pointer = find_zero_cell(
+                state.memory, state.pointer, op.stride.value.data
             )
+            if not 0 <= state.pointer < len(state.memory):
+                state.reserve(state.pointer)
+        return args
+
+    @impl(bf.CommandsOp)
+    def run_commands(
+        self, interpreter: Interpreter, op: bf.CommandsOp, args: PythonValues
+    ) -> PythonValues:
+        """Interpret the packed straight-line commands operation in BrainF."""
+        BfFunctions.get_state(interpreter).run_commands(op.get_runs())
         return args
 
     @impl(bf.LoopOp)
@@ -85,6 +165,12 @@ class BfFunctions(InterpreterFunctions):
         """Interpret the loop operation in BrainF."""
         state = BfFunctions.get_state(interpreter)
         while state.memory[state.pointer]:
+            try:
+                state.charge()
+            except BudgetExceeded as exc:
+                # Stop before the loop, which checks its cell again on resuming
+                exc.position = op
+                raise
             assert len(op.regions) > 0
             args = interpreter.run_ssacfg_region(op.regions[0], args)
         return args
@@ -102,10 +188,9 @@ class BfFunctions(InterpreterFunctions):
     ) -> PythonValues:
         """Interpret the input operation in BrainF."""
         state = BfFunctions.get_state(interpreter)
-        if state.input_stream is None:
-            state.memory[state.pointer] = ord(input("> ")[0])
-        else:
-            state.memory[state.pointer] = ord(state.input_stream.read(1))
+        state.memory[state.pointer] = (
+            state.source.read_cell(state.memory[state.pointer]) & state.cell_mask
+        )
         return args
 
     @impl(bf.OutOp)
@@ -114,10 +199,7 @@ class BfFunctions(InterpreterFunctions):
     ) -> PythonValues:
         """Interpret the output operation in BrainF."""
         state = BfFunctions.get_state(interpreter)
-        if state.output_stream is None:
-            print(chr(state.memory[state.pointer]), end="")
-        else:
-            state.output_stream.write(chr(state.memory[state.pointer]))
+        state.sink.write_byte(state.memory[state.pointer])
         return args
 
 
@@ -126,22 +208,72 @@ class BrainFInterpreter(BaseBrainFInterpreter):
     """xDSL-based interpreter for the BrainF language."""
 
     state: BfState = field(default_factory=BfState)
+    profile: Profile | None = None
+    """The profile to record execution counts into, if profiling."""
 
     def interpret(self, program: ModuleOp) -> None:
-        """Interpret a BrainF program using xDSL infrastructure."""
-        interpreter = Interpreter(program)
-        interpreter.register_implementations(BfFunctions())
-        BfFunctions.set_state(interpreter, self.state)
+        """Interpret a BrainF program using xDSL infrastructure.
+
+        If the interpreter has a profile, it is recorded by a listener on the
+        xDSL interpreter, which is otherwise not registered.
 
-        interpreter.run_ssacfg_region(program.body, ())
+        Raises:
+            BudgetExceeded: If the program exceeds the budget of its state,
+                which can be resumed after extending the budget.
+        """
+        if (block := program.body.first_block) is None:
+            return
+        self.run_from(program, block.first_op)
 
         if (out := self.state.output_stream) is not None:
             print(out)
         else:
             print()
 
-    @property
-    def output(self) -> str:
-        """Get the string value of the output stream."""
-        assert isinstance(self.state.output_stream, StringIO)
-        return self.state.output_stream.getvalue()
+    def run_from(
+        self, program: ModuleOp, op: Operation | None, offset: int = 0
+    ) -> None:
+        """Run a BrainF program from an operation until it finishes.
+
+        The xDSL interpreter's call stack of nested loops is rebuilt by running
+        the rest of the block containing the operation, then each enclosing
+        loop until its cell is zero, then the rest of the block containing
+        that loop, and so on out to the top level of the program.
+
+        Args:
+            program: The program to run.
+            op: The operation to run from.
+            offset: The number of commands to skip if the operation is a
+                packed `bf.commands` operation the program stopped inside.
+
+        Raises:
+            BudgetExceeded: If the program exceeds the budget of its state,
+                which can be resumed after extending the budget.
+        """
+        listeners = () if self.profile is None else (ProfileListener(self.profile),)
+        interpreter = Interpreter(program, listeners=listeners)
+        interpreter.register_implementations(BfFunctions())
+        BfFunctions.set_state(interpreter, self.state)
+
+        try:
+            if offset:
+                # Finish the packed operation the program stopped inside
+                assert isinstance(op, bf.CommandsOp)
+                self.state.run_commands(op.get_runs(), offset)
+                op = op.next_op
+            while op is not None:
+                if isinstance(op, bf.RetOp):
+                    loop_op = op.parent_op()
+                    assert loop_op is not None
+                    interpreter.run_op(loop_op)
+                    op = loop_op.next_op
+                else:
+                    interpreter.run_op(op)
+                    op = op.next_op
+        except BudgetExceeded as exc:
+            if isinstance(exc.position, Operation):
+                exc.resume = partial(self.run_from, program, exc.position)
+            raise
+        finally:
+            self.state.release_fuel()
+            self.state.sink.flush()
@@ -0,0 +1,44 @@
+/* Runtime for BrainF programs lowered with buffered input and output.
+ *
+ * Programs lowered by `bf-to-builtin` with `io_buffer_size` set write and read
+ * bytes in bulk by calling `bf_write` and `bf_read`, rather than `putchar` and
+ * `getchar`. Link this file into the executable built from such a program.
+ *
+ * The buffer is a one-dimensional `memref` of bytes, which MLIR's lowering to
+ * LLVM passes as its descriptor: the allocated and aligned pointers, the
+ * offset, the size and the stride. Buffers are contiguous, so only the aligned
+ * pointer and the offset are used. The `index` type is 64 bits wide.
+ */
+
+#include <errno.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <unistd.h>
+
+/* Write `length` bytes of a buffer to standard output, returning the number of
+ * bytes written. Output is flushed, so it is seen before waiting for input. */
+int64_t bf_write(uint8_t *allocated, uint8_t *aligned, int64_t offset,
+                 int64_t size, int64_t stride, int64_t length) {
+    (void)allocated;
+    (void)size;
+    (void)stride;
+    size_t written = fwrite(aligned + offset, 1, (size_t)length, stdout);
+    fflush(stdout);
+    return (int64_t)written;
+}
+
+/* Read up to `length` bytes of standard input into a buffer, returning the
+ * number of bytes read, or zero at the end of the input. This returns as soon
+ * as any input is available, so interactive programs do not wait for a full
+ * buffer. */
+int64_t bf_read(uint8_t *allocated, uint8_t *aligned, int64_t offset,
+                int64_t size, int64_t stride, int64_t length) {
+    (void)allocated;
+    (void)size;
+    (void)stride;
+    ssize_t count;
+    do {
+        count = read(STDIN_FILENO, aligned + offset, (size_t)length);
+    } while (count < 0 && errno == EINTR);
+    return count < 0 ? 0 : (int64_t)count;
+}
@@ -1,5 +1,18 @@
 """Transformation rewrites for the BrainF language."""
 
+from .defer_moves import DeferMovesPass
+from .fold_runs import FoldRunsPass
+from .loop_idioms import RecogniseLoopIdiomsPass
 from .lower_bf_builtin import LowerBfToBuiltinPass
+from .lower_bf_builtin_direct import DirectLowerBfToBuiltinPass
+from .pack_commands import PackCommandsPass, UnpackCommandsPass
 
-__all__ = ["LowerBfToBuiltinPass"]
+__all__ = [
+    "DeferMovesPass",
+    "DirectLowerBfToBuiltinPass",
+    "FoldRunsPass",
+    "LowerBfToBuiltinPass",
+    "PackCommandsPass",
+    "RecogniseLoopIdiomsPass",
+    "UnpackCommandsPass",
+]
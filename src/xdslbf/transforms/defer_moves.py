@@ -0,0 +1,93 @@
+"""A pass which defers pointer movement in straight-line BrainF code."""
+
+from dataclasses import dataclass
+
+from xdsl.context import Context
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.ir import Operation
+from xdsl.passes import ModulePass
+from xdsl.pattern_rewriter import (
+    PatternRewriter,
+    PatternRewriteWalker,
+    RewritePattern,
+    op_type_rewrite_pattern,
+)
+from xdsl.rewriter import InsertPoint
+
+from xdslbf.dialects import bf, bfe
+from xdslbf.transforms.fold_runs import cell_delta, pointer_delta
+
+
+def offset_cell_op(op: Operation | None, distance: int) -> Operation | None:
+    """Get an equivalent cell operation addressed from a moved data pointer.
+
+    Returns:
+        The operation rewritten to target the same cell once the data pointer
+        has been moved back by `distance`, or None if it is not a cell op.
+    """
+    if isinstance(op, bfe.AddOp):
+        return bfe.AddOp(op.value, op.get_offset() + distance)
+    if isinstance(op, bfe.SetOp):
+        return bfe.SetOp(op.value, op.get_offset() + distance)
+    if (delta := cell_delta(op)) is not None:
+        return bfe.AddOp(delta, distance)
+    return None
+
+
+@dataclass
+class DeferMovesPattern(RewritePattern):
+    """A pattern to sink pointer movement past cell operations.
+
+    Cell operations following a move are rewritten to address their cell at
+    an offset from the unmoved data pointer, and all the moves in the
+    straight-line code are merged into a single move before the next
+    operation which needs the real data pointer, such as a loop or output.
+    """
+
+    @op_type_rewrite_pattern
+    def match_and_rewrite(
+        self, op: bf.LshftOp | bf.RshftOp | bfe.MoveOp, rewriter: PatternRewriter
+    ) -> None:
+        """Rewrite a move and the straight-line code following it."""
+        next_op = op.next_op
+        if pointer_delta(next_op) is None and offset_cell_op(next_op, 0) is None:
+            return
+
+        distance = pointer_delta(op)
+        assert distance is not None
+        current = next_op
+        while current is not None:
+            following = current.next_op
+            if (delta := pointer_delta(current)) is not None:
+                distance += delta
+                rewriter.erase_op(current)
+            elif (new_op := offset_cell_op(current, distance)) is not None:
+                rewriter.replace_op(current, new_op)
+            else:
+                break
+            current = following
+
+        if distance:
+            if current is not None:
+                insertion_point = InsertPoint.before(current)
+            else:
+                block = op.parent_block()
+                assert block is not None
+                insertion_point = InsertPoint.at_end(block)
+            rewriter.insert_op(bfe.MoveOp(distance), insertion_point)
+        rewriter.erase_matched_op()
+
+
+class DeferMovesPass(ModulePass):
+    """A pass for deferring pointer movement in straight-line code.
+
+    For example, `>>+<<-` is rewritten to add one to the cell at offset two
+    from the data pointer and then subtract one from the current cell, without
+    moving the data pointer at all.
+    """
+
+    name = "bf-defer-moves"
+
+    def apply(self, ctx: Context, op: ModuleOp) -> None:  # noqa: ARG002
+        """Apply the move deferral pass."""
+        PatternRewriteWalker(DeferMovesPattern()).rewrite_module(op)
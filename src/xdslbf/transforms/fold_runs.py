@@ -0,0 +1,117 @@
+"""A pass which folds runs of BrainF instructions into counted operations."""
+
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from xdsl.context import Context
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.ir import Operation
+from xdsl.passes import ModulePass
+from xdsl.pattern_rewriter import (
+    GreedyRewritePatternApplier,
+    PatternRewriter,
+    PatternRewriteWalker,
+    RewritePattern,
+    op_type_rewrite_pattern,
+)
+
+from xdslbf.dialects import bf, bfe
+
+
+def cell_delta(op: Operation | None) -> int | None:
+    """Get the value an operation adds to the current cell, if it is an add."""
+    if isinstance(op, bf.IncOp):
+        return 1
+    if isinstance(op, bf.DecOp):
+        return -1
+    if isinstance(op, bfe.AddOp) and not op.get_offset():
+        return op.value.value.data
+    return None
+
+
+def pointer_delta(op: Operation | None) -> int | None:
+    """Get the distance an operation moves the data pointer, if it is a move."""
+    if isinstance(op, bf.RshftOp):
+        return 1
+    if isinstance(op, bf.LshftOp):
+        return -1
+    if isinstance(op, bfe.MoveOp):
+        return op.distance.value.data
+    return None
+
+
+def _fold_run(
+    op: Operation,
+    rewriter: PatternRewriter,
+    delta: Callable[[Operation | None], int | None],
+    build: Callable[[int], Operation],
+) -> None:
+    """Fold the run of operations starting at `op` into a single counted op."""
+    if delta(op.prev_op) is not None:
+        # Only fold from the start of a run, so each run is rewritten once
+        return
+
+    run: list[Operation] = []
+    total = 0
+    current: Operation | None = op
+    while current is not None and (step := delta(current)) is not None:
+        run.append(current)
+        total += step
+        current = current.next_op
+
+    if len(run) == 1 and isinstance(op, bfe.AddOp | bfe.MoveOp) and total:
+        # The run is already a single counted operation
+        return
+
+    for folded_op in run[1:]:
+        rewriter.erase_op(folded_op)
+    if total:
+        rewriter.replace_matched_op(build(total))
+    else:
+        rewriter.erase_matched_op()
+
+
+@dataclass
+class FoldAddRunsPattern(RewritePattern):
+    """A pattern to fold runs of increment and decrement operations."""
+
+    @op_type_rewrite_pattern
+    def match_and_rewrite(
+        self, op: bf.IncOp | bf.DecOp | bfe.AddOp, rewriter: PatternRewriter
+    ) -> None:
+        """Rewrite a run of increments and decrements into a single add."""
+        _fold_run(op, rewriter, cell_delta, bfe.AddOp)
+
+
+@dataclass
+class FoldMoveRunsPattern(RewritePattern):
+    """A pattern to fold runs of left and right shift operations."""
+
+    @op_type_rewrite_pattern
+    def match_and_rewrite(
+        self, op: bf.LshftOp | bf.RshftOp | bfe.MoveOp, rewriter: PatternRewriter
+    ) -> None:
+        """Rewrite a run of left and right shifts into a single move."""
+        _fold_run(op, rewriter, pointer_delta, bfe.MoveOp)
+
+
+class FoldRunsPass(ModulePass):
+    """A pass for folding runs of instructions into counted operations.
+
+    Adjacent `+`/`-` instructions are folded into a single `bfe.add`, and
+    adjacent `>`/`<` instructions into a single `bfe.move`. Runs which cancel
+    out entirely, such as `+-` or `<>`, are removed.
+    """
+
+    name = "bf-fold-runs"
+
+    def apply(self, ctx: Context, op: ModuleOp) -> None:  # noqa: ARG002
+        """Apply the folding pass."""
+        PatternRewriteWalker(
+            GreedyRewritePatternApplier(
+                [
+                    FoldAddRunsPattern(),
+                    FoldMoveRunsPattern(),
+                ]
+            )
+        ).rewrite_module(op)
@@ -0,0 +1,143 @@
+"""A pass which replaces common BrainF loop idioms with extended operations."""
+
+from dataclasses import dataclass
+
+from xdsl.context import Context
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.passes import ModulePass
+from xdsl.pattern_rewriter import (
+    GreedyRewritePatternApplier,
+    PatternRewriter,
+    PatternRewriteWalker,
+    RewritePattern,
+    op_type_rewrite_pattern,
+)
+
+from xdslbf.dialects import bf, bfe
+from xdslbf.transforms.fold_runs import cell_delta, pointer_delta
+
+
+def analyse_multiply_loop(op: bf.LoopOp) -> dict[int, int] | None:
+    """Analyse whether a loop is a multiply loop such as `[->+>++<<]`.
+
+    A multiply loop only adds constants to cells and moves the data pointer,
+    returns the data pointer to where it started, and decrements the starting
+    cell by exactly one on each iteration. Each iteration therefore adds a
+    constant multiple of the starting cell's value to the other cells.
+
+    Returns:
+        A mapping from offsets relative to the data pointer to the factor the
+        starting cell is multiplied by, or None if the loop does not match.
+    """
+    pointer = 0
+    deltas: dict[int, int] = {}
+    for body_op in op.body.block.ops:
+        if isinstance(body_op, bf.RetOp):
+            continue
+        if isinstance(body_op, bfe.AddOp):
+            target = pointer + body_op.get_offset()
+            deltas[target] = deltas.get(target, 0) + body_op.value.value.data
+        elif (delta := cell_delta(body_op)) is not None:
+            deltas[pointer] = deltas.get(pointer, 0) + delta
+        elif (delta := pointer_delta(body_op)) is not None:
+            pointer += delta
+        else:
+            return None
+
+    if pointer != 0 or deltas.pop(0, 0) != -1:
+        return None
+    return {offset: factor for offset, factor in deltas.items() if factor}
+
+
+@dataclass
+class ClearLoopPattern(RewritePattern):
+    """A pattern to rewrite clear loops such as `[-]` and `[+]`.
+
+    A loop whose body only adds an odd value to the current cell always
+    terminates with the cell set to zero, assuming wrap-around cells.
+    """
+
+    @op_type_rewrite_pattern
+    def match_and_rewrite(self, op: bf.LoopOp, rewriter: PatternRewriter) -> None:
+        """Rewrite clear loops into a set operation."""
+        loop_block = op.body.block
+        body_op = loop_block.first_op
+        if body_op is None or not isinstance(body_op.next_op, bf.RetOp):
+            return
+        if (delta := cell_delta(body_op)) is None or delta % 2 == 0:
+            return
+        rewriter.replace_matched_op(bfe.SetOp(0))
+
+
+@dataclass
+class MultiplyLoopPattern(RewritePattern):
+    """A pattern to rewrite multiply loops such as `[->+>++<<]`."""
+
+    @op_type_rewrite_pattern
+    def match_and_rewrite(self, op: bf.LoopOp, rewriter: PatternRewriter) -> None:
+        """Rewrite multiply loops into a multiply-add operation."""
+        if (terms := analyse_multiply_loop(op)) is None:
+            return
+        if not terms:
+            rewriter.replace_matched_op(bfe.SetOp(0))
+            return
+        offsets = sorted(terms)
+        rewriter.replace_matched_op(
+            bfe.MulAddOp(offsets, [terms[offset] for offset in offsets])
+        )
+
+
+@dataclass
+class ScanLoopPattern(RewritePattern):
+    """A pattern to rewrite scan loops such as `[>]`, `[<]` and `[>>>]`."""
+
+    @op_type_rewrite_pattern
+    def match_and_rewrite(self, op: bf.LoopOp, rewriter: PatternRewriter) -> None:
+        """Rewrite scan loops into a scan operation."""
+        pointer = 0
+        for body_op in op.body.block.ops:
+            if isinstance(body_op, bf.RetOp):
+                continue
+            if (delta := pointer_delta(body_op)) is None:
+                return
+            pointer += delta
+        if pointer:
+            rewriter.replace_matched_op(bfe.ScanOp(pointer))
+
+
+@dataclass
+class FoldSetAddPattern(RewritePattern):
+    """A pattern to fold an add following a set into the set value."""
+
+    @op_type_rewrite_pattern
+    def match_and_rewrite(self, op: bfe.SetOp, rewriter: PatternRewriter) -> None:
+        """Rewrite a set followed by adds into a single set."""
+        next_op = op.next_op
+        if isinstance(next_op, bfe.AddOp) and next_op.get_offset() == op.get_offset():
+            delta = next_op.value.value.data
+        elif op.get_offset() or (delta := cell_delta(next_op)) is None:
+            return
+        assert next_op is not None
+        rewriter.erase_op(next_op)
+        rewriter.replace_matched_op(
+            bfe.SetOp(op.value.value.data + delta, op.get_offset())
+        )
+
+
+class RecogniseLoopIdiomsPass(ModulePass):
+    """A pass for replacing common loop idioms with extended operations."""
+
+    name = "bf-loop-idioms"
+
+    def apply(self, ctx: Context, op: ModuleOp) -> None:  # noqa: ARG002
+        """Apply the loop idiom recognition pass."""
+        PatternRewriteWalker(
+            GreedyRewritePatternApplier(
+                [
+                    ClearLoopPattern(),
+                    MultiplyLoopPattern(),
+                    ScanLoopPattern(),
+                    FoldSetAddPattern(),
+                ]
+            )
+        ).rewrite_module(op)
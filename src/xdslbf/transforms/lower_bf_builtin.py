@@ -1,12 +1,20 @@
 """A pass which lowers the bf dialect to use only builtin mlir dialects."""
 
 from dataclasses import dataclass
-from typing import TYPE_CHECKING
+from functools import lru_cache
+from typing import Final
 
 from xdsl.context import Context
-from xdsl.dialects import arith, func, memref, scf
-from xdsl.dialects.builtin import IndexType, ModuleOp, i32
-from xdsl.ir import Block, Region
+from xdsl.dialects import arith, func, linalg, memref, scf
+from xdsl.dialects.builtin import (
+    IndexType,
+    IntegerAttr,
+    IntegerType,
+    ModuleOp,
+    i8,
+    i32,
+)
+from xdsl.ir import Block, Operation, Region, SSAValue
 from xdsl.passes import ModulePass
 from xdsl.pattern_rewriter import (
     GreedyRewritePatternApplier,
@@ -16,162 +24,697 @@ from xdsl.pattern_rewriter import (
     op_type_rewrite_pattern,
 )
 
-from xdslbf.dialects import bf
+from xdslbf.dialects import bf, bfe
+
+
+@dataclass
+class DataPointer:
+    """The SSA value of the data pointer at the operation being lowered.
+
+    The data pointer is carried as an `index` value rather than stored in
+    memory. The operations are lowered in a single walk in program order, so
+    each pattern reads the value of the pointer before its operation, and
+    patterns which move the pointer replace it with the moved value. Loops
+    carry the pointer through the arguments and results of their `scf.while`.
+    """
+
+    value: SSAValue
+    """The value of the data pointer before the next operation to lower."""
+
+
+@lru_cache(maxsize=1 << 12)
+def _get_integer_attr(
+    value: int, value_type: IntegerType | IndexType
+) -> IntegerAttr[IntegerType | IndexType]:
+    """Get an integer attribute, wrapping its value to fit an integer type."""
+    return IntegerAttr(
+        value, value_type, truncate_bits=isinstance(value_type, IntegerType)
+    )
+
+
+def build_constant(value: int, value_type: IntegerType | IndexType) -> arith.ConstantOp:
+    """Build a constant integer, wrapping its value to fit an integer type.
+
+    Attributes are immutable, so the attribute of each value is built and
+    verified once and shared between constants, as building them otherwise
+    dominates the time taken to lower large programs.
+    """
+    return arith.ConstantOp.create(
+        result_types=[value_type],
+        properties={"value": _get_integer_attr(value, value_type)},
+    )
+
+
+_NO_OVERFLOW_FLAGS: Final = arith.IntegerOverflowAttr(())
+"""The overflow flags of integer arithmetic, which wraps around on overflow."""
+
+
+def build_arith(
+    op_type: type[arith.AddiOp | arith.SubiOp | arith.MuliOp],
+    lhs: Operation | SSAValue,
+    rhs: Operation | SSAValue,
+) -> arith.AddiOp | arith.SubiOp | arith.MuliOp:
+    """Build an integer arithmetic operation.
+
+    The operation is created directly rather than through its initialiser, as
+    the operands and types of the lowered operations are already known.
+    """
+    lhs = SSAValue.get(lhs)
+    return op_type.create(
+        operands=[lhs, SSAValue.get(rhs)],
+        result_types=[lhs.type],
+        properties={"overflowFlags": _NO_OVERFLOW_FLAGS},
+    )
+
+
+def build_load(
+    memory: memref.AllocOp, index: Operation | SSAValue, cell_type: IntegerType
+) -> memref.LoadOp:
+    """Build a load of a cell of the tape, created directly."""
+    return memref.LoadOp.create(
+        operands=[memory.memref, SSAValue.get(index)], result_types=[cell_type]
+    )
+
+
+def build_store(
+    value: Operation | SSAValue, memory: memref.AllocOp, index: Operation | SSAValue
+) -> memref.StoreOp:
+    """Build a store to a cell of the tape, created directly."""
+    return memref.StoreOp.create(
+        operands=[SSAValue.get(value), memory.memref, SSAValue.get(index)]
+    )
+
+
+def build_cell_index(
+    pointer: SSAValue, offset: int = 0
+) -> tuple[list[Operation], SSAValue]:
+    """Build operations to get the index of a cell offset from the data pointer.
+
+    Returns:
+        The operations to insert, and the SSA value of the cell's index.
+    """
+    if not offset:
+        return [], pointer
+    const_offset = build_constant(offset, IndexType())
+    cell_index = build_arith(arith.AddiOp, pointer, const_offset)
+    return [const_offset, cell_index], cell_index.result
+
+
+def convert_integer(
+    value: SSAValue, source_type: IntegerType, target_type: IntegerType
+) -> tuple[list[Operation], SSAValue]:
+    """Build operations to zero-extend or truncate an integer to another width.
+
+    Returns:
+        The operations to insert, and the SSA value of the converted integer.
+    """
+    source_width = source_type.width.data
+    target_width = target_type.width.data
+    if source_width < target_width:
+        convert_op = arith.ExtUIOp(value, target_type)
+    elif source_width > target_width:
+        convert_op = arith.TruncIOp(value, target_type)
+    else:
+        return [], value
+    return [convert_op], convert_op.result
+
+
+@dataclass
+class CommandsOpLowering(RewritePattern):
+    """A pattern to expand packed straight-line commands.
+
+    Each run of a repeated command is expanded into a single counted
+    operation, or an operation per input or output, which are then lowered by
+    the other patterns.
+    """
+
+    def build(self, op: bf.CommandsOp) -> list[Operation]:
+        """Build the counted and I/O operations expanding packed commands."""
+        new_ops: list[Operation] = []
+        for command, count in op.get_runs():
+            if command in "+-":
+                new_ops.append(bfe.AddOp(count if command == "+" else -count))
+            elif command in "<>":
+                new_ops.append(bfe.MoveOp(count if command == ">" else -count))
+            else:
+                io_op = bf.OutOp if command == "." else bf.InOp
+                new_ops.extend(io_op.create() for _ in range(count))
+        return new_ops
 
-if TYPE_CHECKING:
-    from xdsl.ir import Operation
+    @op_type_rewrite_pattern
+    def match_and_rewrite(self, op: bf.CommandsOp, rewriter: PatternRewriter) -> None:
+        """Rewrite packed commands into counted and I/O operations."""
+        rewriter.replace_op(op, self.build(op), [])
 
 
 @dataclass
 class ShiftOpLowering(RewritePattern):
     """A pattern to rewrite left and right shift operations."""
 
-    data_pointer: memref.AllocaOp
+    pointer: DataPointer
+
+    def build(self, op: bf.LshftOp | bf.RshftOp) -> list[Operation]:
+        """Build the operations moving the data pointer by one cell."""
+        arith_op = arith.AddiOp if isinstance(op, bf.RshftOp) else arith.SubiOp
+        const_1 = build_constant(1, IndexType())
+        shift_op = build_arith(arith_op, self.pointer.value, const_1)
+        self.pointer.value = shift_op.result
+        return [const_1, shift_op]
 
     @op_type_rewrite_pattern
     def match_and_rewrite(
         self, op: bf.LshftOp | bf.RshftOp, rewriter: PatternRewriter
     ) -> None:
         """Rewrite left and right shift operations."""
-        arith_op = arith.AddiOp if isinstance(op, bf.RshftOp) else arith.SubiOp
-        rewriter.replace_op(
-            op,
-            [
-                load_op := memref.LoadOp.get(self.data_pointer, []),
-                const_1 := arith.ConstantOp.from_int_and_width(1, i32),
-                inc_op := arith_op(load_op, const_1),
-                memref.StoreOp.get(inc_op, self.data_pointer, []),
-            ],
-        )
+        rewriter.replace_op(op, self.build(op), [])
 
 
 @dataclass
 class IncOpLowering(RewritePattern):
     """A pattern to rewrite increment and decrement operations."""
 
-    data_pointer: memref.AllocaOp
+    pointer: DataPointer
     memory: memref.AllocOp
+    cell_type: IntegerType
+
+    def build(self, op: bf.IncOp | bf.DecOp) -> list[Operation]:
+        """Build the operations incrementing or decrementing the current cell."""
+        arith_op = arith.AddiOp if isinstance(op, bf.IncOp) else arith.SubiOp
+        return [
+            load_data_op := build_load(self.memory, self.pointer.value, self.cell_type),
+            const_1 := build_constant(1, self.cell_type),
+            inc_op := build_arith(arith_op, load_data_op, const_1),
+            build_store(inc_op, self.memory, self.pointer.value),
+        ]
 
     @op_type_rewrite_pattern
     def match_and_rewrite(
         self, op: bf.IncOp | bf.DecOp, rewriter: PatternRewriter
     ) -> None:
         """Rewrite increment and decrement operations."""
-        arith_op = arith.AddiOp if isinstance(op, bf.IncOp) else arith.SubiOp
-        rewriter.replace_op(
-            op,
+        rewriter.replace_op(op, self.build(op), [])
+
+
+@dataclass
+class MoveOpLowering(RewritePattern):
+    """A pattern to rewrite counted move operations."""
+
+    pointer: DataPointer
+
+    def build(self, op: bfe.MoveOp) -> list[Operation]:
+        """Build the operations moving the data pointer by a distance."""
+        const_distance = build_constant(op.distance.value.data, IndexType())
+        move_op = build_arith(arith.AddiOp, self.pointer.value, const_distance)
+        self.pointer.value = move_op.result
+        return [const_distance, move_op]
+
+    @op_type_rewrite_pattern
+    def match_and_rewrite(self, op: bfe.MoveOp, rewriter: PatternRewriter) -> None:
+        """Rewrite counted move operations."""
+        rewriter.replace_op(op, self.build(op), [])
+
+
+@dataclass
+class AddOpLowering(RewritePattern):
+    """A pattern to rewrite counted add operations."""
+
+    pointer: DataPointer
+    memory: memref.AllocOp
+    cell_type: IntegerType
+
+    def build(self, op: bfe.AddOp) -> list[Operation]:
+        """Build the operations adding a value to a cell."""
+        index_ops, cell_index = build_cell_index(self.pointer.value, op.get_offset())
+        return [
+            *index_ops,
+            load_data_op := build_load(self.memory, cell_index, self.cell_type),
+            const_value := build_constant(op.value.value.data, self.cell_type),
+            add_op := build_arith(arith.AddiOp, load_data_op, const_value),
+            build_store(add_op, self.memory, cell_index),
+        ]
+
+    @op_type_rewrite_pattern
+    def match_and_rewrite(self, op: bfe.AddOp, rewriter: PatternRewriter) -> None:
+        """Rewrite counted add operations."""
+        rewriter.replace_op(op, self.build(op), [])
+
+
+@dataclass
+class SetOpLowering(RewritePattern):
+    """A pattern to rewrite set operations."""
+
+    pointer: DataPointer
+    memory: memref.AllocOp
+    cell_type: IntegerType
+
+    def build(self, op: bfe.SetOp) -> list[Operation]:
+        """Build the operations storing a value to a cell."""
+        index_ops, cell_index = build_cell_index(self.pointer.value, op.get_offset())
+        return [
+            *index_ops,
+            const_value := build_constant(op.value.value.data, self.cell_type),
+            build_store(const_value, self.memory, cell_index),
+        ]
+
+    @op_type_rewrite_pattern
+    def match_and_rewrite(self, op: bfe.SetOp, rewriter: PatternRewriter) -> None:
+        """Rewrite set operations."""
+        rewriter.replace_op(op, self.build(op), [])
+
+
+@dataclass
+class MulAddOpLowering(RewritePattern):
+    """A pattern to rewrite multiply-add operations."""
+
+    pointer: DataPointer
+    memory: memref.AllocOp
+    cell_type: IntegerType
+
+    def build(self, op: bfe.MulAddOp) -> list[Operation]:
+        """Build the operations adding multiples of the current cell to others.
+
+        The target cells are only accessed if the current cell is non-zero, as
+        the multiply loop would not run, so a zero cell at the edge of the
+        tape does not access cells outside it.
+        """
+        pointer_index = self.pointer.value
+        load_data_op = build_load(self.memory, pointer_index, self.cell_type)
+        const_0 = build_constant(0, self.cell_type)
+        is_nonzero = arith.CmpiOp(load_data_op, const_0, "ne")
+        terms: list[Operation] = []
+        for offset, factor in op.get_terms():
+            terms.extend(
+                [
+                    const_offset := build_constant(offset, IndexType()),
+                    target_index := build_arith(
+                        arith.AddiOp, pointer_index, const_offset
+                    ),
+                    load_target_op := build_load(
+                        self.memory, target_index, self.cell_type
+                    ),
+                    const_factor := build_constant(factor, self.cell_type),
+                    mul_op := build_arith(arith.MuliOp, load_data_op, const_factor),
+                    add_op := build_arith(arith.AddiOp, load_target_op, mul_op),
+                    build_store(add_op, self.memory, target_index),
+                ]
+            )
+        terms.extend([build_store(const_0, self.memory, pointer_index), scf.YieldOp()])
+        return [load_data_op, const_0, is_nonzero, scf.IfOp(is_nonzero, [], terms)]
+
+    @op_type_rewrite_pattern
+    def match_and_rewrite(self, op: bfe.MulAddOp, rewriter: PatternRewriter) -> None:
+        """Rewrite multiply-add operations."""
+        rewriter.replace_op(op, self.build(op), [])
+
+
+@dataclass
+class ScanOpLowering(RewritePattern):
+    """A pattern to rewrite scan operations."""
+
+    pointer: DataPointer
+    memory: memref.AllocOp
+    cell_type: IntegerType
+
+    def build(self, op: bfe.ScanOp) -> list[Operation]:
+        """Build the loop moving the data pointer to the next zero cell."""
+        # Carry the index through the loop, so only the tape is accessed
+        const_0 = build_constant(0, self.cell_type)
+        const_stride = build_constant(op.stride.value.data, IndexType())
+        before_block = Block(arg_types=[IndexType()])
+        before_block.add_ops(
+            [
+                load_data_op := build_load(
+                    self.memory, before_block.args[0], self.cell_type
+                ),
+                cmp_op := arith.CmpiOp(load_data_op, const_0, "ne"),
+                scf.ConditionOp(cmp_op, before_block.args[0]),
+            ]
+        )
+        after_block = Block(arg_types=[IndexType()])
+        after_block.add_ops(
             [
-                load_pointer_op := memref.LoadOp.get(self.data_pointer, []),
-                pointer_index := arith.IndexCastOp(load_pointer_op, IndexType()),
-                load_data_op := memref.LoadOp.get(self.memory, [pointer_index]),
-                const_1 := arith.ConstantOp.from_int_and_width(1, i32),
-                inc_op := arith_op(load_data_op, const_1),
-                memref.StoreOp.get(inc_op, self.memory, [pointer_index]),
-            ],
+                next_index := build_arith(
+                    arith.AddiOp, after_block.args[0], const_stride
+                ),
+                scf.YieldOp(next_index),
+            ]
+        )
+        while_loop = scf.WhileOp(
+            [self.pointer.value], [IndexType()], [before_block], [after_block]
         )
+        self.pointer.value = while_loop.results[0]
+        return [const_0, const_stride, while_loop]
+
+    @op_type_rewrite_pattern
+    def match_and_rewrite(self, op: bfe.ScanOp, rewriter: PatternRewriter) -> None:
+        """Rewrite scan operations."""
+        rewriter.replace_op(op, self.build(op), [])
+
+
+def build_loop_condition(memory: memref.AllocOp, cell_type: IntegerType) -> Block:
+    """Build the block checking the condition of a loop carrying the pointer.
+
+    The loop continues while the current cell is non-zero.
+    """
+    before_block = Block(arg_types=[IndexType()])
+    before_block.add_ops(
+        [
+            load_data_op := build_load(memory, before_block.args[0], cell_type),
+            const_0 := build_constant(0, cell_type),
+            cmp_op := arith.CmpiOp(load_data_op, const_0, "ne"),
+            scf.ConditionOp(cmp_op, before_block.args[0]),
+        ]
+    )
+    return before_block
 
 
 @dataclass
 class LoopOpLowering(RewritePattern):
     """A pattern to rewrite loop operations."""
 
-    data_pointer: memref.AllocaOp
+    pointer: DataPointer
     memory: memref.AllocOp
+    cell_type: IntegerType
 
     @op_type_rewrite_pattern
     def match_and_rewrite(self, op: bf.LoopOp, rewriter: PatternRewriter) -> None:
         """Rewrite loop operations."""
-        # Extract and detach the body of the `bf.loop` operation
+        # Extract and detach the body of the `bf.loop` operation, which takes
+        # the data pointer as an argument
         op.detach_region(loop_body := op.regions[0])
+        body_pointer = loop_body.block.insert_arg(IndexType(), 0)
 
-        # Construct a while loop with the `bf.loop`'s body
+        # Construct a while loop with the `bf.loop`'s body, carrying the pointer
         while_loop = scf.WhileOp(
-            arguments=[],
-            result_types=[],
-            before_region=[
-                Block(
-                    [
-                        load_pointer_op := memref.LoadOp.get(self.data_pointer, []),
-                        pointer_index := arith.IndexCastOp(
-                            load_pointer_op, IndexType()
-                        ),
-                        load_data_op := memref.LoadOp.get(self.memory, [pointer_index]),
-                        const_0 := arith.ConstantOp.from_int_and_width(0, i32),
-                        cmp_op := arith.CmpiOp(load_data_op, const_0, "ne"),
-                        scf.ConditionOp(cmp_op),
-                    ]
-                )
-            ],
+            arguments=[self.pointer.value],
+            result_types=[IndexType()],
+            before_region=[build_loop_condition(self.memory, self.cell_type)],
             after_region=loop_body,
         )
 
-        # Replace the matched operation with the newly constructed while loop
-        rewriter.replace_matched_op(while_loop)
+        # Replace the matched operation with the newly constructed while loop,
+        # whose body is lowered next
+        rewriter.replace_op(op, while_loop, [])
+        self.pointer.value = body_pointer
 
 
 @dataclass
 class RetOpLowering(RewritePattern):
     """A pattern to rewrite return operations."""
 
+    pointer: DataPointer
+
     @op_type_rewrite_pattern
     def match_and_rewrite(self, op: bf.RetOp, rewriter: PatternRewriter) -> None:
-        """Rewrite ret operations."""
-        rewriter.replace_op(op, scf.YieldOp())
+        """Rewrite ret operations, which end the body of the loop being lowered."""
+        while_loop = op.parent_op()
+        assert isinstance(while_loop, scf.WhileOp)
+        rewriter.replace_op(op, scf.YieldOp(self.pointer.value))
+        self.pointer.value = while_loop.results[0]
+
+
+@dataclass
+class IOBuffers:
+    """Buffers of input and output bytes, exchanged with the runtime in bulk.
+
+    Rather than calling `putchar` and `getchar` for each character, output is
+    collected in a buffer written by a call to `bf_write` when it fills up,
+    and input is read into a buffer by a call to `bf_read` when it runs out.
+    Both externals take the buffer and a number of bytes, and return the
+    number of bytes written or read, like `fwrite` to standard output and
+    `fread` from standard input, reading zero bytes at the end of the input.
+    The lengths and position in the buffers are kept in memory, so they need
+    not be carried through every loop.
+
+    The externals are implemented by `runtime/bf_io.c` in this package, which
+    is linked into executables built from buffered programs.
+    """
+
+    size: int
+    """The number of bytes in each buffer."""
+    output: memref.AllocOp
+    """The buffer of output bytes."""
+    output_length: memref.AllocOp
+    """The number of bytes in the output buffer."""
+    input: memref.AllocOp
+    """The buffer of input bytes."""
+    input_position: memref.AllocOp
+    """The position of the next byte to read in the input buffer."""
+    input_length: memref.AllocOp
+    """The number of bytes read into the input buffer."""
+
+    @staticmethod
+    def build(size: int) -> tuple[list[Operation], "IOBuffers"]:
+        """Build the operations allocating empty buffers of a number of bytes.
+
+        Returns:
+            The operations to insert, and the allocated buffers.
+        """
+        buffers = IOBuffers(
+            size,
+            memref.AllocOp.get(i8, None, [size]),
+            memref.AllocOp.get(IndexType(), None, []),
+            memref.AllocOp.get(i8, None, [size]),
+            memref.AllocOp.get(IndexType(), None, []),
+            memref.AllocOp.get(IndexType(), None, []),
+        )
+        const_0 = build_constant(0, IndexType())
+        return [
+            buffers.output,
+            buffers.output_length,
+            buffers.input,
+            buffers.input_position,
+            buffers.input_length,
+            const_0,
+            memref.StoreOp.get(const_0, buffers.output_length, []),
+            memref.StoreOp.get(const_0, buffers.input_position, []),
+            memref.StoreOp.get(const_0, buffers.input_length, []),
+        ], buffers
+
+    def get_externals(self) -> list[Operation]:
+        """Get the declarations of the functions writing and reading buffers."""
+        buffer_type = self.output.memref.type
+        return [
+            func.FuncOp.external(
+                "bf_write", (buffer_type, IndexType()), (IndexType(),)
+            ),
+            func.FuncOp.external("bf_read", (buffer_type, IndexType()), (IndexType(),)),
+        ]
+
+    def build_flush(self) -> list[Operation]:
+        """Build the operations writing and emptying the output buffer."""
+        return [
+            length := memref.LoadOp.get(self.output_length, []),
+            func.CallOp("bf_write", [self.output, length], [IndexType()]),
+            const_0 := build_constant(0, IndexType()),
+            memref.StoreOp.get(const_0, self.output_length, []),
+        ]
+
+    def build_write(self, char: SSAValue) -> list[Operation]:
+        """Build the operations appending a byte to the output buffer.
+
+        The buffer is written when it is full.
+        """
+        length = memref.LoadOp.get(self.output_length, [])
+        const_1 = build_constant(1, IndexType())
+        new_length = build_arith(arith.AddiOp, length, const_1)
+        const_size = build_constant(self.size, IndexType())
+        is_full = arith.CmpiOp(new_length, const_size, "eq")
+        return [
+            length,
+            memref.StoreOp.get(char, self.output, [length]),
+            const_1,
+            new_length,
+            const_size,
+            is_full,
+            scf.IfOp(
+                is_full,
+                [],
+                [
+                    func.CallOp("bf_write", [self.output, new_length], [IndexType()]),
+                    const_0 := build_constant(0, IndexType()),
+                    memref.StoreOp.get(const_0, self.output_length, []),
+                    scf.YieldOp(),
+                ],
+                [
+                    memref.StoreOp.get(new_length, self.output_length, []),
+                    scf.YieldOp(),
+                ],
+            ),
+        ]
+
+    def build_read(self, cell_type: IntegerType) -> tuple[list[Operation], SSAValue]:
+        """Build the operations taking the next byte from the input buffer.
+
+        When the buffer is empty, the output is flushed, so prompts are written
+        before waiting for input, and the buffer is refilled. At the end of the
+        input, the byte read is -1, like the result of `getchar`.
+
+        Returns:
+            The operations to insert, and the SSA value of the byte as a cell.
+        """
+        position = memref.LoadOp.get(self.input_position, [])
+        length = memref.LoadOp.get(self.input_length, [])
+        is_empty = arith.CmpiOp(position, length, "eq")
+        refill = [
+            *self.build_flush(),
+            const_size := build_constant(self.size, IndexType()),
+            read := func.CallOp("bf_read", [self.input, const_size], [IndexType()]),
+            memref.StoreOp.get(read, self.input_length, []),
+            const_0 := build_constant(0, IndexType()),
+            memref.StoreOp.get(const_0, self.input_position, []),
+            scf.YieldOp(),
+        ]
+
+        next_position = memref.LoadOp.get(self.input_position, [])
+        next_length = memref.LoadOp.get(self.input_length, [])
+        is_available = arith.CmpiOp(next_position, next_length, "ult")
+        byte = memref.LoadOp.get(self.input, [next_position])
+        cell_ops, cell = convert_integer(byte.res, i8, cell_type)
+        take = [
+            byte,
+            const_1 := build_constant(1, IndexType()),
+            new_position := build_arith(arith.AddiOp, next_position, const_1),
+            memref.StoreOp.get(new_position, self.input_position, []),
+            *cell_ops,
+            scf.YieldOp(cell),
+        ]
+        end_of_input = [
+            const_eof := build_constant(-1, cell_type),
+            scf.YieldOp(const_eof),
+        ]
+        read_byte = scf.IfOp(is_available, [cell_type], take, end_of_input)
+        return [
+            position,
+            length,
+            is_empty,
+            scf.IfOp(is_empty, [], refill),
+            next_position,
+            next_length,
+            is_available,
+            read_byte,
+        ], read_byte.results[0]
+
+    def build_dealloc(self) -> list[Operation]:
+        """Build the operations freeing the buffers."""
+        return [
+            memref.DeallocOp.get(buffer)
+            for buffer in (
+                self.output,
+                self.output_length,
+                self.input,
+                self.input_position,
+                self.input_length,
+            )
+        ]
 
 
 @dataclass
 class OutOpLowering(RewritePattern):
     """A pattern to rewrite output operations."""
 
-    data_pointer: memref.AllocaOp
+    pointer: DataPointer
     memory: memref.AllocOp
+    cell_type: IntegerType
+    buffers: IOBuffers | None = None
+
+    def build(self, _op: bf.OutOp) -> list[Operation]:
+        """Build the operations writing the current cell as a character."""
+        load_data_op = build_load(self.memory, self.pointer.value, self.cell_type)
+        if self.buffers is not None:
+            char_ops, char = convert_integer(load_data_op.res, self.cell_type, i8)
+            return [load_data_op, *char_ops, *self.buffers.build_write(char)]
+        char_ops, char = convert_integer(load_data_op.res, self.cell_type, i32)
+        return [load_data_op, *char_ops, func.CallOp("putchar", [char], [i32])]
 
     @op_type_rewrite_pattern
     def match_and_rewrite(self, op: bf.OutOp, rewriter: PatternRewriter) -> None:
         """Rewrite output operations."""
-        rewriter.insert_op_before_matched_op(
-            [
-                load_pointer_op := memref.LoadOp.get(self.data_pointer, []),
-                pointer_index := arith.IndexCastOp(load_pointer_op, IndexType()),
-                load_data_op := memref.LoadOp.get(self.memory, [pointer_index]),
-                func.CallOp("putchar", [load_data_op], [i32]),
-            ]
-        )
-        rewriter.erase_op(op)
+        rewriter.replace_op(op, self.build(op), [])
 
 
 @dataclass
 class InOpLowering(RewritePattern):
     """A pattern to rewrite input operations."""
 
-    data_pointer: memref.AllocaOp
+    pointer: DataPointer
     memory: memref.AllocOp
+    cell_type: IntegerType
+    buffers: IOBuffers | None = None
+
+    def build(self, _op: bf.InOp) -> list[Operation]:
+        """Build the operations reading a character into the current cell."""
+        if self.buffers is not None:
+            read_ops, cell = self.buffers.build_read(self.cell_type)
+            return [*read_ops, build_store(cell, self.memory, self.pointer.value)]
+        data = func.CallOp("getchar", [], [i32])
+        cell_ops, cell = convert_integer(data.res[0], i32, self.cell_type)
+        return [
+            data,
+            *cell_ops,
+            build_store(cell, self.memory, self.pointer.value),
+        ]
 
     @op_type_rewrite_pattern
     def match_and_rewrite(self, op: bf.InOp, rewriter: PatternRewriter) -> None:
         """Rewrite input operations."""
-        rewriter.insert_op_before_matched_op(
-            [
-                data := func.CallOp("getchar", [], [i32]),
-                load_pointer_op := memref.LoadOp.get(self.data_pointer, []),
-                pointer_index := arith.IndexCastOp(load_pointer_op, IndexType()),
-                memref.StoreOp.get(data, self.memory, [pointer_index]),
-            ]
-        )
-        rewriter.erase_op(op)
+        rewriter.replace_op(op, self.build(op), [])
+
 
+CELL_WIDTHS: Final = (8, 16, 32)
+"""The supported widths of the cells of the tape, in bits."""
 
+
+@dataclass(frozen=True)
 class LowerBfToBuiltinPass(ModulePass):
-    """A pass for lowering operations in the bf dialect to only use builtin dialects."""
+    """A pass for lowering operations in the bf dialect to only use builtin dialects.
+
+    Cells of the memory tape are integers of `cell_width` bits, so their values
+    wrap around on overflow, matching the interpreters' tapes. The tape has
+    `memory_size` cells, is aligned to `alignment` bytes, and is filled with
+    zeros before the program runs.
+
+    Characters are written and read by calling `putchar` and `getchar`, or if
+    `io_buffer_size` is set, through buffers of that many bytes, as described
+    by `IOBuffers`.
+    """
 
     name = "bf-to-builtin"
 
+    cell_width: int = 8
+    memory_size: int = 30_000
+    alignment: int = 64
+    io_buffer_size: int = 0
+
+    def __post_init__(self) -> None:
+        """Check the options of the pass.
+
+        Raises:
+            ValueError: If an option is not supported.
+        """
+        if self.cell_width not in CELL_WIDTHS:
+            raise ValueError(
+                f"Unsupported cell width {self.cell_width}, expected one of 8, 16 "
+                "or 32"
+            )
+        if self.memory_size <= 0:
+            raise ValueError(f"Memory size must be positive, not {self.memory_size}")
+        if self.alignment <= 0 or self.alignment & (self.alignment - 1):
+            raise ValueError(f"Alignment must be a power of two, not {self.alignment}")
+        if self.io_buffer_size < 0:
+            raise ValueError(
+                f"I/O buffer size must not be negative, not {self.io_buffer_size}"
+            )
+
     def build_brainf_environment(
-        self, _ctx: Context, op: ModuleOp, memory_size: int = 30_000
-    ) -> tuple[memref.AllocaOp, memref.AllocOp]:
+        self, _ctx: Context, op: ModuleOp
+    ) -> tuple[DataPointer, memref.AllocOp, IOBuffers | None]:
         """Build the brainf environment.
 
-        This includes allocating the data pointer and the memory region.
+        This includes allocating and zero-filling the memory region, allocating
+        any I/O buffers and initialising the data pointer, whose constant is
+        the last operation before the program. The output buffer is flushed
+        after the program.
         """
         # Lift the ir into a main function
         op.detach_region(region := op.body)
@@ -182,29 +725,42 @@ class LowerBfToBuiltinPass(ModulePass):
             )
         )
 
-        # Instantiate the operations to register IO functions
-        setup: list[Operation] = [
-            func.FuncOp.external("putchar", (i32,), (i32,)),
-            func.FuncOp.external("getchar", (), (i32,)),
-        ]
-        assert outer_block.first_op is not None
-        for new_op in setup:
-            outer_block.insert_op_before(new_op, outer_block.first_op)
-
         # Instantiate the operations setting up the runtime
+        cell_type = IntegerType(self.cell_width)
         setup: list[Operation] = [
-            const_0 := arith.ConstantOp.from_int_and_width(0, i32),
-            data_pointer_alloca_op := memref.AllocaOp.get(i32, 64, []),
-            memref.StoreOp.get(const_0, data_pointer_alloca_op, []),
-            memory_alloc_op := memref.AllocOp.get(i32, 64, [memory_size]),
+            const_0 := build_constant(0, i32),
+            memory_alloc_op := memref.AllocOp.get(
+                cell_type, self.alignment, [self.memory_size]
+            ),
+            const_cell_0 := build_constant(0, cell_type),
+            linalg.FillOp([const_cell_0.result], [memory_alloc_op.memref], []),
         ]
+        buffers = None
+        if self.io_buffer_size:
+            buffer_ops, buffers = IOBuffers.build(self.io_buffer_size)
+            setup.extend(buffer_ops)
+        setup.append(initial_pointer := build_constant(0, IndexType()))
         first_op = block.first_op
         if first_op is not None:
             block.insert_ops_before(setup, first_op)
         else:
             block.add_ops(setup)
 
+        # Instantiate the operations to register IO functions
+        externals: list[Operation] = (
+            buffers.get_externals()
+            if buffers is not None
+            else [
+                func.FuncOp.external("putchar", (i32,), (i32,)),
+                func.FuncOp.external("getchar", (), (i32,)),
+            ]
+        )
+        assert outer_block.first_op is not None
+        outer_block.insert_ops_before(externals, outer_block.first_op)
+
         # Instantiate the operations tearing down up the runtime
+        if buffers is not None:
+            block.add_ops([*buffers.build_flush(), *buffers.build_dealloc()])
         block.add_ops(
             [
                 memref.DeallocOp.get(memory_alloc_op),
@@ -213,20 +769,32 @@ class LowerBfToBuiltinPass(ModulePass):
         )
 
         # Return SSA references to operations used by the lowering passes
-        return (data_pointer_alloca_op, memory_alloc_op)
+        return (DataPointer(initial_pointer.result), memory_alloc_op, buffers)
 
     def apply(self, ctx: Context, op: ModuleOp) -> None:
-        """Apply the lowering pass."""
-        data_pointer, memory = self.build_brainf_environment(ctx, op)
+        """Apply the lowering pass.
+
+        Packed commands are expanded first, so the data pointer can then be
+        threaded through the operations in a single walk in program order.
+        """
+        data_pointer, memory, buffers = self.build_brainf_environment(ctx, op)
+        cell_type = IntegerType(self.cell_width)
+        PatternRewriteWalker(CommandsOpLowering()).rewrite_module(op)
         PatternRewriteWalker(
             GreedyRewritePatternApplier(
                 [
                     ShiftOpLowering(data_pointer),
-                    IncOpLowering(data_pointer, memory),
-                    LoopOpLowering(data_pointer, memory),
-                    RetOpLowering(),
-                    InOpLowering(data_pointer, memory),
-                    OutOpLowering(data_pointer, memory),
+                    IncOpLowering(data_pointer, memory, cell_type),
+                    MoveOpLowering(data_pointer),
+                    AddOpLowering(data_pointer, memory, cell_type),
+                    SetOpLowering(data_pointer, memory, cell_type),
+                    MulAddOpLowering(data_pointer, memory, cell_type),
+                    ScanOpLowering(data_pointer, memory, cell_type),
+                    LoopOpLowering(data_pointer, memory, cell_type),
+                    RetOpLowering(data_pointer),
+                    InOpLowering(data_pointer, memory, cell_type, buffers),
+                    OutOpLowering(data_pointer, memory, cell_type, buffers),
                 ]
-            )
+            ),
+            apply_recursively=False,
         ).rewrite_module(op)
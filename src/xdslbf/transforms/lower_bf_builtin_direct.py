@@ -0,0 +1,162 @@
+"""A pass which lowers the bf dialect in a single walk, building the new IR.
+
+Rather than matching each operation against a list of rewrite patterns and
+replacing it in place, the program is walked once in program order, and the
+lowered operations are built directly into new blocks, with the same
+operations as the pattern-based lowering builds. The body of the program is
+replaced by the built IR, so no operation is rewritten or detached along the
+way.
+"""
+
+from dataclasses import dataclass
+
+from xdsl.context import Context
+from xdsl.dialects import memref, scf
+from xdsl.dialects.builtin import IndexType, IntegerType, ModuleOp
+from xdsl.ir import Block, Operation, Region
+
+from xdslbf.dialects import bf, bfe
+from xdslbf.transforms.lower_bf_builtin import (
+    AddOpLowering,
+    CommandsOpLowering,
+    DataPointer,
+    IncOpLowering,
+    InOpLowering,
+    IOBuffers,
+    LowerBfToBuiltinPass,
+    MoveOpLowering,
+    MulAddOpLowering,
+    OutOpLowering,
+    ScanOpLowering,
+    SetOpLowering,
+    ShiftOpLowering,
+    build_loop_condition,
+)
+
+
+class BuiltinBuilder:
+    """Build the lowered operations of a BrainF program, in program order.
+
+    The operations of each block are collected bottom-up, and added to the
+    block of their loop when the end of the loop is reached.
+    """
+
+    def __init__(
+        self,
+        pointer: DataPointer,
+        memory: memref.AllocOp,
+        cell_type: IntegerType,
+        buffers: IOBuffers | None = None,
+    ) -> None:
+        """Instantiate the builder with the environment of the lowered program."""
+        self.pointer = pointer
+        self.memory = memory
+        self.cell_type = cell_type
+        self._commands = CommandsOpLowering()
+        self._shift = ShiftOpLowering(pointer)
+        self._inc = IncOpLowering(pointer, memory, cell_type)
+        self._move = MoveOpLowering(pointer)
+        self._add = AddOpLowering(pointer, memory, cell_type)
+        self._set = SetOpLowering(pointer, memory, cell_type)
+        self._mul_add = MulAddOpLowering(pointer, memory, cell_type)
+        self._scan = ScanOpLowering(pointer, memory, cell_type)
+        self._in = InOpLowering(pointer, memory, cell_type, buffers)
+        self._out = OutOpLowering(pointer, memory, cell_type, buffers)
+
+    def build_op(self, op: Operation, new_ops: list[Operation]) -> None:  # noqa: C901
+        """Build the lowered operations of a straight-line operation.
+
+        Raises:
+            ValueError: If the operation cannot be lowered.
+        """
+        match op:
+            case bf.CommandsOp():
+                for command_op in self._commands.build(op):
+                    self.build_op(command_op, new_ops)
+            case bf.LshftOp() | bf.RshftOp():
+                new_ops.extend(self._shift.build(op))
+            case bf.IncOp() | bf.DecOp():
+                new_ops.extend(self._inc.build(op))
+            case bfe.MoveOp():
+                new_ops.extend(self._move.build(op))
+            case bfe.AddOp():
+                new_ops.extend(self._add.build(op))
+            case bfe.SetOp():
+                new_ops.extend(self._set.build(op))
+            case bfe.MulAddOp():
+                new_ops.extend(self._mul_add.build(op))
+            case bfe.ScanOp():
+                new_ops.extend(self._scan.build(op))
+            case bf.InOp():
+                new_ops.extend(self._in.build(op))
+            case bf.OutOp():
+                new_ops.extend(self._out.build(op))
+            case _:
+                raise ValueError(f"Cannot lower operation {op.name}")
+
+    def build(self, block: Block) -> list[Operation]:
+        """Build the lowered operations of a block of the program.
+
+        Loops are walked with an explicit stack rather than by recursion, so
+        deeply nested programs are lowered without reaching the recursion
+        limit.
+        """
+        body: list[Operation] = []
+        # Each entry holds the remaining operations of a block being lowered,
+        # its lowered operations and the loop lowered from it, if any
+        stack: list[tuple[Operation | None, list[Operation], scf.WhileOp | None]] = [
+            (block.first_op, body, None)
+        ]
+        while stack:
+            op, new_ops, while_loop = stack.pop()
+            while op is not None and not isinstance(op, bf.LoopOp | bf.RetOp):
+                self.build_op(op, new_ops)
+                op = op.next_op
+
+            if isinstance(op, bf.LoopOp):
+                after_block = Block(arg_types=[IndexType()])
+                new_loop = scf.WhileOp(
+                    [self.pointer.value],
+                    [IndexType()],
+                    [build_loop_condition(self.memory, self.cell_type)],
+                    [after_block],
+                )
+                new_ops.append(new_loop)
+                self.pointer.value = after_block.args[0]
+                stack.append((op.next_op, new_ops, while_loop))
+                stack.append((op.body.block.first_op, [], new_loop))
+            elif while_loop is not None:
+                # The end of a loop body, so carry the pointer to the next
+                # iteration and past the loop
+                new_ops.append(scf.YieldOp(self.pointer.value))
+                while_loop.after_region.block.add_ops(new_ops)
+                self.pointer.value = while_loop.results[0]
+        return body
+
+
+@dataclass(frozen=True)
+class DirectLowerBfToBuiltinPass(LowerBfToBuiltinPass):
+    """A pass lowering the bf dialect by building the new IR in a single walk.
+
+    This builds the same IR as `LowerBfToBuiltinPass`, without the overhead of
+    matching rewrite patterns against each operation and rewriting in place.
+    """
+
+    name = "bf-to-builtin-direct"
+
+    def apply(self, ctx: Context, op: ModuleOp) -> None:
+        """Apply the lowering pass."""
+        op.detach_region(program := op.body)
+        op.add_region(Region(Block()))
+        data_pointer, memory, buffers = self.build_brainf_environment(ctx, op)
+        initial_pointer = data_pointer.value.owner
+        assert isinstance(initial_pointer, Operation)
+        builder = BuiltinBuilder(
+            data_pointer, memory, IntegerType(self.cell_width), buffers
+        )
+        new_ops = builder.build(program.block)
+
+        # Insert the program between the setup and teardown of the environment
+        main_block = initial_pointer.parent_block()
+        assert main_block is not None
+        main_block.insert_ops_after(new_ops, initial_pointer)
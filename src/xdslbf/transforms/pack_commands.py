@@ -0,0 +1,71 @@
+"""Passes which pack and unpack runs of straight-line BrainF instructions."""
+
+from xdsl.context import Context
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.ir import Block, Operation
+from xdsl.passes import ModulePass
+from xdsl.pattern_rewriter import PatternRewriteWalker
+
+from xdslbf.dialects import bf
+from xdslbf.transforms.lower_bf_builtin import CommandsOpLowering
+
+COMMAND_CHARACTERS: dict[type[Operation], str] = {
+    bf.IncOp: "+",
+    bf.DecOp: "-",
+    bf.LshftOp: "<",
+    bf.RshftOp: ">",
+    bf.OutOp: ".",
+    bf.InOp: ",",
+}
+"""The command characters of the operations which can be packed."""
+
+
+def _pack_block(block: Block) -> None:
+    """Pack the runs of straight-line operations in a block."""
+    run: list[Operation] = []
+    for op in [*block.ops, None]:
+        if op is not None and type(op) in COMMAND_CHARACTERS:
+            run.append(op)
+            continue
+        if run:
+            commands = "".join(COMMAND_CHARACTERS[type(run_op)] for run_op in run)
+            block.insert_op_before(bf.CommandsOp(commands), run[0])
+            for run_op in run:
+                block.erase_op(run_op)
+            run = []
+
+
+class PackCommandsPass(ModulePass):
+    """A pass for packing runs of straight-line instructions into one operation.
+
+    Adjacent `+`, `-`, `<`, `>`, `.` and `,` instructions are replaced by a
+    single `bf.commands` operation, so large programs need far fewer
+    operations. Other operations, such as those of the `bfe` dialect, are left
+    in place.
+    """
+
+    name = "bf-pack-commands"
+
+    def apply(self, ctx: Context, op: ModuleOp) -> None:  # noqa: ARG002
+        """Apply the packing pass."""
+        blocks = [op.body.block]
+        blocks.extend(
+            loop.body.block for loop in op.walk() if isinstance(loop, bf.LoopOp)
+        )
+        for block in blocks:
+            _pack_block(block)
+
+
+class UnpackCommandsPass(ModulePass):
+    """A pass for expanding packed straight-line instructions.
+
+    Each `bf.commands` operation is replaced by a counted `bfe.add` or
+    `bfe.move` per run of repeated commands, and an operation per input or
+    output, so the optimisation passes can rewrite packed programs.
+    """
+
+    name = "bf-unpack-commands"
+
+    def apply(self, ctx: Context, op: ModuleOp) -> None:  # noqa: ARG002
+        """Apply the unpacking pass."""
+        PatternRewriteWalker(CommandsOpLowering()).rewrite_module(op)
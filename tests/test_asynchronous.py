@@ -0,0 +1,96 @@
+"""Unit tests for the asyncio-friendly interpreter."""
+
+import asyncio
+import socket
+
+import pytest
+
+from xdslbf.compiler import parse_brainf
+from xdslbf.interpreters import BfState, BudgetExceeded, EofPolicy
+from xdslbf.interpreters.asynchronous import AsyncBrainFInterpreter
+
+# Prints "AB", running 8 iterations of a loop body
+PROGRAM = "++++++++[>++++++++<-]>+.+."
+
+
+def test_async_output() -> None:
+    """Test the interpreter retains output when there is no stream writer."""
+    interpreter = AsyncBrainFInterpreter()
+    asyncio.run(interpreter.interpret(parse_brainf(PROGRAM)))
+    assert interpreter.output == "AB"
+
+
+def test_async_streams() -> None:
+    """Test the interpreter reads and writes asyncio streams."""
+
+    async def echo() -> bytes:
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"hello")
+        reader.feed_eof()
+        near, far = socket.socketpair()
+        _, writer = await asyncio.open_connection(sock=near)
+        far_reader, far_writer = await asyncio.open_connection(sock=far)
+        interpreter = AsyncBrainFInterpreter(BfState(eof_policy=EofPolicy.ZERO))
+        await interpreter.interpret(parse_brainf(",[.,]"), reader, writer)
+        writer.close()
+        await writer.wait_closed()
+        output = await far_reader.read()
+        far_writer.close()
+        return output
+
+    assert asyncio.run(echo()) == b"hello"
+
+
+def test_async_waits_for_input() -> None:
+    """Test the interpreter waits for input without blocking the event loop."""
+
+    async def wait_for_input() -> str:
+        reader = asyncio.StreamReader()
+        interpreter = AsyncBrainFInterpreter(BfState(eof_policy=EofPolicy.ZERO))
+        task = asyncio.create_task(
+            interpreter.interpret(parse_brainf("+.,[.,]"), reader)
+        )
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert not task.done()
+        assert interpreter.output == "\x01"
+        reader.feed_data(b"ab")
+        reader.feed_eof()
+        await task
+        return interpreter.output
+
+    assert asyncio.run(wait_for_input()) == "\x01ab"
+
+
+def test_async_yields() -> None:
+    """Test long-running programs yield to the event loop between slices."""
+
+    async def run_alongside() -> int:
+        ticks = 0
+        interpreter = AsyncBrainFInterpreter(slice_size=16)
+        task = asyncio.create_task(
+            interpreter.interpret(parse_brainf("++++++++[>++++++++[>+<-]<-]"))
+        )
+        while not task.done():
+            ticks += 1
+            await asyncio.sleep(0)
+        await task
+        assert interpreter.state.memory[2] == 64  # noqa: PLR2004
+        return ticks
+
+    assert asyncio.run(run_alongside()) > 8 * 8 // 16
+
+
+def test_async_fuel() -> None:
+    """Test the interpreter respects the fuel budget across slices."""
+    state = BfState(fuel=100)
+    interpreter = AsyncBrainFInterpreter(state, slice_size=16)
+    with pytest.raises(BudgetExceeded, match="fuel"):
+        asyncio.run(interpreter.interpret(parse_brainf("+[]")))
+    assert state.fuel == 0
+
+    state = BfState(fuel=2 + 10)
+    interpreter = AsyncBrainFInterpreter(state, slice_size=4)
+    asyncio.run(interpreter.interpret(parse_brainf("++[>+++++[>+<-]<-]")))
+    assert state.fuel == 0
+    assert state.memory[2] == 10  # noqa: PLR2004
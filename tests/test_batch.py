@@ -0,0 +1,77 @@
+"""Unit tests for running batches of jobs across worker processes."""
+
+import json
+from collections import OrderedDict
+from io import StringIO
+
+import pytest
+
+from xdslbf import batch
+from xdslbf.batch import Job, read_jobs, run_batch, run_job
+from xdslbf.interpreters.bytecode import BytecodeProgram
+
+HELLO_WORLD = (
+    ">++++++++[<+++++++++>-]<.>++++[<+++++++>-]<+.+++++++..+++.>>++++++"
+    "[<+++++++>-]<++.------------.>++++++[<+++++++++>-]"
+    "<+.<.+++.------.--------.>>>++++[<++++++++>-]<+."
+)
+
+
+def test_run_job() -> None:
+    """Test jobs are run, and compiled programs are cached by the worker."""
+    result = run_job(Job("a", ",[+.,]", b"abc"))
+    assert result.output == b"bcd"
+    assert result.error is None
+
+    result = run_job(Job("b", ",[+.,]", b"xyz"))
+    assert result.output == b"yz{"
+    assert result.cached
+    assert result.compile_seconds == 0
+
+    # A multiply loop over a zero cell at the left edge of the tape
+    result = run_job(Job("c", "[<+>-]+."))
+    assert result.error is None
+    assert result.output == b"\x01"
+
+
+def test_run_job_eviction(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test workers only keep their most recently used programs."""
+    monkeypatch.setattr(batch, "MAX_CACHED_PROGRAMS", 2)
+    monkeypatch.setattr(batch, "_programs", OrderedDict[str, BytecodeProgram]())
+    for index, program in enumerate(("+.", "++.", "+.", "+++.")):
+        assert not run_job(Job(str(index), program)).error
+    # The least recently used program was evicted, and is compiled again
+    assert run_job(Job("a", "+.")).cached
+    assert not run_job(Job("b", "++.")).cached
+
+
+def test_run_job_errors() -> None:
+    """Test errors raised by jobs are captured in their results."""
+    result = run_job(Job("a", "+[]", fuel=100))
+    assert result.error == "BudgetExceeded: Program ran out of fuel"
+    result = run_job(Job("b", ".+["))
+    assert result.error is not None
+    assert result.error.startswith("ParseError")
+
+
+def test_run_batch() -> None:
+    """Test batches of jobs are run across worker processes."""
+    jobs = [Job(str(index), HELLO_WORLD) for index in range(20)]
+    jobs.append(Job("error", "<"))
+    results = {result.id: result for result in run_batch(jobs, max_workers=2)}
+    assert len(results) == len(jobs)
+    assert all(results[str(index)].output == b"Hello, World!" for index in range(20))
+    assert results["error"].error == "PointerOutOfBoundsError: Pointer value -1 < 0"
+
+
+def test_read_jobs() -> None:
+    """Test jobs are read from JSON lines."""
+    stream = StringIO(
+        json.dumps({"id": 1, "program": ",.", "input": "\xe9"})
+        + "\n\n"
+        + json.dumps({"id": "b", "program": "+[]", "fuel": 5})
+    )
+    assert list(read_jobs(stream)) == [
+        Job("1", ",.", b"\xe9"),
+        Job("b", "+[]", fuel=5),
+    ]
@@ -1,8 +1,12 @@
 """Unit tests for the bf dialect."""
 
+import pytest
 from xdsl.builder import ImplicitBuilder
 from xdsl.dialects.builtin import ModuleOp
+from xdsl.parser import Parser
+from xdsl.utils.exceptions import VerifyException
 
+from xdslbf.compiler import get_context
 from xdslbf.dialects import bf
 
 
@@ -36,3 +40,27 @@ builtin.module {
   "bf.out"() : () -> ()
 }"""
     assert str(module) == expected
+
+
+def test_bf_commands() -> None:
+    """Test printing, parsing and verifying packed straight-line commands."""
+    op = bf.CommandsOp("+++>>-.<,")
+    op.verify()
+    assert op.get_runs() == (
+        ("+", 3),
+        (">", 2),
+        ("-", 1),
+        (".", 1),
+        ("<", 1),
+        (",", 1),
+    )
+    text = '"bf.commands"() <{commands = "+++>>-.<,"}> : () -> ()'
+    assert str(op) == text
+    parsed = Parser(get_context(), text).parse_operation()
+    assert isinstance(parsed, bf.CommandsOp)
+    assert parsed.commands == op.commands
+
+    with pytest.raises(VerifyException, match="straight-line"):
+        bf.CommandsOp("+[-]").verify()
+    with pytest.raises(VerifyException, match="at least one"):
+        bf.CommandsOp("").verify()
@@ -0,0 +1,118 @@
+"""Unit tests for limiting the budget of programs run by the interpreters."""
+
+import time
+from io import StringIO
+
+import pytest
+
+from xdslbf.compiler import parse_brainf
+from xdslbf.interpreters import (
+    BfState,
+    BrainFInterpreter,
+    BudgetExceeded,
+    InputNeeded,
+)
+from xdslbf.interpreters.asynchronous import StreamInputSource
+from xdslbf.interpreters.base import BaseBrainFInterpreter
+from xdslbf.interpreters.bytecode import BytecodeBrainFInterpreter
+from xdslbf.interpreters.native import NativeBrainFInterpreter
+from xdslbf.interpreters.transpiled import TranspiledBrainFInterpreter
+
+INTERPRETERS: tuple[type[BaseBrainFInterpreter], ...] = (
+    BrainFInterpreter,
+    NativeBrainFInterpreter,
+    BytecodeBrainFInterpreter,
+    TranspiledBrainFInterpreter,
+)
+
+RESUMABLE_INTERPRETERS: tuple[type[BaseBrainFInterpreter], ...] = (
+    BrainFInterpreter,
+    NativeBrainFInterpreter,
+    BytecodeBrainFInterpreter,
+)
+
+# Prints "AB", running 8 iterations of a loop body
+PROGRAM = "++++++++[>++++++++<-]>+.+."
+
+
+def test_interpreters_fuel() -> None:
+    """Test the interpreters stop non-terminating programs when out of fuel."""
+    for interpreter_type in INTERPRETERS:
+        state = BfState(output_stream=StringIO(), fuel=1000)
+        interpreter = interpreter_type(state)
+        with pytest.raises(BudgetExceeded, match="fuel"):
+            interpreter.interpret(parse_brainf("+>+[]"))
+        assert state.fuel == 0
+        assert state.pointer == 1
+        assert list(state.memory[:3]) == [1, 1, 0]
+
+
+def test_interpreters_exact_fuel() -> None:
+    """Test the interpreters charge one unit of fuel per loop iteration."""
+    for interpreter_type in INTERPRETERS:
+        state = BfState(output_stream=StringIO(), fuel=2 + 10)
+        interpreter_type(state).interpret(parse_brainf("++[>+++++[>+<-]<-]"))
+        assert state.fuel == 0
+        assert state.memory[2] == 10  # noqa: PLR2004
+
+        state = BfState(output_stream=StringIO(), fuel=2 + 10 - 1)
+        with pytest.raises(BudgetExceeded):
+            interpreter_type(state).interpret(parse_brainf("++[>+++++[>+<-]<-]"))
+
+
+def test_interpreters_deadline() -> None:
+    """Test the interpreters stop programs which pass their deadline."""
+    for interpreter_type in INTERPRETERS:
+        state = BfState(deadline=time.monotonic() + 0.01)
+        with pytest.raises(BudgetExceeded, match="deadline"):
+            interpreter_type(state).interpret(parse_brainf("+[]"))
+
+
+def test_interpreters_resume(capsys: pytest.CaptureFixture[str]) -> None:
+    """Test programs can be resumed after extending their budget."""
+    for interpreter_type in RESUMABLE_INTERPRETERS:
+        module = parse_brainf(PROGRAM)
+        state = BfState(output_stream=StringIO(), fuel=3)
+        interpreter = interpreter_type(state)
+        resumes = 0
+        try:
+            interpreter.interpret(module)
+        except BudgetExceeded as exc:
+            resume = exc.resume
+            while resume is not None:
+                resumes += 1
+                state.fuel = 3
+                try:
+                    resume()
+                    resume = None
+                except BudgetExceeded as next_exc:
+                    resume = next_exc.resume
+        assert resumes > 1
+        assert interpreter.output == "AB"
+        # Only `interpret` prints the end of the run, not resuming
+        assert not capsys.readouterr().out
+
+
+def test_interpreters_resume_input() -> None:
+    """Test programs waiting for input resume where they stopped."""
+    # Suspends twice inside the same operation when packed
+    code = "+++,>++,<.>."
+    for interpreter_type in (NativeBrainFInterpreter, BytecodeBrainFInterpreter):
+        for packed in (False, True):
+            state = BfState(output_stream=StringIO())
+            state.source = source = StreamInputSource()
+            interpreter = interpreter_type(state)
+            with pytest.raises(InputNeeded) as exc_info:
+                interpreter.interpret(parse_brainf(code, packed=packed))
+            source.feed(b"a")
+            resume = exc_info.value.resume
+            assert resume is not None
+            with pytest.raises(InputNeeded) as exc_info:
+                resume()
+            source.close()
+            resume = exc_info.value.resume
+            assert resume is not None
+            resume()
+            # The cell read at the end of the input is left unchanged
+            assert interpreter.output == "a\x02"
+            assert state.pointer == 1
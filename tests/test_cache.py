@@ -0,0 +1,111 @@
+"""Unit tests for the on-disk cache of compiled programs."""
+
+import os
+from io import StringIO
+from pathlib import Path
+
+import pytest
+
+from xdslbf.cache import CompileCache, cache_key
+from xdslbf.compiler import compile_brainf, compile_bytecode, get_context
+from xdslbf.interpreters import BfState
+from xdslbf.interpreters.bytecode import BytecodeBrainFInterpreter, BytecodeProgram
+
+HELLO_WORLD = (
+    ">++++++++[<+++++++++>-]<.>++++[<+++++++>-]<+.+++++++..+++.>>++++++"
+    "[<+++++++>-]<++.------------.>++++++[<+++++++++>-]"
+    "<+.<.+++.------.--------.>>>++++[<++++++++>-]<+."
+)
+
+
+def test_cache_key() -> None:
+    """Test cache keys depend on both the source and the pipeline."""
+    key = cache_key("+.", ["parse"])
+    assert key == cache_key("+.", ["parse"])
+    assert key != cache_key("+.", ["parse", "bf-fold-runs"])
+    assert key != cache_key("-.", ["parse"])
+
+
+def test_cache_modules(tmp_path: Path) -> None:
+    """Test modules are cached as MLIR, and parsed back on a cache hit."""
+    cache = CompileCache(tmp_path)
+    expected = str(compile_brainf(HELLO_WORLD, get_context()))
+    assert str(compile_brainf(HELLO_WORLD, get_context(), cache=cache)) == expected
+    assert len(list(tmp_path.iterdir())) == 1
+    assert str(compile_brainf(HELLO_WORLD, get_context(), cache=cache)) == expected
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_cache_bytecode(tmp_path: Path) -> None:
+    """Test bytecode is cached in its serialised form."""
+    cache = CompileCache(tmp_path)
+    bytecode = compile_bytecode(HELLO_WORLD, get_context(), cache=cache)
+    assert BytecodeProgram.from_bytes(bytecode.to_bytes()) == bytecode
+
+    (entry,) = tmp_path.iterdir()
+    assert entry.read_bytes() == bytecode.to_bytes()
+    cached = compile_bytecode(HELLO_WORLD, get_context(), cache=cache)
+    assert cached == bytecode
+
+    interpreter = BytecodeBrainFInterpreter(BfState(output_stream=StringIO()))
+    interpreter.run(cached)
+    assert interpreter.output == "Hello, World!"
+
+
+def test_cache_corrupt_bytecode(tmp_path: Path) -> None:
+    """Test corrupt bytecode entries are compiled again and overwritten."""
+    cache = CompileCache(tmp_path)
+    bytecode = compile_bytecode(HELLO_WORLD, get_context(), cache=cache)
+    (entry,) = tmp_path.iterdir()
+    for data in (b"", b"\1\0", bytecode.to_bytes()[:-1]):
+        with pytest.raises(ValueError, match="Serialised bytecode"):
+            BytecodeProgram.from_bytes(data)
+        entry.write_bytes(data)
+        assert compile_bytecode(HELLO_WORLD, get_context(), cache=cache) == bytecode
+        assert entry.read_bytes() == bytecode.to_bytes()
+
+
+def test_cache_eviction(tmp_path: Path) -> None:
+    """Test the least recently used entries are evicted to bound the size."""
+    cache = CompileCache(tmp_path, max_size=10)
+    a, b, c = (cache_key(source, []) for source in "abc")
+    cache.put(a, "mlir", b"aaaa")
+    cache.put(b, "mlir", b"bbbb")
+    # Make the first entry the least recently used, then access it
+    os.utime(tmp_path / f"{a}.mlir", (0, 0))
+    os.utime(tmp_path / f"{b}.mlir", (1, 1))
+    assert cache.get(a, "mlir") == b"aaaa"
+    cache.put(c, "mlir", b"cccc")
+    assert cache.get(b, "mlir") is None
+    assert cache.get(a, "mlir") == b"aaaa"
+    assert cache.get(c, "mlir") == b"cccc"
+
+    cache.clear()
+    assert not list(tmp_path.iterdir())
+
+
+def test_cache_ignores_other_files(tmp_path: Path) -> None:
+    """Test evicting and clearing the cache leave other files in place."""
+    cache = CompileCache(tmp_path, max_size=4)
+    other_files = [
+        tmp_path / "notes.txt",
+        tmp_path / f"{cache_key('a', [])}.txt",
+        tmp_path / "build.so",
+    ]
+    for path in other_files:
+        path.write_bytes(b"other files")
+    # Directories named like entries are not entries
+    (tmp_path / f"{cache_key('b', [])}.so").mkdir()
+
+    key = cache_key("c", [])
+    cache.put(key, "bytecode", b"cccc")
+    cache.put(cache_key("d", []), "bytecode", b"dddd")
+    assert cache.get(key, "bytecode") is None
+    cache.clear()
+    assert all(path.exists() for path in other_files)
+    assert len(list(tmp_path.iterdir())) == len(other_files) + 1
+
+    with pytest.raises(ValueError, match="key"):
+        cache.put("../a", "mlir", b"")
+    with pytest.raises(ValueError, match="kind"):
+        cache.get(key, "txt")
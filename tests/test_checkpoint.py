@@ -0,0 +1,150 @@
+"""Unit tests for checkpointing and resuming the interpreters."""
+
+from collections.abc import Callable
+from io import BytesIO, StringIO
+from pathlib import Path
+
+import pytest
+from xdsl.dialects.builtin import ModuleOp
+from xdsl.ir import Operation
+
+from xdslbf.compiler import parse_brainf
+from xdslbf.dialects import bf
+from xdslbf.interpreters import (
+    BfState,
+    BrainFInterpreter,
+    BudgetExceeded,
+    InputNeeded,
+)
+from xdslbf.interpreters.asynchronous import StreamInputSource
+from xdslbf.interpreters.bytecode import BytecodeBrainFInterpreter, compile_program
+from xdslbf.interpreters.checkpoint import (
+    get_op_at_path,
+    get_op_path,
+    load_checkpoint,
+    save_checkpoint,
+)
+from xdslbf.interpreters.native import NativeBrainFInterpreter
+from xdslbf.interpreters.tape import PagedTape, make_tape
+
+# Echoes its input with each character incremented, stopping at a zero byte
+PROGRAM = ",[+.,]"
+
+RESUMERS: tuple[Callable[[BfState, ModuleOp, Operation, int], None], ...] = (
+    lambda state, _, position, offset: NativeBrainFInterpreter(state).run_from(
+        position, offset
+    ),
+    lambda state, module, position, offset: BrainFInterpreter(state).run_from(
+        module, position, offset
+    ),
+)
+
+
+def test_op_paths() -> None:
+    """Test operations can be found again from their paths."""
+    module = parse_brainf("+[>[-]<-].")
+    for op in module.walk():
+        assert get_op_at_path(module, get_op_path(op)) is op
+    with pytest.raises(ValueError, match="No operation"):
+        get_op_at_path(module, (1, 5))
+
+
+def test_checkpoint_resume(tmp_path: Path) -> None:
+    """Test programs resume from a checkpoint in a new state and interpreter."""
+    for interpreter_type in (NativeBrainFInterpreter, BrainFInterpreter):
+        for resume in RESUMERS:
+            module = parse_brainf(PROGRAM)
+            state = BfState(
+                input_stream=BytesIO(b"abcdef\0"), output_stream=StringIO(), fuel=3
+            )
+            with pytest.raises(BudgetExceeded) as exc_info:
+                interpreter_type(state).interpret(module)
+            assert exc_info.value.position is not None
+            save_checkpoint(
+                tmp_path / "program.ckpt", state, module, exc_info.value.position
+            )
+
+            # Resume on a fresh parse of the same program, from the same input
+            module = parse_brainf(PROGRAM)
+            restored = BfState(
+                input_stream=BytesIO(b"abcdef\0"), output_stream=StringIO()
+            )
+            position, offset = load_checkpoint(
+                tmp_path / "program.ckpt", restored, module
+            )
+            assert isinstance(position, Operation)
+            assert not offset
+            assert restored.fuel == 0
+            assert restored.sink.tell() == len(state.sink.data)
+            restored.fuel = None
+            resume(restored, module, position, offset)
+            assert state.sink.text + restored.sink.text == "bcdefg"
+
+
+def test_checkpoint_packed_input(tmp_path: Path) -> None:
+    """Test programs waiting for input inside packed commands resume once."""
+    # Reads a byte into each of two cells, then prints both
+    code = "+++,>++,<.>."
+    for resume in RESUMERS:
+        module = parse_brainf(code, packed=True)
+        state = BfState(output_stream=StringIO())
+        state.source = source = StreamInputSource()
+        source.feed(b"a")
+        with pytest.raises(InputNeeded) as exc_info:
+            NativeBrainFInterpreter(state).interpret(module)
+        assert exc_info.value.offset
+        save_checkpoint(
+            tmp_path / "program.ckpt",
+            state,
+            module,
+            exc_info.value.position,
+            exc_info.value.offset,
+        )
+
+        restored = BfState(input_stream=BytesIO(b"ab"), output_stream=StringIO())
+        position, offset = load_checkpoint(tmp_path / "program.ckpt", restored, module)
+        assert isinstance(position, bf.CommandsOp)
+        assert restored.pointer == 1
+        resume(restored, module, position, offset)
+        assert restored.sink.text == "ab"
+
+
+def test_checkpoint_bytecode(tmp_path: Path) -> None:
+    """Test programs run by the bytecode interpreter resume from a checkpoint."""
+    program = compile_program(parse_brainf(PROGRAM))
+    state = BfState(input_stream=BytesIO(b"abc\0"), output_stream=StringIO(), fuel=1)
+    with pytest.raises(BudgetExceeded) as exc_info:
+        BytecodeBrainFInterpreter(state).run(program)
+    save_checkpoint(tmp_path / "program.ckpt", state, program, exc_info.value.position)
+
+    restored = BfState(input_stream=BytesIO(b"abc\0"), output_stream=StringIO())
+    position, _ = load_checkpoint(tmp_path / "program.ckpt", restored, program)
+    assert isinstance(position, int)
+    restored.fuel = None
+    BytecodeBrainFInterpreter(restored).run(program, position)
+    assert state.sink.text + restored.sink.text == "bcd"
+
+    with pytest.raises(ValueError, match="different program"):
+        load_checkpoint(tmp_path / "program.ckpt", BfState(), parse_brainf(PROGRAM))
+
+
+def test_checkpoint_tapes(tmp_path: Path) -> None:
+    """Test wide and paged tapes are saved and restored."""
+    module = parse_brainf("+")
+    op = module.body.block.first_op
+    assert op is not None
+    for memory in (make_tape(100, 32), PagedTape(1 << 20, 16, page_bits=4)):
+        state = BfState(memory=memory, fuel=7)
+        state.memory[3] = 0x12345678 & state.cell_mask
+        state.memory[70_000 if isinstance(memory, PagedTape) else 99] = 1
+        state.pointer = 5
+        save_checkpoint(tmp_path / "tape.ckpt", state, module, op)
+
+        restored = BfState()
+        assert load_checkpoint(tmp_path / "tape.ckpt", restored, module) == (op, 0)
+        assert type(restored.memory) is type(memory)
+        assert len(restored.memory) == len(memory)
+        assert restored.memory[3] == memory[3]
+        assert restored.memory[70_000 if isinstance(memory, PagedTape) else 99] == 1
+        assert restored.pointer == 5  # noqa: PLR2004
+        assert restored.fuel == 7  # noqa: PLR2004
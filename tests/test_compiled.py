@@ -0,0 +1,128 @@
+"""Unit tests for the interpreter compiling programs to C."""
+
+import shutil
+from io import BytesIO, StringIO
+from pathlib import Path
+
+import pytest
+
+from xdslbf.cache import CompileCache
+from xdslbf.compiler import get_context, optimise_brainf, parse_brainf
+from xdslbf.interpreters import (
+    BfState,
+    BudgetExceeded,
+    EofPolicy,
+    PointerOutOfBoundsError,
+)
+from xdslbf.interpreters.bytecode import BytecodeBrainFInterpreter
+from xdslbf.interpreters.compiled import (
+    BUFFER_SIZE,
+    CompiledBrainFInterpreter,
+    compile_program,
+    generate_c,
+)
+from xdslbf.interpreters.tape import make_tape
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("cc") is None, reason="No C compiler available"
+)
+
+HELLO_WORLD = (
+    ">++++++++[<+++++++++>-]<.>++++[<+++++++>-]<+.+++++++..+++.>>++++++"
+    "[<+++++++>-]<++.------------.>++++++[<+++++++++>-]"
+    "<+.<.+++.------.--------.>>>++++[<++++++++>-]<+."
+)
+
+
+def test_compiled_hello_world(tmp_path: Path) -> None:
+    """Test compiled programs run the base, extended and packed dialects."""
+    cache = CompileCache(tmp_path)
+    for module in (
+        parse_brainf(HELLO_WORLD),
+        optimise_brainf(parse_brainf(HELLO_WORLD), get_context()),
+        parse_brainf(HELLO_WORLD, packed=True),
+    ):
+        interpreter = CompiledBrainFInterpreter(
+            BfState(output_stream=StringIO()), cache
+        )
+        interpreter.interpret(module)
+        assert interpreter.output == "Hello, World!"
+
+
+def test_compiled_input_output() -> None:
+    """Test compiled programs read input and write output through buffers."""
+    for eof_policy, expected in (
+        (EofPolicy.UNCHANGED, "aa"),
+        (EofPolicy.ZERO, "a\x00"),
+        (EofPolicy.MINUS_ONE, "a\xff"),
+    ):
+        state = BfState(
+            input_stream=BytesIO(b"a"), output_stream=StringIO(), eof_policy=eof_policy
+        )
+        CompiledBrainFInterpreter(state).interpret(parse_brainf(",.,."))
+        assert state.sink.text == expected
+
+    # Output more than fills the output buffer, so it is flushed part way
+    target = BytesIO()
+    state = BfState(output_stream=target)
+    nested = "++++++++[>" * 6 + "." + "<-]" * 6
+    CompiledBrainFInterpreter(state).interpret(parse_brainf(nested))
+    assert len(target.getvalue()) == 8**6 > BUFFER_SIZE
+
+
+def test_compiled_tape_bounds() -> None:
+    """Test compiled programs stop when the data pointer leaves the tape."""
+    state = BfState(output_stream=StringIO(), memory=make_tape(4))
+    with pytest.raises(PointerOutOfBoundsError, match=">= 4"):
+        CompiledBrainFInterpreter(state).interpret(parse_brainf("+[>+]"))
+    assert state.pointer == 4  # noqa: PLR2004
+    state = BfState()
+    with pytest.raises(PointerOutOfBoundsError, match="< 0"):
+        CompiledBrainFInterpreter(state).interpret(parse_brainf("+<"))
+    assert state.pointer == -1
+
+    # The data pointer is left as the other interpreters leave it, when a cell
+    # offset from it, or found by a scan, is outside the tape
+    for code, size, pointer in (
+        ("+>+[-<<+>>]", 4, 1),
+        ("+[->>>>+<<<<]", 4, 0),
+        ("+>+>+[>]", 3, 3),
+    ):
+        pointers: list[int] = []
+        for interpreter_type in (CompiledBrainFInterpreter, BytecodeBrainFInterpreter):
+            state = BfState(output_stream=StringIO(), memory=make_tape(size))
+            module = optimise_brainf(parse_brainf(code), get_context())
+            with pytest.raises(PointerOutOfBoundsError):
+                interpreter_type(state).interpret(module)
+            pointers.append(state.pointer)
+        assert pointers == [pointer, pointer]
+    with pytest.raises(ValueError, match="8-bit"):
+        CompiledBrainFInterpreter(BfState(memory=make_tape(4, 16))).interpret(
+            parse_brainf("+")
+        )
+
+
+def test_compiled_budget() -> None:
+    """Test compiled programs charge loop iterations to the budget."""
+    state = BfState(output_stream=StringIO(), fuel=1000)
+    with pytest.raises(BudgetExceeded, match="fuel"):
+        CompiledBrainFInterpreter(state).interpret(parse_brainf("+>+[]"))
+    assert state.fuel == 0
+    assert state.pointer == 1
+
+    state = BfState(output_stream=StringIO(), fuel=2 + 10)
+    CompiledBrainFInterpreter(state).interpret(parse_brainf("++[>+++++[>+<-]<-]"))
+    assert state.fuel == 0
+    assert state.memory[2] == 10  # noqa: PLR2004
+
+
+def test_compiled_cache(tmp_path: Path) -> None:
+    """Test built libraries are cached by the hash of their source."""
+    cache = CompileCache(tmp_path)
+    module = parse_brainf("+[-]" + "[" * 300 + "]" * 300)
+    assert "goto" in generate_c(module)
+    compile_program(module, cache=cache)
+    entries = list(tmp_path.iterdir())
+    assert len(entries) == 1
+    compile_program(parse_brainf("+[-]" + "[" * 300 + "]" * 300), cache=cache)
+    assert list(tmp_path.iterdir()) == entries
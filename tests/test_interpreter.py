@@ -1,13 +1,30 @@
 """Unit tests for the interpreter."""
 
-from io import StringIO
+from io import BytesIO, StringIO, TextIOWrapper
 from typing import Any
 
-from xdslbf.compiler import parse_brainf
-from xdslbf.interpreters import BfState, BrainFInterpreter
+import pytest
+
+from xdslbf.compiler import get_context, optimise_brainf, parse_brainf
+from xdslbf.interpreters import BfState, BrainFInterpreter, PointerOutOfBoundsError
+from xdslbf.interpreters.base import BaseBrainFInterpreter
+from xdslbf.interpreters.bytecode import BytecodeBrainFInterpreter, compile_program
 from xdslbf.interpreters.native import (
     NativeBrainFInterpreter as PythonBrainFInterpreter,
 )
+from xdslbf.interpreters.tape import PagedTape, get_cell_width, make_tape
+from xdslbf.interpreters.transpiled import (
+    MAX_NESTING,
+    TranspiledBrainFInterpreter,
+    generate_source,
+)
+
+INTERPRETERS: tuple[type[BaseBrainFInterpreter], ...] = (
+    BrainFInterpreter,
+    PythonBrainFInterpreter,
+    BytecodeBrainFInterpreter,
+    TranspiledBrainFInterpreter,
+)
 
 
 def test_interpreter_simple_loop() -> None:
@@ -36,8 +53,184 @@ def test_native_interpeter_simple_loop() -> None:
 
 def test_interpreter_stdio(capsys: Any, monkeypatch: Any) -> None:
     """Test the interpreter can handle character input and output."""
-    monkeypatch.setattr("builtins.input", lambda _: "a")  # pyright: ignore[reportUnknownLambdaType]
+    monkeypatch.setattr("sys.stdin", TextIOWrapper(BytesIO(b"a")))
     code = ",."
     BrainFInterpreter().interpret(parse_brainf(code))
     captured = capsys.readouterr()
     assert captured.out.strip() == "a"
+
+
+HELLO_WORLD = (
+    ">++++++++[<+++++++++>-]<.>++++[<+++++++>-]<+.+++++++..+++.>>++++++"
+    "[<+++++++>-]<++.------------.>++++++[<+++++++++>-]"
+    "<+.<.+++.------.--------.>>>++++[<++++++++>-]<+."
+)
+
+
+def test_interpreters_optimised() -> None:
+    """Test both interpreters run programs using the extended dialect."""
+    for interpreter_type in INTERPRETERS:
+        module = optimise_brainf(parse_brainf(HELLO_WORLD), get_context())
+        interpreter = interpreter_type(BfState(output_stream=StringIO("")))
+        interpreter.interpret(module)
+        assert interpreter.output == "Hello, World!"
+
+
+def test_interpreters_packed() -> None:
+    """Test the interpreters run packed straight-line commands."""
+    for interpreter_type in INTERPRETERS:
+        interpreter = interpreter_type(BfState(output_stream=StringIO("")))
+        interpreter.interpret(parse_brainf(HELLO_WORLD, packed=True))
+        assert interpreter.output == "Hello, World!"
+
+    for interpreter_type in INTERPRETERS:
+        interpreter = interpreter_type(BfState())
+        with pytest.raises(PointerOutOfBoundsError):
+            interpreter.interpret(parse_brainf("+>><<<", packed=True))
+
+
+def test_interpreters_flush_on_error() -> None:
+    """Test output written before an error reaches the output stream."""
+    for interpreter_type in INTERPRETERS:
+        target = StringIO()
+        interpreter = interpreter_type(BfState(output_stream=target))
+        with pytest.raises(PointerOutOfBoundsError):
+            interpreter.interpret(parse_brainf("++++++++[>++++++++<-]>+.<<"))
+        assert target.getvalue() == "A"
+
+
+def test_interpreters_multiply_loop() -> None:
+    """Test both interpreters run multiply-add operations."""
+    code = "++++++[->+++<]>[->++>+<<]"
+    for interpreter_type in INTERPRETERS:
+        module = optimise_brainf(parse_brainf(code), get_context())
+        interpreter = interpreter_type(BfState())
+        interpreter.interpret(module)
+        assert interpreter.state.pointer == 1
+        assert list(interpreter.state.memory[:4]) == [0, 0, 36, 18]
+
+    # A multiply loop over a zero cell does not touch the cells it would add to
+    for interpreter_type in INTERPRETERS:
+        module = optimise_brainf(parse_brainf("[<+>-]+.>[>>>+<<<-]"), get_context())
+        state = BfState(memory=make_tape(2), output_stream=StringIO(), growable=True)
+        interpreter_type(state).interpret(module)
+        assert state.sink.text == "\x01"
+        assert len(state.memory) == 2  # noqa: PLR2004
+
+
+def test_interpreters_scan_loop() -> None:
+    """Test both interpreters run scan operations."""
+    code = "+>>+>+>>>+>+[<<]>+"
+    for interpreter_type in INTERPRETERS:
+        module = optimise_brainf(parse_brainf(code), get_context())
+        interpreter = interpreter_type(BfState())
+        interpreter.interpret(module)
+        assert interpreter.state.pointer == 6  # noqa: PLR2004
+        assert list(interpreter.state.memory[:8]) == [1, 0, 1, 1, 0, 0, 2, 1]
+
+
+def test_bytecode_compile() -> None:
+    """Test programs are compiled to bytecode with matching jump targets."""
+    program = compile_program(parse_brainf("+-+[>+<-[>]]."))
+    assert program.opcodes.tolist() == [0, 2, 1, 0, 1, 0, 2, 1, 3, 3, 9]
+    assert program.args.tolist() == [1, 10, 1, 1, -1, -1, 9, 1, 7, 2, 0]
+
+
+def test_bytecode_interpreter_simple_loop() -> None:
+    """Test the bytecode interpreter runs a simple loop."""
+    code = ",+.>+[-]<"
+    state = BfState(
+        input_stream=StringIO("a"),
+        output_stream=StringIO(""),
+    )
+    interpreter = BytecodeBrainFInterpreter(state)
+    interpreter.interpret(parse_brainf(code))
+    assert interpreter.output == "b"
+
+
+def test_transpiled_outlines_deep_loops() -> None:
+    """Test the transpiler outlines loops nested beyond the static limit."""
+    depth = 3 * MAX_NESTING
+    code = "+" + "[" * depth + "-" + "]" * depth + "++."
+    program = parse_brainf(code)
+    assert "def _loop_2(" in generate_source(program)
+
+    state = BfState(output_stream=StringIO(""))
+    interpreter = TranspiledBrainFInterpreter(state)
+    interpreter.interpret(program)
+    assert interpreter.output == "\x02"
+
+
+def test_interpreters_wrap_cells() -> None:
+    """Test the interpreters wrap cell values around to the cell width."""
+    code = "-.>" + "+" * 300 + ">+++[-<<+>>]<<[->>" + "+" * 200 + "<<]"
+    for cell_width, expected in ((8, [0, 44, 144]), (16, [0, 300, 400])):
+        for optimise in (False, True):
+            for interpreter_type in INTERPRETERS:
+                program = parse_brainf(code)
+                if optimise:
+                    optimise_brainf(program, get_context())
+                state = BfState(
+                    memory=make_tape(cell_width=cell_width),
+                    output_stream=StringIO(""),
+                )
+                interpreter = interpreter_type(state)
+                interpreter.interpret(program)
+                # Characters are output as bytes, like C's `putchar`
+                assert interpreter.output == "\xff"
+                assert list(interpreter.state.memory[:3]) == expected
+
+
+def test_make_tape() -> None:
+    """Test tapes are made with the requested cell width."""
+    assert isinstance(make_tape(), bytearray)
+    for cell_width in (8, 16, 32):
+        tape = make_tape(10, cell_width)
+        assert len(tape) == 10  # noqa: PLR2004
+        assert get_cell_width(tape) == cell_width
+    with pytest.raises(ValueError, match="Unsupported cell width"):
+        make_tape(cell_width=64)
+
+
+def test_interpreters_tape_bounds() -> None:
+    """Test the interpreters stop the pointer leaving a fixed-size tape."""
+    for code in ("+[>+]", "<", ">>>>", "+[->>>>+<<<<]", "+>+>+>+[<]", "+>+>+>+<<<[>]"):
+        for optimise in (False, True):
+            for interpreter_type in INTERPRETERS:
+                program = parse_brainf(code)
+                if optimise:
+                    optimise_brainf(program, get_context())
+                state = BfState(memory=make_tape(4), output_stream=StringIO(""))
+                with pytest.raises(PointerOutOfBoundsError):
+                    interpreter_type(state).interpret(program)
+
+
+def test_interpreters_growable_tape() -> None:
+    """Test the interpreters grow a growable tape to fit the program."""
+    code = "+++[->>>>>+<<<<<]>>>>>[>+>+<<-]>>[>]"
+    for optimise in (False, True):
+        for interpreter_type in INTERPRETERS:
+            program = parse_brainf(code)
+            if optimise:
+                optimise_brainf(program, get_context())
+            state = BfState(
+                memory=make_tape(4), output_stream=StringIO(""), growable=True
+            )
+            interpreter = interpreter_type(state)
+            interpreter.interpret(program)
+            assert list(interpreter.state.memory[:9]) == [0, 0, 0, 0, 0, 0, 3, 3, 0]
+            assert interpreter.state.pointer == 8  # noqa: PLR2004
+
+
+def test_interpreters_paged_tape() -> None:
+    """Test the interpreters only allocate the pages of a paged tape in use."""
+    code = "++++++[->++++++++<]>+.[>+<-]>[<<+>>-]<<."
+    start = 10_000_000
+    for interpreter_type in INTERPRETERS:
+        tape = PagedTape()
+        state = BfState(pointer=start, memory=tape, output_stream=StringIO(""))
+        interpreter = interpreter_type(state)
+        interpreter.interpret(parse_brainf(code))
+        assert interpreter.output == "11"
+        assert tape[start] == ord("1")
+        assert list(tape.pages) == [start >> tape.page_bits]
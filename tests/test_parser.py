@@ -1,9 +1,13 @@
 """Unit tests for the parser."""
 
+from pathlib import Path
+
 import pytest
 from xdsl.utils.exceptions import ParseError
 
-from xdslbf.compiler import parse_brainf
+from xdslbf.compiler import parse_brainf, parse_brainf_file
+from xdslbf.frontend import MismatchedBracketError
+from xdslbf.frontend.lexer import MAX_COMMAND_RUN
 
 
 def test_simple_parse() -> None:
@@ -73,12 +77,23 @@ builtin.module {
     assert str(parsed) == expected
 
 
-def test_undefined_instructions_parse() -> None:
-    """Test the parser rejects invalid characters."""
-    code = "abc"
+def test_comments_parse() -> None:
+    """Test the parser skips comments, which are any non-command characters."""
+    code = "read a character: ,\n[loop >++<- ]\twrite it: ."
+    assert str(parse_brainf(code)) == str(parse_brainf(",[>++<-]."))
+    assert str(parse_brainf("abc")) == str(parse_brainf(""))
+
+
+def test_mismatched_loop_span_parse() -> None:
+    """Test the parser reports the position of mis-matched loops."""
     with pytest.raises(ParseError) as exc:
-        parse_brainf(code)
-    assert exc.value.msg == "Unexpected character: a"
+        parse_brainf("a [ b ] c ]")
+    assert exc.value.span.start == 10  # noqa: PLR2004
+
+    with pytest.raises(ParseError) as exc:
+        parse_brainf("a [ b [ c ]")
+    assert exc.value.msg == "Mis-matched '['!"
+    assert exc.value.span.start == 2  # noqa: PLR2004
 
 
 def test_mismatched_loop_start_parse() -> None:
@@ -95,3 +110,61 @@ def test_mismatched_loop_end_parse() -> None:
     with pytest.raises(ParseError) as exc:
         parse_brainf(code)
     assert exc.value.msg == "Mis-matched ']'!"
+
+
+def test_single_mismatched_loop_end_parse() -> None:
+    """Test the parser rejects a single mis-matched loop end."""
+    with pytest.raises(ParseError) as exc:
+        parse_brainf("+]")
+    assert exc.value.msg == "Mis-matched ']'!"
+
+
+def test_file_parse(tmp_path: Path) -> None:
+    """Test parsing a file matches parsing its contents."""
+    code = "read: ,[>++<- ]\n" + "+" * (MAX_COMMAND_RUN + 1) + "[-]."
+    path = tmp_path / "program.b"
+    path.write_text(code)
+    # Runs split at the maximum length are packed back into one operation
+    assert str(parse_brainf_file(path, packed=True)) == str(
+        parse_brainf(code, packed=True)
+    )
+
+    path.write_text("")
+    assert str(parse_brainf_file(path)) == str(parse_brainf(""))
+
+
+def test_file_mismatched_loop_parse(tmp_path: Path) -> None:
+    """Test parsing a file reports the byte offset of mis-matched loops."""
+    path = tmp_path / "program.b"
+    path.write_bytes("\u00e9 [ b ] c ]".encode())
+    with pytest.raises(MismatchedBracketError) as exc:
+        parse_brainf_file(path)
+    assert exc.value.bracket == "]"
+    assert exc.value.position == 11  # noqa: PLR2004
+
+    path.write_text("a [ b [ c ]")
+    with pytest.raises(MismatchedBracketError) as exc:
+        parse_brainf_file(path)
+    assert exc.value.bracket == "["
+    assert exc.value.position == 2  # noqa: PLR2004
+
+
+def test_packed_parse() -> None:
+    """Test the parser can pack straight-line commands into one operation."""
+    expected = """\
+builtin.module {
+  "bf.commands"() <{commands = ",>+"}> : () -> ()
+  "bf.loop"() ({
+    "bf.commands"() <{commands = "-<"}> : () -> ()
+    "bf.loop"() ({
+      "bf.ret"() : () -> ()
+    }) : () -> ()
+    "bf.ret"() : () -> ()
+  }) : () -> ()
+  "bf.commands"() <{commands = "."}> : () -> ()
+}"""
+    assert str(parse_brainf(", > + [ -< [] ] .", packed=True)) == expected
+
+    with pytest.raises(ParseError) as exc:
+        parse_brainf("a [ b ] c ]", packed=True)
+    assert exc.value.span.start == 10  # noqa: PLR2004
@@ -0,0 +1,62 @@
+"""Unit tests for profiling programs run by the interpreters."""
+
+import json
+from io import StringIO
+from pathlib import Path
+
+from xdslbf.frontend import BrainFParser
+from xdslbf.interpreters import BfState, BrainFInterpreter, LoopProfile, Profile
+from xdslbf.interpreters.native import NativeBrainFInterpreter
+
+PROGRAM = "++\n[>+++\n[>+<-]<-]\n>>."
+
+
+def _profile_native() -> Profile:
+    """Profile the program with the native interpreter."""
+    parser = BrainFParser(Path("in_memory"), PROGRAM)
+    module = parser.parse()
+    profile = Profile(parser.loop_spans)
+    NativeBrainFInterpreter(BfState(output_stream=StringIO()), profile).interpret(
+        module
+    )
+    return profile
+
+
+def _profile_xdsl() -> Profile:
+    """Profile the program with the xDSL interpreter."""
+    parser = BrainFParser(Path("in_memory"), PROGRAM)
+    module = parser.parse()
+    profile = Profile(parser.loop_spans)
+    BrainFInterpreter(BfState(output_stream=StringIO()), profile).interpret(module)
+    return profile
+
+
+def test_profile_loops() -> None:
+    """Test the interpreters count the entries and iterations of loops."""
+    for profile in (_profile_native(), _profile_xdsl()):
+        assert [loop_profile for _, loop_profile in profile.hot_loops()] == [
+            LoopProfile(entries=2, iterations=6, max_trip_count=3),
+            LoopProfile(entries=1, iterations=2, max_trip_count=2),
+        ]
+        assert profile.op_counts["bf.inc"] == 2 + 2 * 3 + 6
+        assert profile.op_counts["bf.loop"] == 3  # noqa: PLR2004
+        assert profile.op_counts["bf.out"] == 1
+
+
+def test_profile_export() -> None:
+    """Test profiles can be exported as JSON and annotated source."""
+    profile = _profile_native()
+    exported = json.loads(profile.dumps())
+    assert exported["loops"][0] == {
+        "span": [9, 14],
+        "entries": 2,
+        "iterations": 6,
+        "max_trip_count": 3,
+    }
+    assert exported["op_counts"]["bf.dec"] == 8  # noqa: PLR2004
+    assert profile.annotate(PROGRAM).split("\n") == [
+        "  | ++",
+        "2 | [>+++",
+        "6 | [>+<-]<-]",
+        "  | >>.",
+    ]
@@ -0,0 +1,117 @@
+"""Unit tests for the interpreters' input and output streams."""
+
+from io import BytesIO, StringIO
+from pathlib import Path
+
+from xdslbf.compiler import parse_brainf
+from xdslbf.interpreters import BfState, BrainFInterpreter
+from xdslbf.interpreters.base import BaseBrainFInterpreter
+from xdslbf.interpreters.bytecode import BytecodeBrainFInterpreter
+from xdslbf.interpreters.native import NativeBrainFInterpreter
+from xdslbf.interpreters.streams import (
+    EofPolicy,
+    FlushPolicy,
+    InputSource,
+    OutputSink,
+)
+from xdslbf.interpreters.transpiled import TranspiledBrainFInterpreter
+
+INTERPRETERS: tuple[type[BaseBrainFInterpreter], ...] = (
+    BrainFInterpreter,
+    NativeBrainFInterpreter,
+    BytecodeBrainFInterpreter,
+    TranspiledBrainFInterpreter,
+)
+
+
+def test_output_sink_flush_policies() -> None:
+    """Test output sinks flush to their target according to their policy."""
+    target = StringIO()
+    sink = OutputSink(target, FlushPolicy.NEWLINE)
+    sink.write(b"ab")
+    assert target.getvalue() == ""
+    sink.write_byte(ord("\n"))
+    assert target.getvalue() == "ab\n"
+
+    target = StringIO()
+    sink = OutputSink(target, FlushPolicy.SIZE, chunk_size=4)
+    sink.write(b"abc\n")
+    assert target.getvalue() == "abc\n"
+
+    target = StringIO()
+    sink = OutputSink(target, FlushPolicy.END, chunk_size=1)
+    sink.write(b"abc\n")
+    assert target.getvalue() == ""
+    sink.flush()
+    assert target.getvalue() == "abc\n"
+    assert sink.text == "abc\n"
+
+
+def test_output_sink_not_retained() -> None:
+    """Test output sinks can drop output once it is flushed."""
+    target = StringIO()
+    sink = OutputSink(target, chunk_size=2, retain=False)
+    sink.write(b"abcde")
+    assert target.getvalue() == "abcde"
+    assert sink.getvalue() == b""
+    assert sink.tell() == 5  # noqa: PLR2004
+
+
+def test_output_retained_for_in_memory_streams(tmp_path: Path) -> None:
+    """Test states only retain flushed output for in-memory streams by default."""
+    assert BfState(output_stream=StringIO()).sink.retain
+    assert BfState(output_stream=BytesIO()).sink.retain
+    assert not BfState().sink.retain
+    assert not BfState(output_stream=StringIO(), retain_output=False).sink.retain
+
+    with (tmp_path / "output").open("wb") as target:
+        state = BfState(output_stream=target)
+        NativeBrainFInterpreter(state).interpret(parse_brainf("+++.."))
+        assert state.sink.getvalue() == b""
+        assert state.sink.tell() == 2  # noqa: PLR2004
+    assert (tmp_path / "output").read_bytes() == b"\3\3"
+
+
+def test_binary_output_stream() -> None:
+    """Test the interpreters can output bytes to a binary stream."""
+    target = BytesIO()
+    state = BfState(output_stream=target)
+    interpreter = BytecodeBrainFInterpreter(state)
+    interpreter.interpret(parse_brainf("-.+++.-."))
+    assert target.getvalue() == b"\xff\x02\x01"
+    assert interpreter.output == "\xff\x02\x01"
+
+
+def test_input_source_chunks() -> None:
+    """Test input sources read their source in chunks."""
+    source = BytesIO(b"abcde")
+    reader = InputSource(source, chunk_size=2)
+    assert reader.read_byte() == ord("a")
+    assert source.tell() == 2  # noqa: PLR2004
+    assert [reader.read_byte() for _ in range(5)] == [*b"bcde", None]
+
+    reader = InputSource(BytesIO(b"abcde"), chunk_size=2)
+    reader.skip(3)
+    assert reader.tell() == 3  # noqa: PLR2004
+    assert reader.read_byte() == ord("d")
+
+    reader = InputSource(StringIO("\xe9"))
+    assert reader.read_byte() == 0xE9  # noqa: PLR2004
+
+
+def test_interpreters_eof_policies() -> None:
+    """Test the interpreters apply the EOF policy to input at the end."""
+    for eof_policy, expected in (
+        (EofPolicy.UNCHANGED, "aa"),
+        (EofPolicy.ZERO, "a\x00"),
+        (EofPolicy.MINUS_ONE, "a\xff"),
+    ):
+        for interpreter_type in INTERPRETERS:
+            state = BfState(
+                input_stream=BytesIO(b"a"),
+                output_stream=StringIO(),
+                eof_policy=eof_policy,
+            )
+            interpreter = interpreter_type(state)
+            interpreter.interpret(parse_brainf(",.,."))
+            assert interpreter.output == expected
@@ -0,0 +1,512 @@
+"""Unit tests for the transformation passes."""
+
+import ctypes
+import itertools
+import os
+import shutil
+import subprocess
+from math import prod
+from pathlib import Path
+from typing import Any
+
+import pytest
+from xdsl.dialects import arith, func, linalg, memref, scf
+from xdsl.dialects.builtin import IntegerType, MemRefType, ModuleOp, i8, i16
+from xdsl.interpreter import (
+    Interpreter,
+    InterpreterFunctions,
+    PythonValues,
+    ReturnedValues,
+    TerminatorValue,
+    impl,
+    impl_external,
+    impl_terminator,
+    register_impls,
+)
+from xdsl.interpreters.arith import ArithFunctions
+from xdsl.interpreters.builtin import xtype_for_el_type
+from xdsl.interpreters.func import FuncFunctions
+from xdsl.interpreters.memref import MemRefFunctions
+from xdsl.interpreters.scf import ScfFunctions
+from xdsl.interpreters.shaped_array import ShapedArray
+from xdsl.interpreters.utils.ptr import TypedPtr, int32
+
+import xdslbf
+from xdslbf.compiler import get_context, optimise_brainf, parse_brainf
+from xdslbf.dialects import bf
+from xdslbf.transforms import (
+    DeferMovesPass,
+    DirectLowerBfToBuiltinPass,
+    FoldRunsPass,
+    LowerBfToBuiltinPass,
+    PackCommandsPass,
+    RecogniseLoopIdiomsPass,
+)
+from xdslbf.transforms.lower_bf_builtin import CELL_WIDTHS
+
+HELLO_WORLD = (
+    ">++++++++[<+++++++++>-]<.>++++[<+++++++>-]<+.+++++++..+++.>>++++++"
+    "[<+++++++>-]<++.------------.>++++++[<+++++++++>-]"
+    "<+.<.+++.------.--------.>>>++++[<++++++++>-]<+."
+)
+
+
+def check_bounds(memory: ShapedArray[Any], indices: list[int]) -> tuple[int, ...]:
+    """Check indices are within the shape of a memref.
+
+    Raises:
+        IndexError: If an index is out of bounds.
+    """
+    for index, size in zip(indices, memory.shape, strict=True):
+        if not 0 <= index < size:
+            raise IndexError(f"Index {index} out of bounds of {size} elements")
+    return tuple(indices)
+
+
+@register_impls
+class LoweredFunctions(InterpreterFunctions):
+    """Implementations of the externals and missing operations of lowered programs."""
+
+    def __init__(self, data: bytes = b"") -> None:
+        """Instantiate the implementations, reading input from bytes."""
+        self.input = list(data)
+        self.output = bytearray()
+        self.writes = 0
+
+    @impl(scf.WhileOp)
+    def run_while(
+        self, interpreter: Interpreter, op: scf.WhileOp, args: PythonValues
+    ) -> PythonValues:
+        """Interpret the while loop, which loops while its condition is true."""
+        while True:
+            condition, *values = interpreter.run_ssacfg_region(op.before_region, args)
+            if not condition:
+                return tuple(values)
+            args = interpreter.run_ssacfg_region(op.after_region, tuple(values))
+
+    @impl_terminator(scf.ConditionOp)
+    def run_condition(
+        self, _interpreter: Interpreter, _op: scf.ConditionOp, args: PythonValues
+    ) -> tuple[TerminatorValue, PythonValues]:
+        """Interpret the condition of a while loop."""
+        return ReturnedValues(args), ()
+
+    @impl(memref.AllocOp)
+    def run_alloc(
+        self, interpreter: Interpreter, op: memref.AllocOp, _args: PythonValues
+    ) -> PythonValues:
+        """Allocate a memref, storing narrow integers as 32-bit integers."""
+        memref_type = op.memref.type
+        assert isinstance(memref_type, MemRefType)
+        xtype = (
+            int32
+            if memref_type.element_type in (i8, i16)
+            else xtype_for_el_type(memref_type.element_type, interpreter.index_bitwidth)
+        )
+        shape = list(memref_type.get_shape())
+        return (ShapedArray(TypedPtr[Any].zeros(prod(shape), xtype=xtype), shape),)
+
+    @impl(memref.LoadOp)
+    def run_load(
+        self, _interpreter: Interpreter, _op: memref.LoadOp, args: PythonValues
+    ) -> PythonValues:
+        """Load an element of a memref, checking it is in bounds."""
+        memory, *indices = args
+        return (memory.load(check_bounds(memory, indices)),)
+
+    @impl(memref.StoreOp)
+    def run_store(
+        self, _interpreter: Interpreter, _op: memref.StoreOp, args: PythonValues
+    ) -> PythonValues:
+        """Store an element of a memref, checking it is in bounds."""
+        value, memory, *indices = args
+        memory.store(check_bounds(memory, indices), value)
+        return ()
+
+    @impl(linalg.FillOp)
+    def run_fill(
+        self, _interpreter: Interpreter, _op: linalg.FillOp, args: PythonValues
+    ) -> PythonValues:
+        """Fill a memref with a value."""
+        value, memory = args
+        for index in range(len(memory.data)):
+            memory.data_ptr[index] = value
+        return ()
+
+    @impl(arith.TruncIOp)
+    def run_trunci(
+        self, _interpreter: Interpreter, op: arith.TruncIOp, args: PythonValues
+    ) -> PythonValues:
+        """Truncate an integer to a narrower width."""
+        result_type = op.result.type
+        assert isinstance(result_type, IntegerType)
+        return (args[0] & ((1 << result_type.width.data) - 1),)
+
+    @impl(arith.ExtUIOp)
+    def run_extui(
+        self, _interpreter: Interpreter, op: arith.ExtUIOp, args: PythonValues
+    ) -> PythonValues:
+        """Zero-extend an integer to a wider width."""
+        source_type = op.input.type
+        assert isinstance(source_type, IntegerType)
+        return (args[0] & ((1 << source_type.width.data) - 1),)
+
+    @impl_external("bf_write")
+    def run_bf_write(
+        self, _interpreter: Interpreter, _op: Any, args: PythonValues
+    ) -> PythonValues:
+        """Output the bytes in a buffer."""
+        buffer, count = args
+        self.output.extend(buffer.data_ptr[index] & 0xFF for index in range(count))
+        self.writes += 1
+        return (count,)
+
+    @impl_external("bf_read")
+    def run_bf_read(
+        self, _interpreter: Interpreter, _op: Any, args: PythonValues
+    ) -> PythonValues:
+        """Input bytes into a buffer, reading none at the end of the input."""
+        buffer, size = args
+        count = min(size, len(self.input))
+        for index in range(count):
+            buffer.data_ptr[index] = self.input.pop(0)
+        return (count,)
+
+    @impl_external("putchar")
+    def run_putchar(
+        self, _interpreter: Interpreter, _op: Any, args: PythonValues
+    ) -> PythonValues:
+        """Output a character."""
+        self.output.append(args[0] & 0xFF)
+        return args
+
+    @impl_external("getchar")
+    def run_getchar(
+        self, _interpreter: Interpreter, _op: Any, _args: PythonValues
+    ) -> PythonValues:
+        """Input a character, or zero at the end of the input."""
+        return (self.input.pop(0) if self.input else 0,)
+
+
+def run_lowered(module: ModuleOp, data: bytes = b"") -> LoweredFunctions:
+    """Run a lowered program with the xDSL interpreter, returning its I/O."""
+    interpreter = Interpreter(module)
+    functions = LoweredFunctions(data)
+    for implementations in (
+        ArithFunctions(),
+        FuncFunctions(),
+        MemRefFunctions(),
+        ScfFunctions(),
+    ):
+        interpreter.register_implementations(implementations)
+    interpreter.register_implementations(functions, override=True)
+    interpreter.call_op("main", ())
+    return functions
+
+
+def test_fold_runs() -> None:
+    """Test runs of instructions are folded into counted operations."""
+    code = "+++-->><<<.[->>+<<]"
+    module = parse_brainf(code)
+    FoldRunsPass().apply(get_context(), module)
+    expected = """\
+builtin.module {
+  "bfe.add"() <{value = 1 : i64}> : () -> ()
+  "bfe.move"() <{distance = -1 : i64}> : () -> ()
+  "bf.out"() : () -> ()
+  "bf.loop"() ({
+    "bfe.add"() <{value = -1 : i64}> : () -> ()
+    "bfe.move"() <{distance = 2 : i64}> : () -> ()
+    "bfe.add"() <{value = 1 : i64}> : () -> ()
+    "bfe.move"() <{distance = -2 : i64}> : () -> ()
+    "bf.ret"() : () -> ()
+  }) : () -> ()
+}"""
+    assert str(module) == expected
+
+
+def test_fold_runs_cancelling() -> None:
+    """Test runs of instructions which cancel out are removed."""
+    code = "+-<>.+><-"
+    module = parse_brainf(code)
+    FoldRunsPass().apply(get_context(), module)
+    expected = """\
+builtin.module {
+  "bf.out"() : () -> ()
+}"""
+    assert str(module) == expected
+
+
+def test_clear_loops() -> None:
+    """Test clear loops are replaced with set operations."""
+    code = "+[-]>[+]+++>[--]"
+    module = parse_brainf(code)
+    ctx = get_context()
+    FoldRunsPass().apply(ctx, module)
+    RecogniseLoopIdiomsPass().apply(ctx, module)
+    expected = """\
+builtin.module {
+  "bfe.add"() <{value = 1 : i64}> : () -> ()
+  "bfe.set"() <{value = 0 : i64}> : () -> ()
+  "bfe.move"() <{distance = 1 : i64}> : () -> ()
+  "bfe.set"() <{value = 3 : i64}> : () -> ()
+  "bfe.move"() <{distance = 1 : i64}> : () -> ()
+  "bf.loop"() ({
+    "bfe.add"() <{value = -2 : i64}> : () -> ()
+    "bf.ret"() : () -> ()
+  }) : () -> ()
+}"""
+    assert str(module) == expected
+
+
+def test_multiply_loops() -> None:
+    """Test multiply loops are replaced with multiply-add operations."""
+    code = "[->+>+++<<]>[>-<-]>[<+>->+<][->]"
+    module = parse_brainf(code)
+    ctx = get_context()
+    FoldRunsPass().apply(ctx, module)
+    RecogniseLoopIdiomsPass().apply(ctx, module)
+    expected = """\
+builtin.module {
+  "bfe.mul_add"() <{offsets = array<i64: 1, 2>, factors = array<i64: 1, 3>}> : () -> ()
+  "bfe.move"() <{distance = 1 : i64}> : () -> ()
+  "bfe.mul_add"() <{offsets = array<i64: 1>, factors = array<i64: -1>}> : () -> ()
+  "bfe.move"() <{distance = 1 : i64}> : () -> ()
+  "bfe.mul_add"() <{offsets = array<i64: -1, 1>, factors = array<i64: 1, 1>}> : () -> ()
+  "bf.loop"() ({
+    "bfe.add"() <{value = -1 : i64}> : () -> ()
+    "bfe.move"() <{distance = 1 : i64}> : () -> ()
+    "bf.ret"() : () -> ()
+  }) : () -> ()
+}"""
+    assert str(module) == expected
+
+
+def test_defer_moves() -> None:
+    """Test pointer movement is deferred past cell operations."""
+    code = ">>+<<-.>+[>+<-]>"
+    module = parse_brainf(code)
+    ctx = get_context()
+    FoldRunsPass().apply(ctx, module)
+    DeferMovesPass().apply(ctx, module)
+    expected = """\
+builtin.module {
+  "bfe.add"() <{value = 1 : i64, offset = 2 : i64}> : () -> ()
+  "bfe.add"() <{value = -1 : i64}> : () -> ()
+  "bf.out"() : () -> ()
+  "bfe.add"() <{value = 1 : i64, offset = 1 : i64}> : () -> ()
+  "bfe.move"() <{distance = 1 : i64}> : () -> ()
+  "bf.loop"() ({
+    "bfe.add"() <{value = 1 : i64, offset = 1 : i64}> : () -> ()
+    "bfe.add"() <{value = -1 : i64}> : () -> ()
+    "bf.ret"() : () -> ()
+  }) : () -> ()
+  "bfe.move"() <{distance = 1 : i64}> : () -> ()
+}"""
+    assert str(module) == expected
+
+
+def test_scan_loops() -> None:
+    """Test scan loops are replaced with scan operations."""
+    code = "[>][<<][><]"
+    module = parse_brainf(code)
+    ctx = get_context()
+    FoldRunsPass().apply(ctx, module)
+    RecogniseLoopIdiomsPass().apply(ctx, module)
+    expected = """\
+builtin.module {
+  "bfe.scan"() <{stride = 1 : i64}> : () -> ()
+  "bfe.scan"() <{stride = -2 : i64}> : () -> ()
+  "bf.loop"() ({
+    "bf.ret"() : () -> ()
+  }) : () -> ()
+}"""
+    assert str(module) == expected
+
+
+def test_lower_cell_width() -> None:
+    """Test the lowering uses the requested width for cells of the tape."""
+    for cell_width in (8, 16, 32):
+        ctx = get_context()
+        module = optimise_brainf(parse_brainf(",+[->+<]>."), ctx)
+        LowerBfToBuiltinPass(cell_width=cell_width).apply(ctx, module)
+        module.verify()
+
+        (memory,) = (op for op in module.walk() if isinstance(op, memref.AllocOp))
+        memory_type = memory.memref.type
+        assert isinstance(memory_type, MemRefType)
+        assert memory_type.element_type == IntegerType(cell_width)
+        # Characters are converted to and from the `i32` of `getchar`/`putchar`
+        conversions = [
+            op for op in module.walk() if isinstance(op, arith.ExtUIOp | arith.TruncIOp)
+        ]
+        assert len(conversions) == (0 if cell_width == 32 else 2)  # noqa: PLR2004
+
+
+def test_pack_commands() -> None:
+    """Test runs of straight-line instructions are packed into one operation."""
+    code = ",>+[-<[]]."
+    module = parse_brainf(code)
+    PackCommandsPass().apply(get_context(), module)
+    assert str(module) == str(parse_brainf(code, packed=True))
+
+
+def test_optimise_packed_commands() -> None:
+    """Test packed programs are optimised as unpacked programs are."""
+    ctx = get_context()
+    module = optimise_brainf(
+        parse_brainf("++[->+++<]>[-]..,", packed=True), ctx, packed=True
+    )
+    assert [op.name for op in module.body.block.ops] == [
+        "bfe.add",
+        "bfe.mul_add",
+        "bfe.set",
+        "bfe.move",
+        "bf.commands",
+    ]
+    (commands,) = (op for op in module.walk() if isinstance(op, bf.CommandsOp))
+    assert commands.commands.data == "..,"
+
+
+def test_lower_packed_commands() -> None:
+    """Test packed commands are expanded when lowering."""
+    ctx = get_context()
+    module = parse_brainf(",+++>>-[-<+>].", packed=True)
+    LowerBfToBuiltinPass().apply(ctx, module)
+    module.verify()
+    assert not any(isinstance(op, bf.BrainFOperation) for op in module.walk())
+
+
+def test_lower_runs() -> None:
+    """Test lowered programs thread the data pointer through loops correctly."""
+    # The xDSL interpreter does not support memrefs of 8-bit integers
+    for code, data, expected in (
+        (HELLO_WORLD, b"", b"Hello, World!"),
+        (",[+.,]>>+[<]<.", b"abc", b"bcd\0"),
+        (">+>+>+[<]>.", b"", b"\1"),
+        # A multiply loop over a zero cell at the left edge of the tape
+        ("[<+>-]+.", b"", b"\1"),
+    ):
+        for optimise in (False, True):
+            ctx = get_context()
+            module = parse_brainf(code)
+            if optimise:
+                module = optimise_brainf(module, ctx)
+            LowerBfToBuiltinPass(cell_width=32).apply(ctx, module)
+            module.verify()
+            assert not any(
+                isinstance(op, memref.AllocaOp | arith.IndexCastOp)
+                for op in module.walk()
+            )
+            assert run_lowered(module, data).output == expected
+
+
+def test_direct_lowering() -> None:
+    """Test the direct lowering builds the same IR as the pattern-based one."""
+    for code in ("", HELLO_WORLD, ",[+.,]>>+[<]<.", "+[>[-]<[[]]+[>+<-]-]."):
+        for optimise, packed in itertools.product((False, True), repeat=2):
+            ctx = get_context()
+            modules = [parse_brainf(code, packed=packed) for _ in range(2)]
+            if optimise:
+                modules = [
+                    optimise_brainf(module, ctx, packed=packed) for module in modules
+                ]
+            LowerBfToBuiltinPass(cell_width=16).apply(ctx, modules[0])
+            DirectLowerBfToBuiltinPass(cell_width=16).apply(ctx, modules[1])
+            modules[1].verify()
+            assert str(modules[1]) == str(modules[0])
+
+    # The lowered program runs as the program does
+    ctx = get_context()
+    module = parse_brainf(",[+.,]>>+[<]<.")
+    DirectLowerBfToBuiltinPass(cell_width=32).apply(ctx, module)
+    assert run_lowered(module, b"abc").output == b"bcd\0"
+
+
+def test_lower_tape_options() -> None:
+    """Test the tape is allocated as requested and filled with zeros."""
+    ctx = get_context()
+    module = parse_brainf("+.")
+    LowerBfToBuiltinPass(cell_width=16, memory_size=100, alignment=16).apply(
+        ctx, module
+    )
+    module.verify()
+    (memory,) = (op for op in module.walk() if isinstance(op, memref.AllocOp))
+    assert memory.memref.type == MemRefType(i16, [100])
+    assert memory.alignment is not None
+    assert memory.alignment.value.data == 16  # noqa: PLR2004
+    (fill,) = (op for op in module.walk() if isinstance(op, linalg.FillOp))
+    assert fill.outputs[0] is memory.memref
+
+    for options in (
+        {"cell_width": 64},
+        {"memory_size": 0},
+        {"alignment": 24},
+        {"io_buffer_size": -1},
+    ):
+        with pytest.raises(ValueError, match="(cell width|must)"):
+            LowerBfToBuiltinPass(**options)
+
+
+def test_lower_buffered_io() -> None:
+    """Test buffered programs write and read bytes in bulk."""
+    # Echoes its input, stopping at the end of the input, read as -1
+    code = ",+[-.,+]" + "-" * 10 + "."
+    data = bytes(range(1, 100))
+    for pass_type in (LowerBfToBuiltinPass, DirectLowerBfToBuiltinPass):
+        for cell_width in CELL_WIDTHS:
+            ctx = get_context()
+            module = parse_brainf(code, packed=True)
+            pass_type(cell_width=cell_width, io_buffer_size=16).apply(ctx, module)
+            module.verify()
+            assert not any(
+                isinstance(op, func.CallOp) and op.callee.string_value() == "putchar"
+                for op in module.walk()
+            )
+            io = run_lowered(module, data)
+            assert io.output == data + bytes([256 - 10])
+            # The output is written when the buffer fills or input is read
+            assert io.writes < len(data) // 4
+
+
+@pytest.mark.skipif(shutil.which("cc") is None, reason="No C compiler available")
+def test_io_runtime(tmp_path: Path, capfd: pytest.CaptureFixture[str]) -> None:
+    """Test the runtime writes and reads buffers passed as memref descriptors."""
+    source = Path(xdslbf.__file__).parent / "runtime" / "bf_io.c"
+    library = tmp_path / "bf_io.so"
+    subprocess.run(  # noqa: S603
+        ["cc", "-shared", "-fPIC", str(source), "-o", str(library)],  # noqa: S607
+        check=True,
+    )
+    runtime = ctypes.CDLL(str(library))
+    # The allocated and aligned pointers, offset, size, stride and length
+    descriptor = (
+        ctypes.c_char_p,
+        ctypes.c_char_p,
+        ctypes.c_int64,
+        ctypes.c_int64,
+        ctypes.c_int64,
+        ctypes.c_int64,
+    )
+    for function in (runtime.bf_write, runtime.bf_read):
+        function.argtypes = descriptor
+        function.restype = ctypes.c_int64
+
+    buffer = ctypes.create_string_buffer(b"xHello!", 8)
+    assert runtime.bf_write(buffer, buffer, 1, 8, 1, 5) == 5  # noqa: PLR2004
+    assert capfd.readouterr().out == "Hello"
+
+    read_end, write_end = os.pipe()
+    stdin = os.dup(0)
+    try:
+        os.dup2(read_end, 0)
+        os.write(write_end, b"abc")
+        os.close(write_end)
+        assert runtime.bf_read(buffer, buffer, 2, 8, 1, 6) == 3  # noqa: PLR2004
+        assert buffer.raw[:5] == b"xHabc"
+        # Reading at the end of the input reads zero bytes
+        assert runtime.bf_read(buffer, buffer, 0, 8, 1, 8) == 0
+    finally:
+        os.dup2(stdin, 0)
+        os.close(stdin)
+        os.close(read_end)